@@ -1,52 +1,310 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Sequence
+from dataclasses import asdict
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
+from app import metrics
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from packages.classifier import async_repo as classifier_async_repo
 from packages.classifier import repo as classifier_repo
-from packages.emissions_linker import classify_and_link
+from packages.classifier import tracing
+from packages.emissions_linker import (
+    EmissionLinkResult,
+    classify_and_link_async,
+    classify_and_link_many,
+)
+from packages.emissions_linker.batch import DEFAULT_CHUNK_SIZE
+from pydantic import ValidationError
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
 
 router = APIRouter()
 
+NDJSON = "application/x-ndjson"
+# JSON array bodies are parsed whole; larger batches should be sent as NDJSON.
+MAX_JSON_IDS = 10_000
 
-def _get_shipment(shipment_id: UUID) -> dict:
-    with classifier_repo.get_connection() as conn:
-        row = (
-            conn.execute(
-                text(
-                    """
-                SELECT id::text AS id,
-                       arrived_at,
-                       country_code,
-                       hs_code,
-                       description,
-                       net_weight_kg,
-                       gross_weight_kg
-                FROM shipments
-                WHERE id = :shipment_id
-                """
-                ),
-                {"shipment_id": str(shipment_id)},
-            )
-            .mappings()
-            .first()
-        )
-        if not row:
-            raise HTTPException(status_code=404, detail="Shipment not found")
-        return dict(row)
 
+async def _get_shipments(conn, shipment_ids: Sequence[UUID]) -> dict[str, dict]:
+    """Fetch shipments by id in one query, keyed by their text id."""
 
-@router.post("/classify")
-def classify_shipment(shipment_id: UUID, force: bool = False):
-    shipment = _get_shipment(shipment_id)
-    result = classify_and_link(shipment, force=force)
+    result = await conn.execute(
+        text(
+            """
+            SELECT id::text AS id,
+                   arrived_at,
+                   country_code,
+                   hs_code,
+                   description,
+                   net_weight_kg,
+                   gross_weight_kg
+            FROM shipments
+            WHERE id = ANY(:shipment_ids)
+            """
+        ),
+        {"shipment_ids": list(shipment_ids)},
+    )
+    return {row["id"]: dict(row) for row in result.mappings()}
+
+
+def _result_payload(result: EmissionLinkResult) -> dict:
+    # Batch classifications are unvalidated tuples; validate them before they leave.
+    classification = result.classification.to_result()
     return {
         "shipment_id": result.shipment_id,
-        "hs_code8": result.classification.hs_code8,
-        "taric_code": result.classification.taric_code,
-        "ruling_id": result.classification.ruling_id,
-        "source": result.classification.source,
+        "hs_code8": classification.hs_code8,
+        "taric_code": classification.taric_code,
+        "ruling_id": classification.ruling_id,
+        "source": classification.source,
         "emission_intensity": result.emission_intensity,
         "emission_source": result.emission_source,
     }
+
+
+@router.post("/classify")
+async def classify_shipment(shipment_id: UUID, force: bool = False, trace: bool = False):
+    """Classify and link one shipment; ``trace=1`` adds the decision trace."""
+
+    with tracing.traced(force=trace) as recorded:
+        async with classifier_async_repo.get_async_connection() as conn:
+            shipment = (await _get_shipments(conn, [shipment_id])).get(str(shipment_id))
+            if not shipment:
+                raise HTTPException(status_code=404, detail="Shipment not found")
+            result = await classify_and_link_async(shipment, force=force, conn=conn)
+    payload = _result_payload(result)
+    if trace:
+        payload["trace"] = recorded.as_dict()
+    return payload
+
+
+def _parse_shipment_id(value) -> UUID:
+    if isinstance(value, dict):
+        value = value.get("shipment_id")
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Invalid shipment id: {value!r}") from None
+
+
+_END_OF_IDS = object()
+
+
+class _NdjsonShipmentIds:
+    """Shipment ids parsed from NDJSON body chunks as they arrive.
+
+    :meth:`feed` blocks once ``maxsize`` ids are waiting, which stops reading the
+    body until the classifier catches up. A malformed line ends the ids with
+    the :class:`HTTPException` describing it.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._buffer = b""
+        self._done = False
+
+    async def read(self, body: AsyncIterable[bytes]) -> None:
+        """Feed the chunks of ``body``, such as ``request.stream()``, until it ends."""
+
+        try:
+            async for chunk in body:
+                await self.feed(chunk, True)
+        except ClientDisconnect:
+            # Nobody reads the response any more; stop after the ids already queued.
+            await self._finish(None)
+            return
+        except Exception as error:
+            await self._finish(error)
+            return
+        await self.feed(b"", False)
+
+    async def feed(self, chunk: bytes, more_body: bool) -> None:
+        if self._done:
+            return
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        if not more_body:
+            lines.append(self._buffer)
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                await self._queue.put(_parse_shipment_id(json.loads(line)))
+            except json.JSONDecodeError as error:
+                await self._finish(HTTPException(422, detail=f"Malformed body: {error}"))
+                return
+            except HTTPException as error:
+                await self._finish(error)
+                return
+        if not more_body:
+            await self._finish(None)
+
+    async def _finish(self, error: Exception | None) -> None:
+        if self._done:
+            return
+        self._done = True
+        await self._queue.put(error or _END_OF_IDS)
+
+    async def __aiter__(self) -> AsyncIterator[UUID]:
+        while True:
+            item = await self._queue.get()
+            if item is _END_OF_IDS:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+async def _stream_ndjson_ids(request: Request, maxsize: int) -> AsyncIterator[UUID]:
+    # The body is read by a producer task so parsing overlaps classification.
+    ids = _NdjsonShipmentIds(maxsize)
+    producer = asyncio.create_task(ids.read(request.stream()))
+    try:
+        async for shipment_id in ids:
+            yield shipment_id
+    finally:
+        producer.cancel()
+
+
+class _NdjsonStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves ``receive`` to the request body stream.
+
+    Starlette releases before ASGI spec 2.4 support also read ``receive`` while
+    streaming, to watch for disconnects, and drop the body messages they get;
+    that would starve :func:`_stream_ndjson_ids`. A client that goes away while
+    sending ends the ids through :class:`ClientDisconnect` instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _read_json_ids(request: Request) -> list[UUID]:
+    try:
+        values = await request.json()
+    except json.JSONDecodeError as error:
+        raise HTTPException(status_code=422, detail=f"Malformed body: {error}") from None
+    if not isinstance(values, list):
+        raise HTTPException(status_code=422, detail="Expected a list of shipment ids")
+    if len(values) > MAX_JSON_IDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"JSON bodies are limited to {MAX_JSON_IDS} ids; send larger batches as NDJSON",
+        )
+    return [_parse_shipment_id(value) for value in values]
+
+
+async def _iterate(values: Iterable) -> AsyncIterator:
+    for value in values:
+        yield value
+
+
+async def _id_chunks(shipment_ids: AsyncIterable[UUID], chunk_size: int) -> AsyncIterator[list]:
+    # Duplicates would make the chunk's multi-row upserts touch a row twice.
+    chunk: dict[UUID, None] = {}
+    async for shipment_id in shipment_ids:
+        chunk[shipment_id] = None
+        if len(chunk) == chunk_size:
+            yield list(chunk)
+            chunk = {}
+    if chunk:
+        yield list(chunk)
+
+
+async def _classify_chunk(chunk: list[UUID], force: bool) -> bytes:
+    started = time.perf_counter()
+    async with classifier_async_repo.get_async_connection() as conn:
+        shipments = await _get_shipments(conn, chunk)
+    batch = await run_in_threadpool(
+        classify_and_link_many, shipments.values(), force=force, skip_unresolved=True
+    )
+    linked = {result.shipment_id: result for result in batch.results}
+    lines = []
+    for shipment_id in map(str, chunk):
+        if shipment_id in linked:
+            try:
+                payload = _result_payload(linked[shipment_id])
+            except ValidationError:
+                payload = {"shipment_id": shipment_id, "error": "Invalid classification"}
+        elif shipment_id in shipments:
+            payload = {"shipment_id": shipment_id, "error": "Unable to classify shipment"}
+        else:
+            payload = {"shipment_id": shipment_id, "error": "Shipment not found"}
+        lines.append(json.dumps(payload, default=str))
+    metrics.BATCH_CHUNK_DURATION.observe(time.perf_counter() - started)
+    metrics.BATCH_SHIPMENTS.labels("linked").inc(len(linked))
+    metrics.BATCH_SHIPMENTS.labels("unresolved").inc(len(shipments) - len(linked))
+    metrics.BATCH_SHIPMENTS.labels("not_found").inc(len(chunk) - len(shipments))
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def _classify_chunks(
+    shipment_ids: AsyncIterable[UUID], chunk_size: int, force: bool
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in _id_chunks(shipment_ids, chunk_size):
+            yield await _classify_chunk(chunk, force)
+    except HTTPException as error:
+        yield (json.dumps({"error": error.detail}) + "\n").encode()
+
+
+@router.post("/classify/batch")
+async def classify_shipments(
+    request: Request,
+    force: bool = False,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=5000),
+):
+    """Classify many shipments, streaming one NDJSON result line per id.
+
+    The body is an NDJSON stream with one id (or ``{"shipment_id": ...}`` object)
+    per line, or a JSON array of at most :data:`MAX_JSON_IDS` ids. Ids are
+    processed in chunks of ``chunk_size``: each chunk is fetched with one query
+    and linked with :func:`classify_and_link_many`, and its lines are sent before
+    the next chunk starts. NDJSON lines are parsed while the response streams and
+    handed over through a queue of at most ``chunk_size`` ids, so memory stays
+    bounded by the chunk size; a JSON array is read whole first. Lines follow the
+    input order, and duplicates within a chunk are reported once. Shipments that
+    are missing or cannot be classified get an ``error``. A malformed NDJSON line
+    ends the stream with an ``error`` line that has no ``shipment_id``.
+    """
+
+    if request.headers.get("content-type", "").startswith(NDJSON):
+        return _NdjsonStreamingResponse(
+            _classify_chunks(_stream_ndjson_ids(request, chunk_size), chunk_size, force),
+            media_type=NDJSON,
+        )
+    shipment_ids = await _read_json_ids(request)
+    return StreamingResponse(
+        _classify_chunks(_iterate(shipment_ids), chunk_size, force), media_type=NDJSON
+    )
+
+
+@router.get("/pool")
+async def pool_metrics():
+    """Connection pool saturation of this worker process, per engine, and read routing."""
+
+    pools = {
+        name: {**asdict(stats), "wait_seconds_mean": stats.wait_seconds_mean}
+        for name, stats in (
+            ("sync", classifier_repo.pool_stats()),
+            ("async", classifier_async_repo.pool_stats()),
+            ("sync_replica", classifier_repo.pool_stats(replica=True)),
+            ("async_replica", classifier_async_repo.pool_stats(replica=True)),
+        )
+    }
+    return {**pools, "read_routing": classifier_repo.read_routing_stats()}
+
+
+@router.get("/latency")
+async def latency_metrics():
+    """Per-stage, per-branch and total classification latencies of this worker process."""
+
+    return tracing.latency_histograms()
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import os
+from contextlib import asynccontextmanager
 
+from app import metrics
 from app.api.routes import bookings, events, internal
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from packages.classifier import listener, reference_index, text_index
+from packages.classifier import repo as classifier_repo
 
 
 def _get_allowed_origins() -> list[str]:
@@ -16,7 +20,31 @@ def _get_allowed_origins() -> list[str]:
     return origins or ["*"]
 
 
-app = FastAPI(title="Mr. DJ API", version="1.0.0")
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in {"1", "true", "yes"}
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if _env_flag("CLASSIFIER_REFERENCE_INDEX"):
+        with classifier_repo.get_connection() as conn:
+            reference_index.refresh_index(conn)
+    if _env_flag("CLASSIFIER_TEXT_INDEX"):
+        with classifier_repo.get_connection() as conn:
+            text_index.refresh_text_index(conn)
+    reference_listener = None
+    if _env_flag("CLASSIFIER_REFERENCE_LISTEN"):
+        reference_listener = listener.ReferenceChangeListener()
+        reference_listener.start()
+    try:
+        with metrics.refreshing():
+            yield
+    finally:
+        if reference_listener is not None:
+            reference_listener.stop()
+
+
+app = FastAPI(title="Mr. DJ API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +54,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.install(app)
+
 app.include_router(events.router, prefix="/api/events", tags=["events"])
 app.include_router(bookings.router, prefix="/api/bookings", tags=["bookings"])
 app.include_router(internal.router, prefix="/internal", tags=["classification"])
@@ -0,0 +1,306 @@
+"""Prometheus metrics for the API and the classifier, served at ``/metrics``.
+
+Request latencies are recorded per route template by :class:`PrometheusMiddleware`,
+classification latencies per branch and stage from the cheap timings of every
+classification (see :mod:`packages.classifier.tracing`; this does not turn on
+full tracing), and batch throughput by the batch endpoint. The classifier's own
+process-local counters (the TARIC pick cache used by per-shipment classification,
+connection pools, read routing, lookup paths) are mirrored into Prometheus
+counters by :func:`refresh_classifier_metrics`, which each worker runs every
+``METRICS_REFRESH_INTERVAL`` seconds and before serving a scrape.
+
+With several uvicorn/gunicorn workers, point ``PROMETHEUS_MULTIPROC_DIR`` at an
+empty directory before the workers start: every worker then writes its samples
+there and ``/metrics`` aggregates all of them, whichever worker serves it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from fastapi import FastAPI
+from packages.classifier import async_repo as classifier_async_repo
+from packages.classifier import repo as classifier_repo
+from packages.classifier import tracing
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+REFRESH_INTERVAL = float(os.getenv("METRICS_REFRESH_INTERVAL") or 5)
+
+# Route label of requests that matched no route, to keep arbitrary paths out of
+# the label set.
+UNMATCHED_ROUTE = "<unmatched>"
+
+_CLASSIFY_BUCKETS = tuple(ms / 1000 for ms in tracing.BUCKETS_MS)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration until the response body was sent, per route template.",
+    ("method", "route", "status"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ("method",),
+    multiprocess_mode="livesum",
+)
+
+CLASSIFY_DURATION = Histogram(
+    "classifier_classify_duration_seconds",
+    "Duration of classifications and links, per decision branch.",
+    ("branch",),
+    buckets=_CLASSIFY_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "classifier_stage_duration_seconds",
+    "Duration of classification and linking stages.",
+    ("stage",),
+    buckets=_CLASSIFY_BUCKETS,
+)
+CLASSIFY_QUERIES = Counter(
+    "classifier_queries",
+    "Statements sent by fully traced classifications, per decision branch.",
+    ("branch",),
+)
+
+BATCH_SHIPMENTS = Counter(
+    "classifier_batch_shipments",
+    "Shipments handled by the batch classify endpoint, per outcome.",
+    ("outcome",),
+)
+BATCH_CHUNK_DURATION = Histogram(
+    "classifier_batch_chunk_duration_seconds",
+    "Time to fetch, classify and link one chunk of the batch classify endpoint.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+# The TARIC pick cache serves per-shipment classification (classify and the
+# single-shipment linkers); set-based batch lookups bypass it and show up in
+# LOOKUP_KEYS instead.
+TARIC_CACHE_LOOKUPS = Counter(
+    "classifier_taric_cache_lookups",
+    "Per-shipment TARIC pick cache lookups, per result (hit or miss).",
+    ("result",),
+)
+TARIC_CACHE_DROPS = Counter(
+    "classifier_taric_cache_drops",
+    "TARIC pick cache entries dropped, per reason.",
+    ("reason",),
+)
+TARIC_CACHE_ENTRIES = Gauge(
+    "classifier_taric_cache_entries",
+    "TARIC pick cache entries held.",
+    multiprocess_mode="livesum",
+)
+POOL_SIZE = Gauge(
+    "classifier_pool_size",
+    "Configured connection pool size.",
+    ("engine",),
+    multiprocess_mode="livesum",
+)
+POOL_CHECKED_OUT = Gauge(
+    "classifier_pool_checked_out",
+    "Pooled connections currently checked out.",
+    ("engine",),
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "classifier_pool_overflow",
+    "Overflow connections currently open.",
+    ("engine",),
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUTS = Counter(
+    "classifier_pool_checkouts",
+    "Pooled connection checkouts.",
+    ("engine",),
+)
+POOL_TIMEOUTS = Counter(
+    "classifier_pool_checkout_timeouts",
+    "Checkouts that timed out waiting for a pooled connection.",
+    ("engine",),
+)
+POOL_WAIT = Counter(
+    "classifier_pool_checkout_wait_seconds",
+    "Time spent waiting for pooled connections.",
+    ("engine",),
+)
+READ_ROUTES = Counter(
+    "classifier_read_routes",
+    "Reference read connections, per target (replica or primary).",
+    ("target",),
+)
+LOOKUP_KEYS = Counter(
+    "classifier_lookup_keys",
+    "Reference lookup keys, per lookup and serving path.",
+    ("lookup", "path"),
+)
+
+
+def _observe_trace(trace: tracing.Timing) -> None:
+    branch = trace.branch or "unknown"
+    CLASSIFY_DURATION.labels(branch).observe(trace.total_ms / 1000)
+    if trace.detailed:
+        CLASSIFY_QUERIES.labels(branch).inc(trace.queries)
+    for stage in trace.stages:
+        STAGE_DURATION.labels(stage.name).observe(stage.ms / 1000)
+
+
+# Last mirrored value per (counter, labels). Forked children inherit it together
+# with the counters it mirrors, so they only add what they counted themselves.
+_MIRRORED: dict[tuple[Counter, tuple[str, ...]], float] = {}
+_REFRESH_LOCK = threading.Lock()
+
+
+def _mirror(counter: Counter, labels: tuple[str, ...], value: float) -> None:
+    key = (counter, labels)
+    last = _MIRRORED.get(key, 0.0)
+    # A smaller value means the source was reset (e.g. pool metrics after a fork).
+    delta = value - last if value >= last else value
+    if delta:
+        counter.labels(*labels).inc(delta)
+    _MIRRORED[key] = value
+
+
+def refresh_classifier_metrics() -> None:
+    """Copy this process's classifier counters into the Prometheus metrics."""
+
+    with _REFRESH_LOCK:
+        cache = classifier_repo.taric_cache_stats()
+        _mirror(TARIC_CACHE_LOOKUPS, ("hit",), cache.hits)
+        _mirror(TARIC_CACHE_LOOKUPS, ("miss",), cache.misses)
+        _mirror(TARIC_CACHE_DROPS, ("evicted",), cache.evictions)
+        _mirror(TARIC_CACHE_DROPS, ("expired",), cache.expirations)
+        _mirror(TARIC_CACHE_DROPS, ("invalidated",), cache.invalidations)
+        TARIC_CACHE_ENTRIES.set(cache.size)
+
+        for engine, stats in (
+            ("sync", classifier_repo.pool_stats()),
+            ("async", classifier_async_repo.pool_stats()),
+            ("sync_replica", classifier_repo.pool_stats(replica=True)),
+            ("async_replica", classifier_async_repo.pool_stats(replica=True)),
+        ):
+            POOL_SIZE.labels(engine).set(stats.size)
+            POOL_CHECKED_OUT.labels(engine).set(stats.checked_out)
+            POOL_OVERFLOW.labels(engine).set(stats.overflow)
+            _mirror(POOL_CHECKOUTS, (engine,), stats.checkouts)
+            _mirror(POOL_TIMEOUTS, (engine,), stats.timeouts)
+            _mirror(POOL_WAIT, (engine,), stats.wait_seconds_total)
+
+        for target, count in classifier_repo.read_routing_stats().items():
+            _mirror(READ_ROUTES, (target,), count)
+        for lookup, paths in classifier_repo.lookup_path_stats().items():
+            for path, count in paths.items():
+                _mirror(LOOKUP_KEYS, (lookup, path), count)
+
+
+@contextmanager
+def refreshing(interval: float = REFRESH_INTERVAL) -> Iterator[None]:
+    """Run :func:`refresh_classifier_metrics` every ``interval`` seconds in this process."""
+
+    stop = threading.Event()
+
+    def run() -> None:
+        while not stop.wait(interval):
+            try:
+                refresh_classifier_metrics()
+            except Exception:
+                logger.exception("Refreshing classifier metrics failed")
+
+    thread = threading.Thread(target=run, name="classifier-metrics", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        refresh_classifier_metrics()
+        if MULTIPROCESS_DIR:
+            multiprocess.mark_process_dead(os.getpid())
+
+
+class PrometheusMiddleware:
+    """Record duration and concurrency of HTTP requests, labelled by route template.
+
+    A plain ASGI middleware: it only wraps ``send`` to catch the status code. The
+    template (``/internal/classify``, not the request path) is read from the
+    endpoint the router matched, so path parameters do not multiply the series.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._templates: dict[Any, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._templates.get(endpoint)
+        if template is None:
+            for route in getattr(scope.get("router"), "routes", ()):
+                if hasattr(route, "endpoint"):
+                    self._templates.setdefault(route.endpoint, route.path)
+            template = self._templates.setdefault(endpoint, UNMATCHED_ROUTE)
+        return template
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            REQUEST_DURATION.labels(method, self._route(scope), str(status)).observe(elapsed)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    refresh_classifier_metrics()
+    registry = REGISTRY
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def install(app: FastAPI) -> None:
+    """Add the request middleware and ``/metrics`` route, and time classifications."""
+
+    app.add_middleware(PrometheusMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    tracing.add_observer(_observe_trace, detailed=False)
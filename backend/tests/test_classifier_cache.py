@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from packages.classifier import async_repo, reference_index, repo, resolver
+from packages.classifier.cache import IntervalCache
+from packages.classifier.types import ClassificationContext
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entry_serves_every_date_in_its_interval():
+    cache = IntervalCache(maxsize=4, ttl=60)
+    cache.put("k", date(2023, 1, 1), date(2024, 1, 1), "A")
+
+    assert cache.get("k", date(2023, 1, 1)) == "A"
+    assert cache.get("k", date(2023, 12, 31)) == "A"
+    assert cache.get("k", date(2024, 1, 1), default=None) is None
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (2, 1)
+
+
+def test_entries_expire_after_ttl():
+    clock = _Clock()
+    cache = IntervalCache(maxsize=4, ttl=10, clock=clock)
+    cache.put("k", None, None, "A")
+
+    clock.now = 11
+    assert cache.get("k", date(2023, 1, 1), default=None) is None
+    assert cache.stats().expirations == 1
+    assert cache.stats().size == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = IntervalCache(maxsize=2, ttl=60)
+    cache.put("a", None, None, 1)
+    cache.put("b", None, None, 2)
+    cache.get("a", date(2023, 1, 1))
+    cache.put("c", None, None, 3)
+
+    assert cache.get("b", date(2023, 1, 1), default=None) is None
+    assert cache.get("a", date(2023, 1, 1)) == 1
+    assert cache.stats().evictions == 1
+
+
+def test_version_change_invalidates_entries():
+    cache = IntervalCache(maxsize=4, ttl=60)
+    cache.sync_version("v1")
+    cache.put("k", None, None, "A")
+    cache.sync_version("v1")
+    assert cache.get("k", date(2023, 1, 1)) == "A"
+
+    cache.sync_version("v2")
+    assert cache.get("k", date(2023, 1, 1), default=None) is None
+    assert cache.stats().invalidations == 1
+
+
+@pytest.fixture
+def installed_index():
+    index = reference_index.ReferenceIndex.from_rows(
+        "cache-v1",
+        [
+            {"taric_code": "7208100000", "hs_code8": "72081000", "valid_from": date(2020, 1, 1)},
+            {"taric_code": "7208109000", "hs_code8": "72081000", "valid_from": date(2023, 7, 1)},
+        ],
+        [{"taric_code": "7208109000", "country_code": "NL", "valid_from": date(2023, 7, 1)}],
+        [],
+    )
+    reference_index.install_index(index)
+    repo._TARIC_CACHE.clear()
+    yield index
+    reference_index.install_index(None)
+    reference_index.set_reference_version(None)
+    repo._TARIC_CACHE.clear()
+
+
+def test_cached_taric_lookup_keys_on_stable_interval(installed_index):
+    before = repo.taric_cache_stats()
+
+    assert repo.cached_taric_lookup("72081000", "NL", date(2021, 3, 1)) == "7208100000"
+    assert repo.cached_taric_lookup("72081000", "NL", date(2023, 6, 30)) == "7208100000"
+    assert repo.cached_taric_lookup("72081000", "NL", date(2023, 7, 1)) == "7208109000"
+    assert repo.cached_taric_lookup("72081000", "NL", date(2025, 1, 1)) == "7208109000"
+
+    stats = repo.taric_cache_stats()
+    assert stats.misses - before.misses == 2
+    assert stats.hits - before.hits == 2
+
+
+def test_cached_taric_lookup_drops_entries_on_new_index(installed_index):
+    assert repo.cached_taric_lookup("72081000", "NL", date(2024, 1, 1)) == "7208109000"
+
+    reference_index.install_index(reference_index.ReferenceIndex.from_rows("cache-v2", [], [], []))
+
+    assert repo.cached_taric_lookup("72081000", "NL", date(2024, 1, 1)) is None
+
+
+@pytest.fixture
+def view_picks(monkeypatch):
+    picks = []
+
+    def pick(conn, hs_code8, country, ref_date):
+        picks.append(ref_date)
+        return repo.TaricRecord("7208100000", hs_code8, date(2020, 1, 1), None, None)
+
+    stamps = iter(["s1", "s1", "s2"])
+    monkeypatch.setattr(repo, "pick_most_specific_taric", pick)
+    monkeypatch.setattr(repo, "taric_stable_interval", lambda *args: (date(2020, 1, 1), None))
+    monkeypatch.setattr(repo, "_refresh_stamp", lambda conn: next(stamps))
+    repo._TARIC_CACHE.clear()
+    yield picks
+    repo._TARIC_CACHE.clear()
+
+
+def test_view_picks_are_dropped_when_the_views_are_refreshed(view_picks):
+    for ref_date in (date(2024, 1, 1), date(2024, 6, 1), date(2024, 6, 1)):
+        repo.cached_pick_most_specific_taric(None, "72081000", "NL", ref_date)
+
+    # The second date is served from the cache; the new refresh stamp forces a reload.
+    assert view_picks == [date(2024, 1, 1), date(2024, 6, 1)]
+
+
+def test_classify_picks_through_the_cache(view_picks, monkeypatch):
+    monkeypatch.setattr(repo, "get_applicable_rulings", lambda *args: [])
+    ctx = ClassificationContext(
+        shipment_id="S1",
+        ref_date=date(2024, 1, 1),
+        origin_country="NL",
+        hs_hint="72081000",
+        weight_kg=1.0,
+    )
+
+    first = resolver.classify(ctx, conn=SimpleNamespace())
+    second = resolver.classify(
+        ctx.model_copy(update={"ref_date": date(2024, 2, 1)}), conn=SimpleNamespace()
+    )
+
+    assert first.taric_code == second.taric_code == "7208100000"
+    assert view_picks == [date(2024, 1, 1)]
+
+
+@pytest.mark.asyncio
+async def test_async_classify_shares_the_cache(view_picks, monkeypatch):
+    async def rulings(*args):
+        return []
+
+    async def stamp(conn):
+        return "s1"
+
+    monkeypatch.setattr(async_repo, "get_applicable_rulings", rulings)
+    monkeypatch.setattr(async_repo, "_refresh_stamp", stamp)
+    ctx = ClassificationContext(
+        shipment_id="S1",
+        ref_date=date(2024, 1, 1),
+        origin_country="NL",
+        hs_hint="72081000",
+        weight_kg=1.0,
+    )
+    repo.cached_pick_most_specific_taric(None, "72081000", "NL", date(2024, 1, 1))
+
+    result = await resolver.classify_async(ctx, conn=SimpleNamespace())
+
+    assert result.taric_code == "7208100000"
+    assert view_picks == [date(2024, 1, 1)]
+
+
+def test_refresh_stamp_is_read_at_most_once_per_ttl(monkeypatch):
+    statements = []
+
+    def fetchall(conn, statement, **params):
+        statements.append(statement)
+        return [{"present": True, "stamp": "abc"}]
+
+    monkeypatch.setattr(repo, "_fetchall", fetchall)
+    monkeypatch.setattr(repo, "_refresh_stamp_state", None)
+
+    assert repo._refresh_stamp(None) == "abc"
+    assert repo._refresh_stamp(None) == "abc"
+    assert len(statements) == 2
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+
+import pytest
+from packages.classifier import dump, reference_index, text_index
+from packages.emissions_linker import offline
+
+pytest.importorskip("duckdb")
+
+_TABLES = {
+    "taric_nomenclature": [
+        ("7208100000", "72081000", "Flat-rolled, in coils", "2020-01-01", ""),
+        ("0401100000", "04011000", "Milk, fat content not exceeding 1 %", "2020-01-01", ""),
+    ],
+    "taric_measures": [("7208100000", "103", "", "2020-01-01", "")],
+    "bti_rulings": [],
+    "hs_codes": [
+        ("72081000", "Flat-rolled products of iron, hot-rolled, in coils", "2020-01-01", ""),
+        ("04011000", "Milk and cream, not concentrated", "2020-01-01", ""),
+    ],
+    "cbam_default_emissions": [
+        ("72081000", "", "1.9", "EU default", "2020-01-01", ""),
+        ("72081000", "TR", "2.4", "EU default (TR)", "2020-01-01", ""),
+    ],
+}
+_SHIPMENTS = [
+    ("s-1", "2024-03-01", "TR", "7208100000", "hot rolled coil", "1000", ""),
+    ("s-2", "2024-03-01", "CN", "72081000", "", "500", ""),
+    ("s-3", "2024-03-01", "NO", "04011000", "skimmed milk", "20", ""),
+    ("s-4", "2024-03-01", "CN", "", "", "10", ""),
+    ("s-5", "2024-03-01", "NL", "", "milk and cream", "5", ""),
+]
+
+
+def _write_csv(path: Path, columns, rows) -> Path:
+    with path.open("w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def dump_dir(tmp_path):
+    directory = tmp_path / "dump"
+    directory.mkdir()
+    for table, rows in _TABLES.items():
+        _write_csv(directory / f"{table}.csv", dump.DUMP_COLUMNS[table], rows)
+    yield directory
+    reference_index.install_index(None)
+    text_index.install_index(None)
+
+
+def test_load_dump_keeps_leading_zeros(dump_dir):
+    index, texts = dump.load_dump(dump_dir)
+
+    assert index.version == dump.dump_version(dump_dir)
+    assert set(index.tarics_by_hs) == {"72081000", "04011000"}
+    assert len(texts.docs) == 2
+
+
+def _link(dump_dir, tmp_path, shipments=_SHIPMENTS, **options):
+    columns = (
+        "id",
+        "arrived_at",
+        "country_code",
+        "hs_code",
+        "description",
+        "net_weight_kg",
+        "gross_weight_kg",
+    )
+    shipments = _write_csv(tmp_path / "shipments.csv", columns, shipments)
+    output = tmp_path / "linked.csv"
+
+    stats = offline.link_file(dump_dir, shipments, output, chunk_size=2, **options)
+
+    with output.open(newline="") as handle:
+        return stats, {row["shipment_id"]: row for row in csv.DictReader(handle)}
+
+
+def test_link_file_classifies_without_a_database(dump_dir, tmp_path, monkeypatch):
+    monkeypatch.delenv("CLASSIFIER_TEXT_INDEX", raising=False)
+    monkeypatch.setattr(offline.repo, "TEXT_MATCH_MODE", "ilike")
+
+    stats, rows = _link(dump_dir, tmp_path)
+
+    assert stats.text_match == "ilike"
+    assert (stats.processed, stats.classified, stats.unresolved) == (5, 4, 1)
+    assert list(rows) == ["s-1", "s-2", "s-3", "s-4", "s-5"]
+    assert rows["s-1"]["taric_code"] == "7208100000"
+    assert float(rows["s-1"]["emission_intensity"]) == 2.4
+    assert float(rows["s-2"]["emission_intensity"]) == 1.9
+    assert rows["s-3"]["hs_code8"] == "04011000"
+    assert rows["s-3"]["emission_intensity"] == ""
+    assert rows["s-4"]["hs_code8"] == ""
+    assert rows["s-5"]["hs_code8"] == "04011000"
+    assert rows["s-5"]["text_match"] == "ilike" and rows["s-1"]["text_match"] == ""
+
+
+def test_link_file_writes_invalid_rows_as_unclassified(dump_dir, tmp_path, monkeypatch):
+    monkeypatch.delenv("CLASSIFIER_TEXT_INDEX", raising=False)
+    monkeypatch.setattr(offline.repo, "TEXT_MATCH_MODE", "ilike")
+    # Too short for an HS hint, so no classification context can be built.
+    invalid = ("s-6", "2024-03-01", "TR", "7208", "", "5", "")
+
+    stats, rows = _link(dump_dir, tmp_path, [_SHIPMENTS[0], invalid, _SHIPMENTS[1]])
+
+    assert (stats.processed, stats.classified, stats.invalid, stats.unresolved) == (3, 2, 1, 0)
+    assert list(rows) == ["s-1", "s-6", "s-2"]
+    assert rows["s-6"]["hs_code8"] == "" and rows["s-6"]["emission_intensity"] == ""
+    assert float(rows["s-2"]["emission_intensity"]) == 1.9
+
+
+def test_link_file_follows_the_configured_text_index(dump_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("CLASSIFIER_TEXT_INDEX", "1")
+
+    stats, rows = _link(dump_dir, tmp_path)
+
+    assert stats.text_match == "index"
+    assert rows["s-5"]["hs_code8"] == "04011000"
+    assert rows["s-5"]["text_match"] == "index"
+
+
+def test_ilike_derivation_keeps_production_substring_semantics(dump_dir, tmp_path):
+    # "cream milk" is no substring of any description; BM25 would still match it.
+    contexts = [
+        offline._build_context(
+            {"id": "a", "arrived_at": "2024-03-01", "country_code": "NL", "description": text}
+        )
+        for text in ("HOT-ROLLED", "cream milk")
+    ]
+    con = dump.connect(dump_dir)
+    try:
+        derived = offline._derive_hs_ilike(con, contexts)
+    finally:
+        con.close()
+
+    assert [(ctx.hs_hint, ctx.text_hint) for ctx in derived] == [("72081000", None), (None, None)]
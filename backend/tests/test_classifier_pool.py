@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from packages.classifier import pool, repo
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+
+def _engine(settings: pool.PoolSettings, metrics: pool.PoolMetrics):
+    engine = create_engine(
+        "sqlite://",
+        poolclass=QueuePool,
+        pool_size=settings.size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.timeout,
+    )
+    pool.instrument(engine, metrics, settings)
+    return engine
+
+
+def test_settings_read_environment(monkeypatch):
+    monkeypatch.setenv("CLASSIFIER_POOL_SIZE", "12")
+    monkeypatch.setenv("CLASSIFIER_POOL_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("CLASSIFIER_POOL_PRE_PING", "Always")
+
+    settings = pool.PoolSettings.from_env()
+
+    assert settings.size == 12 and settings.max_overflow == 0
+    assert settings.engine_kwargs()["pool_pre_ping"] is True
+
+
+def test_settings_reject_unknown_pre_ping(monkeypatch):
+    monkeypatch.setenv("CLASSIFIER_POOL_PRE_PING", "sometimes")
+
+    with pytest.raises(ValueError, match="CLASSIFIER_POOL_PRE_PING"):
+        pool.PoolSettings.from_env()
+
+
+def test_metrics_count_checkouts_overflow_and_timeouts():
+    settings = pool.PoolSettings(size=1, max_overflow=1, timeout=0.01)
+    metrics = pool.PoolMetrics()
+    engine = _engine(settings, metrics)
+
+    first = engine.connect()
+    second = engine.connect()
+    saturated = metrics.stats()
+    with pytest.raises(exc.TimeoutError), metrics.timed_checkout():
+        engine.connect()
+    first.close()
+    second.close()
+
+    assert (saturated.size, saturated.checked_out, saturated.overflow) == (1, 2, 1)
+    assert (saturated.checkouts, saturated.overflow_checkouts) == (2, 1)
+    assert metrics.stats().timeouts == 1
+    assert metrics.stats().checked_out == 0
+
+
+def test_idle_pre_ping_replaces_dead_connections(monkeypatch):
+    settings = pool.PoolSettings(size=1, max_overflow=0, pre_ping="idle", ping_idle=0.0)
+    engine = _engine(settings, pool.PoolMetrics())
+    with engine.connect() as conn:
+        stale = conn.connection.dbapi_connection
+    stale.close()
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar_one() == 1
+        assert conn.connection.dbapi_connection is not stale
+
+
+def test_engine_is_recreated_after_fork(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql+psycopg2://user@localhost/db")
+    monkeypatch.setattr(repo, "_ENGINE", None)
+    parent = repo.get_engine()
+    monkeypatch.setattr(repo, "_ENGINE_PID", os.getpid() + 1)
+
+    child = repo.get_engine()
+
+    assert child is not parent
+    assert repo._ENGINE_PID == os.getpid()
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    monkeypatch.setenv("DATABASE_READ_URL", "postgresql+psycopg2://reader@replica/db")
+    monkeypatch.setattr(repo, "_READ_ENGINE", engine)
+    monkeypatch.setattr(repo, "_ENGINE_PID", os.getpid())
+    monkeypatch.setattr(repo, "_replica_state", None)
+    monkeypatch.setattr(repo, "_READ_ROUTES", repo.Counter())
+    monkeypatch.setattr(repo, "REPLICA_MAX_LAG", 5.0)
+    return engine
+
+
+def _route(lag: str, monkeypatch) -> str:
+    monkeypatch.setattr(repo, "_REPLICA_LAG_SQL", f"SELECT {lag} AS lag_seconds")
+    primary = object()
+    with repo.get_read_connection(primary) as conn:
+        return "primary" if conn is primary else "replica"
+
+
+def test_reads_stay_on_primary_without_replica(monkeypatch):
+    monkeypatch.delenv("DATABASE_READ_URL", raising=False)
+    primary = object()
+
+    with repo.get_read_connection(primary) as conn:
+        assert conn is primary
+
+
+def test_reads_go_to_a_fresh_replica(replica, monkeypatch):
+    assert _route("0.5", monkeypatch) == "replica"
+    assert repo.read_routing_stats() == {"replica": 1, "primary": 0}
+
+
+def test_lagging_replica_falls_back_until_the_next_probe(replica, monkeypatch):
+    assert _route("60", monkeypatch) == "primary"
+    # The verdict is cached for the check interval, even once the replica caught up.
+    assert _route("0", monkeypatch) == "primary"
+
+    monkeypatch.setattr(repo, "_replica_state", None)
+    assert _route("0", monkeypatch) == "replica"
+
+
+def test_unreachable_replica_falls_back_to_primary(replica, monkeypatch):
+    def refuse():
+        raise exc.OperationalError("connect", {}, ConnectionRefusedError())
+
+    monkeypatch.setattr(replica, "connect", refuse)
+
+    assert _route("0", monkeypatch) == "primary"
+    assert repo._replica_state[1] is False
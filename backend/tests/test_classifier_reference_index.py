@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from packages.classifier import reference_index, repo
+
+_NOMENCLATURE = [
+    {
+        "taric_code": "7208100000",
+        "hs_code8": "72081000",
+        "valid_from": date(2020, 1, 1),
+        "valid_to": None,
+        "description": "Flat-rolled, in coils",
+    },
+    {
+        "taric_code": "7208109000",
+        "hs_code8": "72081000",
+        "valid_from": date(2023, 7, 1),
+        "valid_to": None,
+        "description": "Flat-rolled, other",
+    },
+    {
+        "taric_code": "72081000",
+        "hs_code8": "72081000",
+        "valid_from": date(2019, 1, 1),
+        "valid_to": None,
+        "description": "Flat-rolled products",
+    },
+    {
+        "taric_code": "72081000",
+        "hs_code8": "72081000",
+        "valid_from": date(2015, 1, 1),
+        "valid_to": date(2018, 12, 31),
+        "description": "Flat-rolled products (old)",
+    },
+]
+_MEASURES = [
+    {"taric_code": "7208109000", "country_code": None, "valid_from": date(2023, 7, 1)},
+    {
+        "taric_code": "72081000",
+        "country_code": "DE",
+        "valid_from": date(2019, 1, 1),
+        "valid_to": date(2020, 12, 31),
+    },
+    {
+        "taric_code": "72081000",
+        "country_code": "DE",
+        "valid_from": date(2020, 6, 1),
+        "valid_to": date(2021, 12, 31),
+    },
+]
+_RULINGS = [
+    {
+        "id": "r-hs",
+        "hs_code8": "72081000",
+        "taric_code": None,
+        "country_scope": None,
+        "precedence": 50,
+        "valid_from": date(2020, 1, 1),
+        "valid_to": None,
+        "source": "HS ruling",
+    },
+    {
+        "id": "r-taric",
+        "hs_code8": "72081000",
+        "taric_code": "7208109000",
+        "country_scope": "NL",
+        "precedence": 10,
+        "valid_from": date(2023, 7, 1),
+        "valid_to": None,
+        "source": "TARIC ruling",
+    },
+]
+
+
+@pytest.fixture
+def index():
+    built = reference_index.ReferenceIndex.from_rows("v1", _NOMENCLATURE, _MEASURES, _RULINGS)
+    reference_index.install_index(built)
+    yield built
+    reference_index.install_index(None)
+
+
+def test_pick_prefers_longest_code_with_measure(index):
+    record = index.pick_most_specific_taric("72081000", "NL", date(2024, 1, 1))
+
+    assert record.taric_code == "7208109000"
+
+
+def test_pick_falls_back_to_longest_code(index):
+    record = index.pick_most_specific_taric("72081000", "FR", date(2022, 6, 1))
+
+    assert record.taric_code == "7208100000"
+
+
+def test_overlapping_measure_intervals_are_merged(index):
+    assert index.measure_matches("72081000", "DE", date(2020, 8, 1))
+    assert index.measure_matches("72081000", "DE", date(2021, 12, 31))
+    assert not index.measure_matches("72081000", "DE", date(2022, 1, 1))
+    assert not index.measure_matches("72081000", "NL", date(2020, 8, 1))
+
+
+def test_taric_validity_returns_latest_interval(index):
+    assert index.taric_validity("72081000") == (date(2019, 1, 1), None)
+    assert index.taric_validity("0000000000") == (None, None)
+
+
+def test_rulings_prefer_taric_level_matches(index):
+    rulings = index.get_applicable_rulings("72081000", "7208109000", "NL", date(2024, 1, 1))
+    assert [ruling.id for ruling in rulings] == ["r-taric"]
+
+    rulings = index.get_applicable_rulings("72081000", "7208109000", "DE", date(2024, 1, 1))
+    assert [ruling.id for ruling in rulings] == ["r-hs"]
+
+
+def test_repo_answers_from_installed_index_without_connection(index):
+    record = repo.pick_most_specific_taric(None, "72081000", "DE", date(2020, 8, 1))
+    assert record.taric_code == "72081000"
+
+    picked = repo.pick_most_specific_taric_many(None, [("72081000", "NL", date(2024, 1, 1))])
+    assert picked[("72081000", "NL", date(2024, 1, 1))].taric_code == "7208109000"
+    assert repo.taric_validity(None, "7208109000") == (date(2023, 7, 1), None)
+
+
+def test_install_index_swaps_snapshot(index):
+    replacement = reference_index.ReferenceIndex.from_rows("v2", [], [], [])
+    reference_index.install_index(replacement)
+
+    assert reference_index.active_index().version == "v2"
+    assert repo.pick_most_specific_taric(None, "72081000", "NL", date(2024, 1, 1)) is None
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+from datetime import date
+
+import pytest
+from packages.classifier import listener, reference_index, refresh, repo
+
+_MEASURES_VIEW = next(
+    view for view in refresh.REFERENCE_VIEWS if view.name == "mv_taric_measure_ranges"
+)
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.params = []
+        self.commits = 0
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        self.params.append(params)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def watermarks(monkeypatch):
+    stored = {}
+    monkeypatch.setattr(refresh, "source_watermark", lambda conn, view: "w1")
+    monkeypatch.setattr(refresh, "_stored_watermark", lambda conn, view: stored.get(view.name))
+    return stored
+
+
+def test_refresh_view_skips_unchanged_sources(watermarks):
+    watermarks[_MEASURES_VIEW.name] = "w1"
+    conn = _FakeConnection()
+
+    result = refresh.refresh_view(conn, _MEASURES_VIEW)
+
+    assert result == refresh.RefreshResult(_MEASURES_VIEW.name, False, False, 0.0, "w1")
+    assert not any("REFRESH" in statement for statement in conn.statements)
+    assert conn.commits == 1
+
+
+@pytest.mark.parametrize(
+    ("populated", "unique_index", "concurrently"),
+    [(True, True, True), (False, True, False), (True, False, False)],
+)
+def test_refresh_view_records_watermark_without_ddl(
+    watermarks, monkeypatch, populated, unique_index, concurrently
+):
+    watermarks[_MEASURES_VIEW.name] = "w0"
+    monkeypatch.setattr(refresh, "_is_populated", lambda conn, view: populated)
+    monkeypatch.setattr(refresh, "_has_unique_index", lambda conn, view: unique_index)
+    conn = _FakeConnection()
+
+    result = refresh.refresh_view(conn, _MEASURES_VIEW)
+
+    assert result.refreshed and result.concurrently is concurrently
+    expected = (
+        "CONCURRENTLY mv_taric_measure_ranges" if concurrently else "VIEW mv_taric_measure_ranges"
+    )
+    assert conn.statements[0].endswith(expected)
+    assert not any("CREATE" in statement for statement in conn.statements)
+    assert conn.params[-1]["watermark"] == "w1"
+    assert conn.commits == 1
+
+
+def test_forced_refresh_ignores_watermark(watermarks, monkeypatch):
+    watermarks[_MEASURES_VIEW.name] = "w1"
+    monkeypatch.setattr(refresh, "_is_populated", lambda conn, view: True)
+    monkeypatch.setattr(refresh, "_has_unique_index", lambda conn, view: True)
+
+    assert refresh.refresh_view(_FakeConnection(), _MEASURES_VIEW, force=True).refreshed
+
+
+def test_watermark_follows_source_versions_and_the_date_for_daily_views(monkeypatch):
+    versions = {"taric_nomenclature": 3}
+    monkeypatch.setattr(
+        reference_index, "source_versions", lambda conn, tables: {t: versions[t] for t in tables}
+    )
+    monkeypatch.setattr(repo, "_fetchall", lambda conn, statement: [{"today": date(2024, 1, 1)}])
+    today_view, ranges_view = refresh.REFERENCE_VIEWS[:2]
+
+    first = refresh.source_watermark(None, ranges_view)
+    assert refresh.source_watermark(None, today_view) != first
+    versions["taric_nomenclature"] = 4
+    assert refresh.source_watermark(None, ranges_view) != first
+
+
+def test_reference_change_invalidates_caches(monkeypatch):
+    monkeypatch.setattr(reference_index, "_VERSION", "v1")
+    monkeypatch.setattr(repo, "_mv_today_state", (float("inf"), date(2024, 1, 1)))
+    repo._TARIC_CACHE.put(("72081000", "NL"), None, None, "7208109000")
+
+    listener.handle_reference_change(json.dumps({"views": ["mv_hs_taric_today"], "version": "v2"}))
+
+    assert repo._mv_today_state is None
+    assert repo.taric_cache_stats().size == 0
+    assert reference_index.current_version() == "v2"
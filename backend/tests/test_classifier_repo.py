@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from packages.classifier import async_repo, queries, repo
+
+
+class _FakeCursor:
+    def __init__(self, copies):
+        self.copies = copies
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.copies = []
+        self.began = 0
+        self.commits = 0
+        self.connection = self
+
+    def in_transaction(self):
+        return self.began > 0
+
+    def begin(self):
+        self.began += 1
+
+    def cursor(self):
+        return _FakeCursor(self.copies)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_copy_field_escapes_text_format():
+    assert repo._copy_field(None) == "\\N"
+    assert repo._copy_field("a\tb\\c\nd") == "a\\tb\\\\c\\nd"
+    assert repo._copy_field(date(2024, 1, 2)) == "2024-01-02"
+
+
+def test_persist_classification_snapshots_copies_in_batches():
+    conn = _FakeConnection()
+    snapshots = (
+        (f"s{i}", "72081000", None, None, "HS_DERIVED", date(2024, 1, 1)) for i in range(5)
+    )
+
+    written = repo.persist_classification_snapshots(conn, snapshots, batch_size=2)
+
+    assert written == 5
+    assert conn.began == 1
+    assert conn.commits == 1
+    assert [payload.count("\n") for _, payload in conn.copies] == [2, 2, 1]
+    sql, payload = conn.copies[0]
+    assert sql.startswith("COPY shipment_classifications (id, shipment_id,")
+    fields = payload.splitlines()[0].split("\t")
+    assert len(fields) == len(repo._SNAPSHOT_COLUMNS)
+    assert fields[1:] == ["s0", "72081000", "\\N", "\\N", "HS_DERIVED", "2024-01-01"]
+
+
+def test_derive_hs_query_follows_text_match_mode(monkeypatch):
+    monkeypatch.setattr(repo, "TEXT_MATCH_MODE", "ilike")
+    query, params = repo._derive_hs_query("steel coil", date(2024, 1, 1))
+    assert "ILIKE" in query.sql
+    assert params["pattern"] == "%steel coil%"
+
+    monkeypatch.setattr(repo, "TEXT_MATCH_MODE", "trigram")
+    query, params = repo._derive_hs_query("steel coil", date(2024, 1, 1))
+    assert "<%" in query.sql
+    assert params == {"text_hint": "steel coil", "ref_date": date(2024, 1, 1), "top_k": 1}
+
+
+def test_lookups_route_mv_refresh_date_to_materialized_view(monkeypatch):
+    statements = []
+
+    def fake_fetchall(conn, statement, **params):
+        statements.append((statement, params))
+        return []
+
+    def fake_fetch_rows(conn, query, **params):
+        statements.append((query.sql, params))
+        return []
+
+    monkeypatch.setattr(repo, "_fetchall", fake_fetchall)
+    monkeypatch.setattr(queries, "fetch_rows", fake_fetch_rows)
+    monkeypatch.setattr(repo, "_mv_today", lambda conn: date(2024, 3, 1))
+    monkeypatch.setattr(repo, "_LOOKUP_PATHS", repo.Counter())
+
+    repo.pick_most_specific_taric(None, "72081000", "NL", date(2024, 3, 1))
+    repo.pick_most_specific_taric(None, "72081000", "NL", date(2023, 3, 1))
+    repo.taric_candidates_many(
+        None, [("72081000", date(2024, 3, 1)), ("72081000", date(2022, 1, 1))]
+    )
+
+    assert "FROM mv_hs_taric_today" in statements[0][0]
+    assert "mv_taric_nomenclature_ranges" in statements[1][0]
+    assert "mv_hs_taric_today t" in statements[2][0]
+    assert statements[2][1]["ref_dates"] == [date(2024, 3, 1)]
+    assert "mv_taric_nomenclature_ranges t" in statements[3][0]
+    assert repo.lookup_path_stats() == {
+        "pick_most_specific_taric": {"mv_today": 1, "view": 1},
+        "taric_candidates": {"mv_today": 1, "view": 1},
+    }
+
+
+@pytest.mark.asyncio
+async def test_async_lookups_route_mv_refresh_date_to_materialized_view(monkeypatch):
+    statements = []
+
+    async def fake_fetchall(conn, statement, **params):
+        statements.append((statement, params))
+        return [{"as_of": date(2024, 3, 1)}]
+
+    async def fake_fetch_rows(conn, query, **params):
+        statements.append((query.sql, params))
+        return []
+
+    monkeypatch.setattr(async_repo, "_fetchall", fake_fetchall)
+    monkeypatch.setattr(async_repo, "_fetch_rows", fake_fetch_rows)
+    monkeypatch.setattr(repo, "_mv_today_state", None)
+    monkeypatch.setattr(repo, "_LOOKUP_PATHS", repo.Counter())
+
+    await async_repo.pick_most_specific_taric(None, "72081000", "NL", date(2024, 3, 1))
+    await async_repo.pick_most_specific_taric(None, "72081000", "NL", date(2023, 3, 1))
+    await async_repo.taric_candidates(None, "72081000", date(2024, 3, 1))
+
+    assert len(statements) == 5  # the as_of probe runs once for all three lookups
+    assert "FROM mv_hs_taric_today t" in statements[2][0]
+    assert "FROM mv_taric_nomenclature_ranges t" in statements[3][0]
+    assert "FROM mv_hs_taric_today" in statements[4][0]
+    assert repo.lookup_path_stats() == {
+        "pick_most_specific_taric": {"mv_today": 1, "view": 1},
+        "taric_candidates": {"mv_today": 1},
+    }
+
+
+def test_registered_queries_compile_to_prepared_statements():
+    query = queries.Query(
+        "example",
+        "SELECT id::text FROM t WHERE a = :a AND (:b IS NULL OR b = :b) AND c <= :a",
+        {"a": "varchar", "b": "date"},
+    )
+
+    assert query.prepare_sql == (
+        "PREPARE classifier_example (varchar, date) AS "
+        "SELECT id::text FROM t WHERE a = $1 AND ($2 IS NULL OR b = $2) AND c <= $1"
+    )
+    assert query.execute_sql == "EXECUTE classifier_example (%(a)s, %(b)s)"
+    assert set(queries.QUERIES) >= {"pick_taric", "taric_candidates", "cbam_default"}
+
+
+def test_registering_undeclared_parameter_fails():
+    with pytest.raises(ValueError, match="undeclared parameters"):
+        queries.Query("broken", "SELECT 1 WHERE a = :a", {})
+
+
+def test_fetch_maps_rows_onto_records(monkeypatch):
+    monkeypatch.setattr(
+        queries,
+        "fetch_rows",
+        lambda conn, query, **params: [("7208109000", "72081000", None, None, "other")],
+    )
+
+    records = queries.fetch(None, repo._PICK_TARIC, repo.TaricRecord, hs_code8="72081000")
+
+    assert records == [repo.TaricRecord("7208109000", "72081000", None, None, "other")]
@@ -0,0 +1,474 @@
+"""Repository tests that run against a real Postgres instance.
+
+They are skipped unless ``CLASSIFIER_TEST_DATABASE_URL`` points at a database where
+the test user may create schemas. Every run works inside a throw-away schema that
+receives the ``ops/migrations`` files on top of minimal base tables.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import uuid
+from datetime import date
+
+import pytest
+from packages.benchmarks.seed import BASE_SCHEMA, MIGRATIONS_DIR
+from packages.classifier import refresh, repo
+
+DATABASE_URL = os.getenv("CLASSIFIER_TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL, reason="CLASSIFIER_TEST_DATABASE_URL is not configured"
+)
+
+_NOMENCLATURE = [
+    ("7208100000", "72081000", "Flat-rolled, in coils", date(2020, 1, 1), None),
+    ("7208101000", "72081000", "Flat-rolled, patterned", date(2020, 1, 1), date(2023, 6, 30)),
+    ("7208109000", "72081000", "Flat-rolled, other", date(2023, 7, 1), None),
+    ("72081000", "72081000", "Flat-rolled products", date(2019, 1, 1), None),
+    ("7601100000", "76011000", "Aluminium, not alloyed", date(2021, 1, 1), None),
+    ("7601200010", "76012000", "Aluminium alloys, slabs", date(2021, 1, 1), None),
+    ("7601200090", "76012000", "Aluminium alloys, other", date(2021, 1, 1), None),
+]
+_MEASURES = [
+    ("7208101000", "NL", date(2020, 1, 1), None),
+    ("7208109000", None, date(2023, 7, 1), None),
+    ("72081000", "DE", date(2019, 1, 1), None),
+    ("7601200090", "NL", date(2022, 1, 1), date(2022, 12, 31)),
+]
+
+
+@pytest.fixture(scope="module")
+def conn():
+    from sqlalchemy import create_engine
+
+    engine = create_engine(DATABASE_URL, future=True)
+    schema = f"classifier_test_{uuid.uuid4().hex[:12]}"
+    with engine.connect() as connection:
+        connection.exec_driver_sql(f"CREATE SCHEMA {schema}")
+        connection.exec_driver_sql(f"SET search_path TO {schema}, public")
+        connection.exec_driver_sql(BASE_SCHEMA)
+        for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            connection.exec_driver_sql(migration.read_text())
+        connection.exec_driver_sql(
+            "INSERT INTO taric_nomenclature (code, cn_code, description, valid_from, valid_to) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            _NOMENCLATURE,
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO taric_measures (taric_code, country_code, valid_from, valid_to) "
+            "VALUES (%s, %s, %s, %s)",
+            _MEASURES,
+        )
+        connection.commit()
+        refresh.refresh_reference_views(connection, force=True)
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            connection.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+            connection.commit()
+    engine.dispose()
+
+
+def _loop_pick(conn, hs_code8, country, ref_date):
+    """Reference implementation: probe measures candidate by candidate."""
+
+    candidates = repo.taric_candidates(conn, hs_code8, ref_date)
+    for candidate in candidates:
+        if repo.measure_matches(conn, candidate.taric_code, country, ref_date):
+            return candidate
+    return candidates[0] if candidates else None
+
+
+_PARITY_KEYS = list(
+    itertools.product(
+        ["72081000", "76012000", "76011000", "99999999"],
+        ["NL", "DE", "FR"],
+        [date(2019, 6, 1), date(2022, 6, 1), date(2023, 6, 30), date(2024, 1, 1)],
+    )
+)
+
+
+@pytest.mark.parametrize("hs_code8,country,ref_date", _PARITY_KEYS)
+def test_pick_most_specific_taric_matches_measure_loop(conn, hs_code8, country, ref_date):
+    assert repo.pick_most_specific_taric(conn, hs_code8, country, ref_date) == _loop_pick(
+        conn, hs_code8, country, ref_date
+    )
+
+
+def test_pick_most_specific_taric_many_matches_single_lookups(conn):
+    picked = repo.pick_most_specific_taric_many(conn, _PARITY_KEYS)
+
+    assert picked == {key: _loop_pick(conn, *key) for key in _PARITY_KEYS}
+
+
+def test_bulk_lookups_match_single_lookups(conn):
+    conn.exec_driver_sql(
+        "INSERT INTO bti_rulings (id, ruling_ref, hs_code8, taric_code, country_scope, "
+        "valid_from, valid_to, precedence) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        [
+            (str(uuid.uuid4()), "NL-1", "72081000", "7208100000", "NL", date(2020, 1, 1), None, 10),
+            (str(uuid.uuid4()), "EU-1", "72081000", None, None, date(2020, 1, 1), None, 50),
+            (str(uuid.uuid4()), "EU-2", "76012000", None, None, date(2022, 1, 1), None, 20),
+        ],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO cbam_default_emissions (hs_code8, country_code, emission_intensity, source, "
+        "valid_from) VALUES ('72081000', NULL, 1.9, 'EU', '2020-01-01'), "
+        "('72081000', 'NL', 2.1, 'NL', '2022-01-01'), ('76012000', NULL, 8.0, 'EU', NULL)"
+    )
+    conn.exec_driver_sql("REFRESH MATERIALIZED VIEW mv_cbam_default_ranges")
+    ruling_keys = [
+        (hs_code8, taric_code, country, ref_date)
+        for hs_code8, country, ref_date in _PARITY_KEYS
+        for taric_code in (None, "7208100000")
+    ]
+    try:
+        rulings = repo.get_applicable_rulings_many(conn, ruling_keys)
+        expected_rulings = {key: repo.get_applicable_rulings(conn, *key) for key in ruling_keys}
+        defaults = repo.get_cbam_defaults_many(conn, _PARITY_KEYS)
+        expected_defaults = {key: repo.get_cbam_default(conn, *key) for key in _PARITY_KEYS}
+    finally:
+        conn.rollback()
+    candidate_keys = [(hs_code8, ref_date) for hs_code8, _, ref_date in _PARITY_KEYS]
+    measure_keys = [
+        (code, country, ref_date)
+        for code, *_ in _NOMENCLATURE
+        for _, country, ref_date in _PARITY_KEYS
+    ]
+    codes = [code for code, *_ in _NOMENCLATURE] + ["9999999999"]
+
+    assert rulings == expected_rulings
+    assert any(rulings.values())
+    assert defaults == expected_defaults
+    assert repo.taric_candidates_many(conn, candidate_keys) == {
+        key: repo.taric_candidates(conn, *key) for key in candidate_keys
+    }
+    assert repo.measure_matches_many(conn, measure_keys) == {
+        key for key in measure_keys if repo.measure_matches(conn, *key)
+    }
+    assert repo.taric_validity_many(conn, codes) == {
+        code: repo.taric_validity(conn, code) for code in codes
+    }
+
+
+def test_mv_today_path_matches_view_path(conn, monkeypatch):
+    conn.exec_driver_sql("REFRESH MATERIALIZED VIEW mv_hs_taric_today")
+    monkeypatch.setattr(repo, "_mv_today_state", None)
+    today = repo._mv_today(conn)
+    keys = [(hs_code8, country, today) for hs_code8, country, _ in _PARITY_KEYS]
+
+    via_mv = repo.pick_most_specific_taric_many(conn, keys)
+    candidates_via_mv = repo.taric_candidates_many(conn, [(key[0], today) for key in keys])
+    monkeypatch.setattr(repo, "_MV_TODAY_ENABLED", False)
+    monkeypatch.setattr(repo, "_mv_today_state", None)
+
+    assert today is not None
+    assert via_mv == repo.pick_most_specific_taric_many(conn, keys)
+    assert candidates_via_mv == repo.taric_candidates_many(conn, [(key[0], today) for key in keys])
+
+
+def test_range_views_match_is_valid_on(conn):
+    mismatches = repo._fetchall(
+        conn,
+        """
+        SELECT m.taric_code, d::date AS ref_date
+        FROM v_taric_measures m
+        CROSS JOIN generate_series(DATE '2018-12-30', DATE '2024-01-02', INTERVAL '1 day') d
+        WHERE is_valid_on(m.valid_from, m.valid_to, d::date)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM mv_taric_measure_ranges r
+              WHERE r.taric_code = m.taric_code
+                AND r.country_code IS NOT DISTINCT FROM m.country_code
+                AND r.validity @> d::date
+          )
+        """,
+    )
+
+    assert mismatches == []
+
+
+def test_pick_prefers_code_with_measure_over_longer_code(conn):
+    record = repo.pick_most_specific_taric(conn, "72081000", "DE", date(2022, 6, 1))
+
+    assert record is not None
+    assert record.taric_code == "72081000"
+
+
+def test_bulk_snapshot_and_draft_writes_round_trip(conn):
+    from packages.classifier.types import ClassificationResult
+
+    shipment_ids = [str(uuid.uuid4()) for _ in range(3)]
+    conn.exec_driver_sql(
+        "INSERT INTO shipments (id, arrived_at, country_code) VALUES (%s, %s, %s)",
+        [(shipment_id, date(2024, 1, 1), "NL") for shipment_id in shipment_ids],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO cbam_default_emissions (hs_code8, country_code, emission_intensity, source) "
+        "VALUES ('72081000', NULL, 1.9, 'EU default'), ('72081000', 'NL', 2.1, 'NL default')"
+    )
+    conn.exec_driver_sql("REFRESH MATERIALIZED VIEW mv_cbam_default_ranges")
+    result = ClassificationResult(
+        hs_code8="72081000", taric_code="7208109000", source="DIRECT_TARIC"
+    )
+    try:
+        written = repo.persist_classification_snapshots(
+            conn,
+            [
+                (shipment_id, "72081000", "7208109000", None, "DIRECT_TARIC", date(2024, 1, 1))
+                for shipment_id in shipment_ids[:2]
+            ],
+            commit=False,
+        )
+        snapshots = repo.latest_snapshots_many(conn, shipment_ids)
+        defaults = repo.get_cbam_defaults_many(
+            conn, [("72081000", "NL", date(2024, 1, 1)), ("72081000", "FR", date(2024, 1, 1))]
+        )
+        drafted = repo.upsert_cbam_report_drafts(
+            conn,
+            [(shipment_id, result, 2.1, "NL default") for shipment_id in shipment_ids]
+            + [(shipment_ids[0], result, 3.0, "override")],
+            commit=False,
+        )
+        rerun = repo.upsert_cbam_report_drafts(
+            conn,
+            [(shipment_ids[0], result, 3.0, "override"), (shipment_ids[1], result, 2.5, "NL")]
+            + [(shipment_ids[2], result, 2.1, "NL default")],
+            commit=False,
+        )
+        drafts = repo._fetchall(
+            conn,
+            "SELECT shipment_id::text AS shipment_id, emission_intensity FROM cbam_report_drafts "
+            "WHERE shipment_id = ANY(CAST(:ids AS uuid[]))",
+            ids=shipment_ids,
+        )
+    finally:
+        conn.rollback()
+
+    assert written == 2
+    assert set(snapshots) == set(shipment_ids[:2])
+    assert snapshots[shipment_ids[0]]["taric_code"] == "7208109000"
+    assert defaults[("72081000", "NL", date(2024, 1, 1))].source == "NL default"
+    assert defaults[("72081000", "FR", date(2024, 1, 1))].source == "EU default"
+    assert drafted == repo.DraftUpsertCounts(inserted=3)
+    assert rerun == repo.DraftUpsertCounts(updated=1, unchanged=2)
+    assert {row["shipment_id"]: row["emission_intensity"] for row in drafts} == {
+        shipment_ids[0]: 3.0,
+        shipment_ids[1]: 2.5,
+        shipment_ids[2]: 2.1,
+    }
+
+
+_HS_CODES = [
+    ("72081000", "Flat-rolled products of iron, in coils, with patterns in relief"),
+    ("72082500", "Flat-rolled products of iron, in coils, of a thickness of 4.75 mm or more"),
+    ("76011000", "Unwrought aluminium, not alloyed"),
+    ("76012000", "Unwrought aluminium alloys"),
+]
+
+
+@pytest.fixture
+def hs_codes(conn):
+    conn.exec_driver_sql(
+        "INSERT INTO hs_codes (hs_code8, description, valid_from) VALUES (%s, %s, '2020-01-01')",
+        _HS_CODES,
+    )
+    try:
+        yield
+    finally:
+        conn.rollback()
+
+
+def test_rank_hs_from_text_orders_by_word_similarity(conn, hs_codes):
+    matches = repo.rank_hs_from_text(conn, "aluminium alloys", date(2024, 1, 1), top_k=2)
+
+    assert [match.hs_code8 for match in matches][0] == "76012000"
+    assert len(matches) <= 2
+    assert matches == sorted(matches, key=lambda match: -match.score)
+
+
+def test_trigram_mode_derives_best_match_in_bulk(conn, hs_codes, monkeypatch):
+    monkeypatch.setattr(repo, "TEXT_MATCH_MODE", "trigram")
+    hints = [("aluminium alloys", date(2024, 1, 1)), ("unwrought aluminium", date(2024, 1, 1))]
+
+    derived = repo.derive_hs_from_text_many(conn, hints)
+
+    assert derived == {hint: repo.derive_hs_from_text(conn, *hint) for hint in hints}
+    assert derived[hints[0]] == "76012000"
+
+
+_RULINGS = [
+    ("BTI-NL-1", "72081000", "7208109000", "NL", date(2023, 1, 1), None, 10),
+    ("BTI-EU-1", "72081000", None, None, date(2021, 1, 1), date(2025, 12, 31), 50),
+    ("BTI-DE-1", "76012000", "7601200090", "DE", date(2022, 1, 1), None, 20),
+]
+
+
+@pytest.fixture
+def seeded(conn, hs_codes):
+    conn.exec_driver_sql(
+        "INSERT INTO bti_rulings "
+        "(id, ruling_ref, hs_code8, taric_code, country_scope, valid_from, valid_to, precedence) "
+        "VALUES (gen_random_uuid(), %s, %s, %s, %s, %s, %s, %s)",
+        _RULINGS,
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO cbam_default_emissions (hs_code8, country_code, emission_intensity, source) "
+        "VALUES ('72081000', NULL, 1.9, 'EU default'), ('76012000', 'NL', 8.4, 'NL default')"
+    )
+    conn.exec_driver_sql("REFRESH MATERIALIZED VIEW mv_cbam_default_ranges")
+    conn.exec_driver_sql("ANALYZE")
+    yield
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    scans = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", ()):
+        scans.extend(_seq_scans(child))
+    return scans
+
+
+def _exercise_lookups(conn, today):
+    from packages.classifier.types import ClassificationResult
+
+    past = date(2022, 6, 1)
+    shipment_id = str(uuid.uuid4())
+    result = ClassificationResult(hs_code8="72081000", taric_code="7208109000", source="BTI")
+
+    repo.get_applicable_rulings(conn, "72081000", "7208109000", "NL", past)
+    repo.get_applicable_rulings_many(conn, [("72081000", "7208109000", "NL", past)])
+    repo.taric_validity(conn, "7208109000")
+    repo.taric_validity_many(conn, ["7208109000", "72081000"])
+    for ref_date in (past, today):
+        repo.taric_candidates(conn, "72081000", ref_date)
+        repo.pick_most_specific_taric(conn, "72081000", "NL", ref_date)
+    repo.taric_candidates_many(conn, [("72081000", past), ("72081000", today)])
+    repo.pick_most_specific_taric_many(conn, [("72081000", "NL", past), ("72081000", "NL", today)])
+    repo.measure_matches(conn, "7208109000", "NL", past)
+    repo.measure_matches_many(conn, [("7208109000", "NL", past)])
+    repo.taric_stable_interval(conn, "72081000", "NL", past)
+    repo.derive_hs_from_text(conn, "unwrought aluminium", past)
+    repo.derive_hs_from_text_many(conn, [("unwrought aluminium", past)])
+    repo.rank_hs_from_text(conn, "aluminium alloys", past)
+    repo.latest_snapshot(conn, shipment_id)
+    repo.latest_snapshots_many(conn, [shipment_id])
+    repo.get_cbam_default(conn, "72081000", "NL", past)
+    repo.get_cbam_defaults_many(conn, [("76012000", "NL", past)])
+    repo.upsert_cbam_report_draft(conn, shipment_id, result, 1.9, "EU default", commit=False)
+    repo.upsert_cbam_report_drafts(conn, [(shipment_id, result, 2.0, "EU")], commit=False)
+
+
+@pytest.mark.parametrize("text_match_mode", ["ilike", "trigram"])
+def test_classifier_queries_never_plan_sequential_scans(conn, seeded, monkeypatch, text_match_mode):
+    from sqlalchemy import event
+
+    monkeypatch.setattr(repo, "TEXT_MATCH_MODE", text_match_mode)
+    # Raw prepared-statement cursors bypass the engine events used to record SQL.
+    monkeypatch.setattr(repo.queries, "PREPARED_STATEMENTS", False)
+    conn.exec_driver_sql("REFRESH MATERIALIZED VIEW mv_hs_taric_today")
+    monkeypatch.setattr(repo, "_mv_today_state", None)
+    today = repo._mv_today(conn)
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", record)
+    try:
+        _exercise_lookups(conn, today)
+    finally:
+        event.remove(conn, "before_cursor_execute", record)
+
+    # With sequential scans priced out, a Seq Scan in the plan means no index fits.
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    try:
+        offenders = {}
+        for statement, parameters in statements:
+            plan = conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            ).scalar_one()
+            scans = _seq_scans(plan[0]["Plan"])
+            if scans:
+                offenders[statement] = scans
+    finally:
+        conn.rollback()
+
+    assert len(statements) >= 20
+    assert offenders == {}
+
+
+def test_migrations_declare_unique_indexes_for_concurrent_refresh(conn):
+    indexes = {
+        row["indexname"]
+        for row in repo._fetchall(
+            conn, "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+        )
+    }
+    state = repo._fetchall(conn, "SELECT view_name FROM reference_refresh_state")
+    results = refresh.refresh_reference_views(conn, force=True, views=["mv_taric_measure_ranges"])
+
+    names = {view.name for view in refresh.REFERENCE_VIEWS}
+    assert {f"uq_{name}_key" for name in names} <= indexes
+    assert {row["view_name"] for row in state} == names
+    assert [(result.view, result.concurrently) for result in results] == [
+        ("mv_taric_measure_ranges", True)
+    ]
+
+
+def test_duplicate_cbam_defaults_refresh_concurrently(conn):
+    insert = (
+        "INSERT INTO cbam_default_emissions (hs_code8, country_code, emission_intensity, source, "
+        "valid_from) VALUES ('72089900', 'NL', %s, 'dup', '2024-01-01')"
+    )
+    conn.exec_driver_sql(insert, (1.5,))
+    conn.exec_driver_sql(insert, (2.5,))
+    conn.commit()
+    try:
+        results = refresh.refresh_reference_views(
+            conn, force=True, views=["mv_cbam_default_ranges"]
+        )
+        rows = repo._fetchall(
+            conn,
+            "SELECT emission_intensity FROM mv_cbam_default_ranges WHERE hs_code8 = '72089900'",
+        )
+    finally:
+        conn.exec_driver_sql("DELETE FROM cbam_default_emissions WHERE hs_code8 = '72089900'")
+        conn.commit()
+        refresh.refresh_reference_views(conn, force=True, views=["mv_cbam_default_ranges"])
+
+    assert [(result.view, result.concurrently) for result in results] == [
+        ("mv_cbam_default_ranges", True)
+    ]
+    assert [float(row["emission_intensity"]) for row in rows] == [2.5]
+
+
+def test_watermark_moves_only_when_a_source_write_commits(conn):
+    view = next(view for view in refresh.REFERENCE_VIEWS if view.name == "mv_cbam_default_ranges")
+    insert = (
+        "INSERT INTO cbam_default_emissions (hs_code8, emission_intensity) VALUES ('72081000', 1.5)"
+    )
+    before = refresh.source_watermark(conn, view)
+    conn.exec_driver_sql(insert)
+    conn.rollback()
+    after_rollback = refresh.source_watermark(conn, view)
+    conn.exec_driver_sql(insert)
+    conn.commit()
+
+    assert after_rollback == before
+    assert refresh.source_watermark(conn, view) != before
+
+
+def test_registered_lookups_run_as_server_prepared_statements(conn, monkeypatch):
+    monkeypatch.setattr(repo, "_mv_today_state", (float("inf"), None))
+    prepared_before = repo.pick_most_specific_taric(conn, "72081000", "NL", date(2022, 6, 1))
+    prepared_again = repo.pick_most_specific_taric(conn, "72081000", "NL", date(2022, 6, 1))
+    names = {row["name"] for row in repo._fetchall(conn, "SELECT name FROM pg_prepared_statements")}
+    monkeypatch.setattr(repo.queries, "PREPARED_STATEMENTS", False)
+    compiled = repo.pick_most_specific_taric(conn, "72081000", "NL", date(2022, 6, 1))
+    conn.rollback()
+
+    assert "classifier_pick_taric" in names
+    assert prepared_before == prepared_again == compiled
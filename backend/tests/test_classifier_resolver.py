@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import re
 from contextlib import contextmanager
 from datetime import date
 from types import SimpleNamespace
 
 import pytest
-from packages.classifier import resolver
+from packages.classifier import repo, resolver
 from packages.classifier.rules import RulingCandidate
-from packages.classifier.types import ClassificationContext
+from packages.classifier.types import Classification, ClassificationContext
+from psycopg2.extensions import adapt
+from pydantic import ValidationError
+
+
+@pytest.fixture(autouse=True)
+def _no_taric_cache(monkeypatch):
+    # Each test fakes its own picks; a shared memo would leak them across tests.
+    monkeypatch.setattr(repo, "_TARIC_CACHE", None)
 
 
 @contextmanager
@@ -131,11 +140,335 @@ def test_ambiguous_when_taric_candidates_without_measure(monkeypatch):
 
 def test_missing_hs_hint_raises(monkeypatch):
     monkeypatch.setattr(resolver.repo, "get_connection", _fake_conn)
-    monkeypatch.setattr(
-        resolver.repo, "derive_hs_from_text", lambda conn, text, ref: None
-    )
+    monkeypatch.setattr(resolver.repo, "derive_hs_from_text", lambda conn, text, ref: None)
 
     with pytest.raises(ValueError):
         resolver.classify(
             _default_ctx(hs_hint=None, text_hint=None),
         )
+
+
+_TARICS = {
+    "12345678": [
+        SimpleNamespace(
+            taric_code="1234567890",
+            hs_code8="12345678",
+            valid_from=date(2023, 1, 1),
+            valid_to=None,
+            description="Specific TARIC",
+        ),
+        SimpleNamespace(
+            taric_code="12345678",
+            hs_code8="12345678",
+            valid_from=date(2020, 1, 1),
+            valid_to=None,
+            description="Parent TARIC",
+        ),
+    ],
+    "87654321": [
+        SimpleNamespace(
+            taric_code="8765432100",
+            hs_code8="87654321",
+            valid_from=date(2023, 1, 1),
+            valid_to=None,
+            description="Plain TARIC",
+        )
+    ],
+}
+_MEASURES = {("12345678", "NL")}
+_RULINGS = {
+    "87654321": [
+        RulingCandidate(
+            id="r9",
+            hs_code8="87654321",
+            taric_code=None,
+            precedence=5,
+            valid_from="2023-01-01",
+            valid_to=None,
+            source="HS ruling",
+        )
+    ]
+}
+_TEXT = {"steel": "87654321"}
+
+
+def _install_fake_reference_data(monkeypatch):
+    def pick(conn, hs, country, ref):
+        candidates = _TARICS.get(hs, [])
+        for candidate in candidates:
+            if (candidate.taric_code, country) in _MEASURES:
+                return candidate
+        return candidates[0] if candidates else None
+
+    def rulings(conn, hs, taric, country, ref):
+        return _RULINGS.get(taric, []) if taric and taric in _RULINGS else _RULINGS.get(hs, [])
+
+    monkeypatch.setattr(resolver.repo, "get_connection", _fake_conn)
+    monkeypatch.setattr(resolver.repo, "pick_most_specific_taric", pick)
+    monkeypatch.setattr(resolver.repo, "get_applicable_rulings", rulings)
+    monkeypatch.setattr(
+        resolver.repo, "taric_validity", lambda conn, code: (date(2023, 1, 1), None)
+    )
+    monkeypatch.setattr(
+        resolver.repo, "taric_candidates", lambda conn, hs, ref: _TARICS.get(hs, [])
+    )
+    monkeypatch.setattr(
+        resolver.repo, "derive_hs_from_text", lambda conn, text, ref: _TEXT.get(text)
+    )
+    monkeypatch.setattr(
+        resolver.repo,
+        "pick_most_specific_taric_many",
+        lambda conn, keys: {key: pick(conn, *key) for key in keys},
+    )
+    monkeypatch.setattr(
+        resolver.repo,
+        "get_applicable_rulings_many",
+        lambda conn, keys: {key: rulings(conn, *key) for key in keys},
+    )
+    monkeypatch.setattr(
+        resolver.repo,
+        "taric_validity_many",
+        lambda conn, codes: {code: (date(2023, 1, 1), None) for code in codes},
+    )
+    monkeypatch.setattr(
+        resolver.repo,
+        "taric_candidates_many",
+        lambda conn, keys: {key: _TARICS.get(key[0], []) for key in keys},
+    )
+    monkeypatch.setattr(
+        resolver.repo,
+        "derive_hs_from_text_many",
+        lambda conn, hints: {hint: _TEXT.get(hint[0]) for hint in hints},
+    )
+
+
+def test_classify_many_matches_per_item_path(monkeypatch):
+    _install_fake_reference_data(monkeypatch)
+    contexts = [
+        _default_ctx(shipment_id="S1", hs_hint="1234567890"),
+        _default_ctx(shipment_id="S2", hs_hint="1234567890", origin_country="DE"),
+        _default_ctx(shipment_id="S3", hs_hint=None, text_hint="steel"),
+        _default_ctx(shipment_id="S4", hs_hint="99999999"),
+        _default_ctx(shipment_id="S5", hs_hint="1234567890"),
+    ]
+
+    bulk = resolver.classify_many(contexts)
+
+    assert [result.to_result() for result in bulk] == [resolver.classify(ctx) for ctx in contexts]
+    assert [result.source for result in bulk] == [
+        "DIRECT_TARIC",
+        "DIRECT_TARIC",
+        "BTI",
+        "HS_DERIVED",
+        "DIRECT_TARIC",
+    ]
+    assert bulk[0].taric_code == "12345678"
+    assert bulk[1].taric_code == "1234567890"
+
+
+def test_classify_many_raises_for_unresolvable_context(monkeypatch):
+    _install_fake_reference_data(monkeypatch)
+
+    with pytest.raises(ValueError, match="S2"):
+        resolver.classify_many(
+            [_default_ctx(), _default_ctx(shipment_id="S2", hs_hint=None, text_hint="wood")]
+        )
+
+
+def test_classify_many_skips_unresolvable_context_on_request(monkeypatch):
+    _install_fake_reference_data(monkeypatch)
+    contexts = [
+        _default_ctx(),
+        _default_ctx(shipment_id="S2", hs_hint=None, text_hint="wood"),
+        _default_ctx(shipment_id="S3", hs_hint=None, text_hint="steel"),
+    ]
+
+    results = resolver.classify_many(contexts, skip_unresolved=True)
+
+    assert results[1] is None
+    assert results[0].to_result() == resolver.classify(contexts[0])
+    assert results[2].to_result() == resolver.classify(contexts[2])
+
+
+class _RecordingConnection:
+    """Records the statements sent through ``repo._fetchall`` and answers with ``rows``."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+
+    def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        return _Result(SimpleNamespace(_mapping=row) for row in self.rows)
+
+
+class _Result(list):
+    def close(self):
+        pass
+
+
+_BIND_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+_ARRAY_PARAM = re.compile(r"CAST\(:(\w+) AS \w+\[\]\)")
+_UNNEST = re.compile(
+    r"unnest\((?P<arrays>(?:\s*CAST\(:\w+ AS \w+\[\]\),?)+)\s*\)"
+    r"\s*WITH ORDINALITY AS k\((?P<columns>[^)]*)\)"
+)
+
+
+def _assert_bulk_statement(statement, params, unique_keys):
+    # Every bind is supplied, and every array holds one entry per unique key.
+    assert set(_BIND_PARAM.findall(statement)) == set(params)
+    for name in _ARRAY_PARAM.findall(statement):
+        assert len(params[name]) == unique_keys
+        assert adapt(params[name]).getquoted().startswith(b"ARRAY[")
+    # unnest(...) WITH ORDINALITY names one column per array, then the ordinal.
+    for unnest in _UNNEST.finditer(statement):
+        columns = [column.strip() for column in unnest["columns"].split(",")]
+        assert len(columns) == len(_ARRAY_PARAM.findall(unnest["arrays"])) + 1
+        assert columns[-1] == "ord"
+    return len(list(_UNNEST.finditer(statement)))
+
+
+def test_bulk_lookups_send_well_formed_array_statements(monkeypatch):
+    monkeypatch.setattr(repo, "_MV_TODAY_ENABLED", False)
+    monkeypatch.setattr(repo, "_mv_today_state", None)
+    ref_date = date(2024, 1, 15)
+    keys = [
+        ("72081000", "NL", ref_date),
+        ("72081000", "NL", ref_date),
+        ("76011000", "DE", ref_date),
+    ]
+    lookups = {
+        "pick": lambda conn: repo.pick_most_specific_taric_many(conn, keys),
+        "rulings": lambda conn: repo.get_applicable_rulings_many(
+            conn, [(hs, "7208100000" if hs == "72081000" else None, c, d) for hs, c, d in keys]
+        ),
+        "candidates": lambda conn: repo.taric_candidates_many(conn, [(k[0], k[2]) for k in keys]),
+        "measures": lambda conn: repo.measure_matches_many(conn, keys),
+        "defaults": lambda conn: repo.get_cbam_defaults_many(conn, keys),
+        "validity": lambda conn: repo.taric_validity_many(
+            conn, ["7208100000", "7208100000", "7601100000"]
+        ),
+    }
+
+    unnests = {}
+    for name, lookup in lookups.items():
+        conn = _RecordingConnection()
+        lookup(conn)
+        [(statement, params)] = conn.statements
+        unnests[name] = _assert_bulk_statement(statement, params, unique_keys=2)
+        if name in {"rulings", "defaults"}:
+            # One LATERAL pick per key, bounded inside the subquery.
+            assert statement.count("CROSS JOIN LATERAL") == unnests[name]
+            assert statement.count("LIMIT") == unnests[name]
+
+    assert unnests == {
+        "pick": 1,
+        "rulings": 2,
+        "candidates": 1,
+        "measures": 1,
+        "defaults": 1,
+        "validity": 0,
+    }
+
+
+def test_bulk_lookups_map_ordinals_back_to_their_keys():
+    ref_date = date(2024, 1, 15)
+    keys = [
+        ("72081000", "NL", ref_date),
+        ("76011000", "DE", ref_date),
+        ("72081000", "NL", ref_date),
+    ]
+    conn = _RecordingConnection(
+        [
+            {
+                "ord": 2,
+                "hs_code8": "76011000",
+                "country_code": None,
+                "emission_intensity": 1.5,
+                "source": "EU default",
+                "valid_from": None,
+                "valid_to": None,
+            }
+        ]
+    )
+
+    defaults = repo.get_cbam_defaults_many(conn, keys)
+
+    # Ordinals are 1-based positions in the de-duplicated arrays.
+    assert conn.statements[0][1]["hs_codes"] == ["72081000", "76011000"]
+    assert defaults[keys[0]] is None
+    assert defaults[keys[1]].emission_intensity == 1.5
+
+    ruling = {
+        "hs_code8": "72081000",
+        "taric_code": None,
+        "precedence": 10,
+        "valid_from": None,
+        "valid_to": None,
+        "source": None,
+    }
+    conn = _RecordingConnection(
+        [
+            {"ord": 1, "match_level": 0, "id": "taric", **ruling},
+            {"ord": 1, "match_level": 1, "id": "hs", **ruling},
+            {"ord": 2, "match_level": 1, "id": "hs-only", **ruling},
+        ]
+    )
+    ruling_keys = [("72081000", "7208100000", "NL", ref_date), ("76011000", None, "DE", ref_date)]
+
+    rulings = repo.get_applicable_rulings_many(conn, ruling_keys)
+
+    assert [candidate.id for candidate in rulings[ruling_keys[0]]] == ["taric"]
+    assert [candidate.id for candidate in rulings[ruling_keys[1]]] == ["hs-only"]
+
+
+@pytest.mark.asyncio
+async def test_classify_async_matches_sync_path(monkeypatch):
+    _install_fake_reference_data(monkeypatch)
+
+    def awaitable(name):
+        sync = getattr(resolver.repo, name)
+
+        async def call(*args):
+            return sync(*args)
+
+        return call
+
+    for name in (
+        "derive_hs_from_text",
+        "pick_most_specific_taric",
+        "get_applicable_rulings",
+        "taric_validity",
+        "taric_candidates",
+    ):
+        monkeypatch.setattr(resolver.async_repo, name, awaitable(name))
+
+    contexts = [
+        _default_ctx(shipment_id="S1", hs_hint="1234567890"),
+        _default_ctx(shipment_id="S3", hs_hint=None, text_hint="steel"),
+        _default_ctx(shipment_id="S4", hs_hint="99999999"),
+    ]
+
+    results = [await resolver.classify_async(ctx, conn=SimpleNamespace()) for ctx in contexts]
+
+    assert results == [resolver.classify(ctx) for ctx in contexts]
+
+
+def test_classification_validates_at_the_result_boundary():
+    compact = Classification("72081000", "7208100000", "DIRECT_TARIC")
+
+    assert compact.to_result().model_dump() == compact._asdict()
+    with pytest.raises(ValidationError):
+        Classification("7208", None, "HS_DERIVED").to_result()
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        repo.TaricRecord("7208100000", "72081000", None, None, None),
+        RulingCandidate("R1", "72081000", None, 1, None, None, "EBTI"),
+    ],
+)
+def test_hot_records_are_slotted(record):
+    assert not hasattr(record, "__dict__")
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from packages.classifier import repo, text_index
+
+_HS_CODES = [
+    {
+        "hs_code8": "72081000",
+        "description": "Flat-rolled products of iron, in coils, with patterns in relief",
+        "valid_from": date(2020, 1, 1),
+        "valid_to": None,
+    },
+    {
+        "hs_code8": "72082500",
+        "description": "Flat-rolled products of iron, in coils, 4.75 mm or more thick",
+        "valid_from": date(2020, 1, 1),
+        "valid_to": None,
+    },
+    {
+        "hs_code8": "76012000",
+        "description": "Aluminiumlegeringen, ongewalste producten",
+        "valid_from": date(2020, 1, 1),
+        "valid_to": None,
+    },
+    {
+        "hs_code8": "76011000",
+        "description": "Unwrought aluminium, not alloyed",
+        "valid_from": date(2020, 1, 1),
+        "valid_to": date(2022, 12, 31),
+    },
+]
+
+
+@pytest.fixture
+def index():
+    built = text_index.HsTextIndex.from_rows("v1", _HS_CODES)
+    text_index.install_index(built)
+    yield built
+    text_index.install_index(None)
+
+
+def test_analyze_folds_stems_and_drops_stop_words():
+    assert text_index.analyze("Producten van Aluminium") == ["product", "aluminium"]
+    assert text_index.analyze("Flat-rolled PRODUCTS, in coils") == [
+        "flat",
+        "roll",
+        "product",
+        "coil",
+    ]
+    assert text_index.analyze("Café 4.75") == ["caf", "4", "75"]
+
+
+def test_search_ranks_rarer_terms_higher(index):
+    matches = index.search("rolled coils with relief patterns", top_k=2)
+
+    assert [match.hs_code8 for match in matches] == ["72081000", "72082500"]
+    assert matches[0].score > matches[1].score
+
+
+def test_search_respects_validity(index):
+    assert index.best_match("unwrought aluminium", date(2021, 6, 1)) == "76011000"
+    assert index.best_match("unwrought aluminium", date(2024, 1, 1)) is None
+    assert index.best_match("ongewalst product", date(2024, 1, 1)) == "76012000"
+
+
+def test_search_many_matches_single_searches(index):
+    queries = [
+        ("iron coils", date(2024, 1, 1)),
+        ("aluminium", date(2021, 1, 1)),
+        ("iron coils", date(2024, 1, 1)),
+        ("nothing relevant", None),
+    ]
+
+    results = index.search_many(queries, top_k=3)
+
+    assert list(results) == [queries[0], queries[1], queries[3]]
+    assert results == {key: index.search(*key, top_k=3) for key in results}
+    assert results[queries[3]] == []
+
+
+def test_repo_derives_from_installed_index_without_connection(index):
+    assert repo.derive_hs_from_text(None, "iron coils relief", date(2024, 1, 1)) == "72081000"
+    derived = repo.derive_hs_from_text_many(
+        None, [("ongewalste producten", date(2024, 1, 1)), ("zzz", date(2024, 1, 1))]
+    )
+    assert derived == {
+        ("ongewalste producten", date(2024, 1, 1)): "76012000",
+        ("zzz", date(2024, 1, 1)): None,
+    }
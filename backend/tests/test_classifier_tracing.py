@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from app.api.routes import internal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from packages.classifier import Classification, resolver, tracing
+from packages.classifier.types import ClassificationContext
+from packages.emissions_linker import EmissionLinkResult
+
+_CTX = ClassificationContext(
+    shipment_id="S1",
+    ref_date=date(2024, 1, 15),
+    origin_country="NL",
+    hs_hint="7208100000",
+    text_hint=None,
+    weight_kg=100.0,
+)
+
+
+@pytest.fixture(autouse=True)
+def histograms(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    monkeypatch.setattr(tracing, "_OBSERVERS", [])
+    monkeypatch.setattr(tracing, "_TIMING_OBSERVERS", [])
+    tracing.reset_histograms()
+    yield
+    tracing.reset_histograms()
+
+
+@pytest.fixture
+def fake_repo(monkeypatch):
+    @contextmanager
+    def connection(primary=None):
+        yield SimpleNamespace()
+
+    def pick(conn, hs_code8, country, ref_date):
+        tracing.record_query()
+        tracing.record_path("pick_most_specific_taric", "view")
+        return SimpleNamespace(
+            taric_code="7208100000", valid_from=None, valid_to=None, description="Flat-rolled"
+        )
+
+    def rulings(conn, hs_code8, taric_code, country, ref_date):
+        tracing.record_query()
+        return []
+
+    monkeypatch.setattr(resolver.repo, "get_read_connection", connection)
+    monkeypatch.setattr(resolver.repo, "_TARIC_CACHE", None)
+    monkeypatch.setattr(resolver.repo, "pick_most_specific_taric", pick)
+    monkeypatch.setattr(resolver.repo, "get_applicable_rulings", rulings)
+
+
+def test_forced_trace_records_branch_stages_and_queries(fake_repo):
+    with tracing.traced(force=True) as trace:
+        result = resolver.classify(_CTX)
+
+    assert result.source == trace.branch == "DIRECT_TARIC"
+    assert [stage.name for stage in trace.stages] == ["resolve_hs", "pick_taric", "rulings"]
+    assert [stage.queries for stage in trace.stages] == [0, 1, 1]
+    assert trace.queries == 2
+    assert trace.as_dict()["lookup_paths"] == {"pick_most_specific_taric:view": 1}
+
+
+def test_nothing_is_recorded_while_tracing_is_off(fake_repo):
+    with tracing.traced() as trace:
+        resolver.classify(_CTX)
+
+    assert trace is None
+    assert tracing.latency_histograms() == {"branches": {}, "histograms": {}}
+
+
+def test_timing_observers_get_stage_timings_without_full_tracing(fake_repo):
+    observed = []
+    tracing.add_observer(observed.append, detailed=False)
+
+    resolver.classify(_CTX)
+    with tracing.traced(force=True):
+        resolver.classify(_CTX)
+
+    timing, trace = observed
+    assert type(timing) is tracing.Timing and timing.branch == "DIRECT_TARIC"
+    assert [stage.name for stage in timing.stages] == ["resolve_hs", "pick_taric", "rulings"]
+    assert [stage.queries for stage in timing.stages] == [0, 0, 0]
+    assert trace.detailed and trace.queries == 2
+
+
+def test_enabled_tracing_aggregates_histograms(fake_repo, monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+
+    for _ in range(3):
+        resolver.classify(_CTX)
+
+    latencies = tracing.latency_histograms()
+    assert latencies["branches"] == {"DIRECT_TARIC": 3}
+    assert latencies["histograms"]["total"]["count"] == 3
+    assert sum(latencies["histograms"]["stage:pick_taric"]["counts"]) == 3
+    assert set(latencies["histograms"]) >= {"branch:DIRECT_TARIC", "stage:rulings"}
+
+
+def test_classify_endpoint_returns_trace_on_request(monkeypatch):
+    @asynccontextmanager
+    async def connection():
+        yield None
+
+    async def get_shipments(conn, shipment_ids):
+        return {str(shipment_id): {"id": str(shipment_id)} for shipment_id in shipment_ids}
+
+    async def link(shipment, *, force, conn):
+        with tracing.stage("persist_draft"):
+            tracing.set_branch("SNAPSHOT")
+        return EmissionLinkResult(
+            shipment_id=shipment["id"],
+            classification=Classification("72081000", "7208100000", "SNAPSHOT"),
+            emission_intensity=None,
+            emission_source=None,
+        )
+
+    monkeypatch.setattr(internal.classifier_async_repo, "get_async_connection", connection)
+    monkeypatch.setattr(internal, "_get_shipments", get_shipments)
+    monkeypatch.setattr(internal, "classify_and_link_async", link)
+    app = FastAPI()
+    app.include_router(internal.router, prefix="/internal")
+    client = TestClient(app)
+    shipment_id = "00000000-0000-0000-0000-000000000001"
+
+    traced = client.post(f"/internal/classify?shipment_id={shipment_id}&trace=1").json()
+    plain = client.post(f"/internal/classify?shipment_id={shipment_id}").json()
+
+    assert traced["trace"]["branch"] == "SNAPSHOT"
+    assert [stage["name"] for stage in traced["trace"]["stages"]] == ["persist_draft"]
+    assert "trace" not in plain
+    assert client.get("/internal/latency").json()["branches"] == {"SNAPSHOT": 1}
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from packages.classifier import Classification, ClassificationResult
+from packages.emissions_linker import linker
+
+_RECORD = {
+    "id": "S1",
+    "arrived_at": date(2024, 1, 15),
+    "country_code": "NL",
+    "hs_code": "7208100000",
+    "description": None,
+    "net_weight_kg": 12.5,
+}
+_RESULT = ClassificationResult(hs_code8="72081000", taric_code="7208100000", source="DIRECT_TARIC")
+
+
+class _FakeConnection:
+    def __init__(self) -> None:
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+def _install_fakes(monkeypatch, *, fail_on_draft: bool = False):
+    conn = _FakeConnection()
+    checkouts = []
+    writes = []
+
+    @contextmanager
+    def get_connection():
+        checkouts.append(conn)
+        yield conn
+
+    def classify(ctx, shared_conn=None):
+        assert shared_conn is conn
+        return Classification.from_result(_RESULT)
+
+    def persist(shared_conn, *args, commit=True):
+        assert shared_conn is conn
+        writes.append(("snapshot", commit))
+
+    def upsert(shared_conn, *args, commit=True):
+        assert shared_conn is conn
+        if fail_on_draft:
+            raise RuntimeError("draft write failed")
+        writes.append(("draft", commit))
+
+    monkeypatch.setattr(linker.classifier_repo, "get_connection", get_connection)
+    monkeypatch.setattr(linker.classifier_repo, "latest_snapshot", lambda c, shipment_id: None)
+    monkeypatch.setattr(linker.classifier_repo, "get_cbam_default", lambda c, *args: None)
+    monkeypatch.setattr(linker.classifier_repo, "persist_classification_snapshot", persist)
+    monkeypatch.setattr(linker.classifier_repo, "upsert_cbam_report_draft", upsert)
+    monkeypatch.setattr(linker, "classify_compact", classify)
+    return conn, checkouts, writes
+
+
+def test_classify_and_link_uses_one_connection_and_one_commit(monkeypatch):
+    conn, checkouts, writes = _install_fakes(monkeypatch)
+
+    result = linker.classify_and_link(_RECORD)
+
+    assert result.classification == Classification.from_result(_RESULT)
+    assert len(checkouts) == 1
+    assert writes == [("snapshot", False), ("draft", False)]
+    assert conn.commits == 1
+    assert conn.rollbacks == 0
+
+
+def test_classify_and_link_rolls_back_when_a_write_fails(monkeypatch):
+    conn, _, writes = _install_fakes(monkeypatch, fail_on_draft=True)
+
+    with pytest.raises(RuntimeError):
+        linker.classify_and_link(_RECORD)
+
+    assert writes == [("snapshot", False)]
+    assert conn.commits == 0
+    assert conn.rollbacks == 1
+
+
+def _install_bulk_fakes(monkeypatch, snapshots):
+    conn = _FakeConnection()
+    calls = {}
+
+    def classify_many(contexts, shared_conn=None, *, skip_unresolved=False):
+        assert shared_conn is conn
+        calls["classified"] = [ctx.shipment_id for ctx in contexts]
+        return [
+            None if ctx.hs_hint is None else Classification.from_result(_RESULT) for ctx in contexts
+        ]
+
+    def persist_many(shared_conn, rows, *, commit=True):
+        calls["snapshots"] = ([row[0] for row in rows], commit)
+
+    def upsert_many(shared_conn, drafts, *, commit=True):
+        calls["drafts"] = ([draft[0] for draft in drafts], commit)
+        return linker.classifier_repo.DraftUpsertCounts(inserted=1, unchanged=1)
+
+    monkeypatch.setattr(
+        linker.classifier_repo, "latest_snapshots_many", lambda c, ids: dict(snapshots)
+    )
+    monkeypatch.setattr(
+        linker.classifier_repo,
+        "get_cbam_defaults_many",
+        lambda c, keys: {key: None for key in keys},
+    )
+    monkeypatch.setattr(linker.classifier_repo, "persist_classification_snapshots", persist_many)
+    monkeypatch.setattr(linker.classifier_repo, "upsert_cbam_report_drafts", upsert_many)
+    monkeypatch.setattr(linker, "classify_many", classify_many)
+    return conn, calls
+
+
+def test_classify_and_link_many_reuses_fresh_snapshots(monkeypatch):
+    fresh = {
+        "hs_code8": "72081000",
+        "taric_code": "7208100000",
+        "ruling_id": None,
+        "classification_source": "DIRECT_TARIC",
+        "ref_date": _RECORD["arrived_at"],
+    }
+    conn, calls = _install_bulk_fakes(monkeypatch, {"S1": fresh})
+    records = [_RECORD, {**_RECORD, "id": "S2"}, {**_RECORD, "id": "S3", "hs_code": None}]
+
+    linked = linker.classify_and_link_many(records, conn=conn, skip_unresolved=True)
+
+    assert [result.shipment_id for result in linked.results] == ["S1", "S2"]
+    assert linked.drafts == linker.classifier_repo.DraftUpsertCounts(inserted=1, unchanged=1)
+    assert calls["classified"] == ["S2", "S3"]
+    assert calls["snapshots"] == (["S2"], False)
+    assert calls["drafts"] == (["S1", "S2"], False)
+    assert conn.commits == 1
+
+
+def test_classify_and_link_many_skips_invalid_records(monkeypatch):
+    conn, calls = _install_bulk_fakes(monkeypatch, {})
+    records = [{**_RECORD, "country_code": None}, {**_RECORD, "id": "S2"}]
+
+    with pytest.raises(ValueError):
+        linker.classify_and_link_many(records, conn=conn)
+
+    linked = linker.classify_and_link_many(records, conn=conn, skip_unresolved=True)
+    assert [result.shipment_id for result in linked.results] == ["S2"]
+
+
+class _FakeAsyncConnection(_FakeConnection):
+    async def commit(self) -> None:
+        super().commit()
+
+    async def rollback(self) -> None:
+        super().rollback()
+
+
+@pytest.mark.asyncio
+async def test_classify_and_link_async_runs_on_the_callers_connection(monkeypatch):
+    conn = _FakeAsyncConnection()
+    seen = []
+
+    def on(name, value=None):
+        async def call(shared_conn, *args, commit=True):
+            seen.append((name, shared_conn is conn))
+            return value
+
+        return call
+
+    async def classify_async(ctx, shared_conn):
+        seen.append(("classify", shared_conn is conn))
+        return Classification.from_result(_RESULT)
+
+    async_repo = linker.classifier_async_repo
+    monkeypatch.setattr(async_repo, "get_async_connection", None)
+    monkeypatch.setattr(async_repo, "latest_snapshot", on("snapshot"))
+    monkeypatch.setattr(async_repo, "get_cbam_default", on("default"))
+    monkeypatch.setattr(async_repo, "persist_classification_snapshot", on("persist"))
+    monkeypatch.setattr(async_repo, "upsert_cbam_report_draft", on("draft"))
+    monkeypatch.setattr(linker, "classify_compact_async", classify_async)
+
+    result = await linker.classify_and_link_async(_RECORD, conn=conn)
+
+    assert result.classification == Classification.from_result(_RESULT)
+    assert seen == [
+        ("snapshot", True),
+        ("classify", True),
+        ("persist", True),
+        ("default", True),
+        ("draft", True),
+    ]
+    assert (conn.commits, conn.rollbacks) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_classify_and_link_async_prefetches_the_hinted_default_on_a_replica(monkeypatch):
+    conn = _FakeAsyncConnection()
+    replica = object()
+    default = SimpleNamespace(emission_intensity=1.9, source="EU default")
+    default_started = asyncio.Event()
+    lookups = []
+
+    @asynccontextmanager
+    async def read_connection(primary):
+        yield replica
+
+    async def latest_snapshot(shared_conn, shipment_id):
+        assert shared_conn is conn
+        # Only returns once the replica lookup is in flight, i.e. they overlap.
+        await asyncio.wait_for(default_started.wait(), timeout=1)
+        return None
+
+    async def get_cbam_default(reader, hs_code8, country, ref_date):
+        lookups.append((reader is replica, hs_code8))
+        default_started.set()
+        return default
+
+    async def write(shared_conn, *args, commit=True):
+        assert shared_conn is conn
+
+    async def classify_async(ctx, reader):
+        assert reader is replica
+        return Classification.from_result(_RESULT)
+
+    async_repo = linker.classifier_async_repo
+    monkeypatch.setattr(async_repo, "get_async_read_connection", read_connection)
+    monkeypatch.setattr(async_repo, "latest_snapshot", latest_snapshot)
+    monkeypatch.setattr(async_repo, "get_cbam_default", get_cbam_default)
+    monkeypatch.setattr(async_repo, "persist_classification_snapshot", write)
+    monkeypatch.setattr(async_repo, "upsert_cbam_report_draft", write)
+    monkeypatch.setattr(linker, "classify_compact_async", classify_async)
+
+    result = await linker.classify_and_link_async(_RECORD, conn=conn)
+
+    assert lookups == [(True, "72081000")]
+    assert (result.emission_intensity, result.emission_source) == (1.9, "EU default")
+    assert (conn.commits, conn.rollbacks) == (1, 0)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from packages.emissions_linker import batch, parallel
+
+_SHIPMENTS = [{"id": f"00000000-0000-0000-0000-00000000000{i}"} for i in range(1, 6)]
+
+
+def _install_fakes(monkeypatch, linked):
+    @contextmanager
+    def get_connection():
+        yield SimpleNamespace()
+
+    def iter_chunks(conn, after_id=None, *, chunk_size, page_size, limit):
+        pending = [row for row in _SHIPMENTS if after_id is None or row["id"] > after_id]
+        try:
+            for start in range(0, len(pending), chunk_size):
+                yield pending[start : start + chunk_size]
+        finally:
+            linked.append("closed")
+
+    def link_many(chunk, *, conn, force, skip_unresolved):
+        linked.extend(row["id"] for row in chunk)
+        results = [row for row in chunk if not row["id"].endswith("3")]
+        return SimpleNamespace(
+            results=results, drafts=batch.DraftUpsertCounts(updated=1, unchanged=len(results) - 1)
+        )
+
+    monkeypatch.setattr(batch.classifier_repo, "get_connection", get_connection)
+    monkeypatch.setattr(batch, "iter_shipment_chunks", iter_chunks)
+    monkeypatch.setattr(batch, "classify_and_link_many", link_many)
+
+
+def test_run_batch_records_checkpoint_and_stats(monkeypatch, tmp_path):
+    linked = []
+    _install_fakes(monkeypatch, linked)
+    checkpoint = batch.Checkpoint(tmp_path / "linker.json")
+
+    stats = batch.run_batch(chunk_size=2, checkpoint=checkpoint)
+
+    assert linked == [row["id"] for row in _SHIPMENTS] + ["closed"]
+    assert (stats.processed, stats.linked, stats.skipped) == (5, 4, 1)
+    assert stats.drafts == batch.DraftUpsertCounts(updated=3, unchanged=1)
+    saved = json.loads((tmp_path / "linker.json").read_text())
+    assert saved["last_id"] == _SHIPMENTS[-1]["id"]
+    assert saved["processed"] == 5
+    assert saved["drafts"] == {"inserted": 0, "updated": 3, "unchanged": 1}
+
+
+def test_run_batch_resumes_after_checkpoint(monkeypatch, tmp_path):
+    linked = []
+    _install_fakes(monkeypatch, linked)
+    checkpoint = batch.Checkpoint(tmp_path / "linker.json")
+    checkpoint.save(_SHIPMENTS[2]["id"], batch.BatchStats(processed=3))
+
+    stats = batch.run_batch(chunk_size=2, checkpoint=checkpoint)
+
+    assert linked == [row["id"] for row in _SHIPMENTS[3:]] + ["closed"]
+    assert stats.processed == 2
+
+
+def test_run_batch_stops_after_the_chunk_in_flight_on_sigterm(monkeypatch, tmp_path):
+    linked = []
+    _install_fakes(monkeypatch, linked)
+    link_many = batch.classify_and_link_many
+
+    def link_and_terminate(chunk, **kwargs):
+        os.kill(os.getpid(), signal.SIGTERM)
+        return link_many(chunk, **kwargs)
+
+    monkeypatch.setattr(batch, "classify_and_link_many", link_and_terminate)
+    checkpoint = batch.Checkpoint(tmp_path / "linker.json")
+
+    stats = batch.run_batch(chunk_size=2, checkpoint=checkpoint)
+
+    # The reader is closed right away rather than when it is garbage-collected.
+    assert linked == [row["id"] for row in _SHIPMENTS[:2]] + ["closed"]
+    assert stats.processed == 2
+    assert checkpoint.load() == _SHIPMENTS[1]["id"]
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+
+
+def test_run_batch_forks_workers_before_opening_connections(monkeypatch, tmp_path):
+    linked = []
+    _install_fakes(monkeypatch, linked)
+    opened = []
+    get_connection = batch.classifier_repo.get_connection
+
+    @contextmanager
+    def worker_pool(workers):
+        opened.append(("pool", workers))
+        yield "pool"
+
+    @contextmanager
+    def connection():
+        opened.append("connection")
+        with get_connection() as conn:
+            yield conn
+
+    def link_in_parallel(chunks, pool, *, max_pending, force):
+        assert (pool, max_pending) == ("pool", 4)
+        for chunk in chunks:
+            yield (
+                chunk,
+                batch.classify_and_link_many(chunk, conn=None, force=force, skip_unresolved=True),
+            )
+
+    monkeypatch.setattr(batch, "worker_pool", worker_pool)
+    monkeypatch.setattr(batch.classifier_repo, "get_connection", connection)
+    monkeypatch.setattr(batch, "link_chunks_in_parallel", link_in_parallel)
+
+    stats = batch.run_batch(chunk_size=2, workers=2)
+
+    assert opened == [("pool", 2), "connection", "connection"]
+    assert stats.processed == 5
+
+
+class _PagedConnection:
+    """Serves ``_SHIPMENTS`` by keyset page and tracks the open read transaction."""
+
+    def __init__(self):
+        self.in_transaction = False
+        self.pages = 0
+
+    @contextmanager
+    def begin(self):
+        self.in_transaction = True
+        try:
+            yield
+        finally:
+            self.in_transaction = False
+
+    def execution_options(self, *, stream_results, yield_per):
+        self.yield_per = yield_per
+        return self
+
+    def execute(self, statement, params):
+        self.pages += 1
+        rows = [r for r in _SHIPMENTS if params["after_id"] is None or r["id"] > params["after_id"]]
+        rows = rows[: params["page"]]
+        partitions = [rows[i : i + self.yield_per] for i in range(0, len(rows), self.yield_per)]
+        return SimpleNamespace(mappings=lambda: SimpleNamespace(partitions=lambda: partitions))
+
+
+def test_chunks_are_yielded_outside_the_read_transaction():
+    conn = _PagedConnection()
+    chunks = []
+
+    for chunk in batch.iter_shipment_chunks(conn, chunk_size=2, page_size=3):
+        assert not conn.in_transaction
+        chunks.append([row["id"] for row in chunk])
+
+    ids = [row["id"] for row in _SHIPMENTS]
+    assert chunks == [ids[0:2], ids[2:3], ids[3:5]]
+    assert conn.pages == 2
+
+
+def test_parallel_linking_links_each_chunk_on_one_worker_in_order(monkeypatch):
+    def link_many(records, *, force, skip_unresolved):
+        return SimpleNamespace(
+            results=[
+                SimpleNamespace(shipment_id=record["id"], pid=os.getpid()) for record in records
+            ],
+            drafts=batch.DraftUpsertCounts(inserted=len(records)),
+        )
+
+    monkeypatch.setattr(parallel, "classify_and_link_many", link_many)
+    chunks = [[{"id": f"{chunk}-{i}"} for i in range(5)] for chunk in range(6)]
+
+    with parallel.worker_pool(3) as pool:
+        outcomes = list(parallel.link_chunks_in_parallel(iter(chunks), pool, max_pending=2))
+
+    assert [chunk for chunk, _ in outcomes] == chunks
+    for chunk, outcome in outcomes:
+        assert [result.shipment_id for result in outcome.results] == [row["id"] for row in chunk]
+        assert outcome.drafts.inserted == len(chunk)
+        # One worker, hence one transaction, per chunk.
+        assert len({result.pid for result in outcome.results}) == 1
+        assert outcome.results[0].pid != os.getpid()
+
+
+def test_backfill_chunk_writes_snapshots_for_resolved_shipments(monkeypatch):
+    from datetime import date
+
+    from packages.classifier import ClassificationResult
+    from packages.emissions_linker import backfill
+
+    written = []
+    conn = SimpleNamespace(commits=0)
+    conn.commit = lambda: setattr(conn, "commits", conn.commits + 1)
+    result = ClassificationResult(hs_code8="72081000", source="HS_DERIVED")
+
+    def classify_many(contexts, shared_conn, *, skip_unresolved):
+        return [result if ctx.hs_hint else None for ctx in contexts]
+
+    def persist(shared_conn, rows, *, batch_size, commit):
+        written.extend(rows)
+        return len(written)
+
+    monkeypatch.setattr(backfill, "classify_many", classify_many)
+    monkeypatch.setattr(backfill.classifier_repo, "persist_classification_snapshots", persist)
+    base = {"arrived_at": date(2024, 1, 1), "country_code": "NL", "net_weight_kg": 1}
+    records = [
+        {**base, "id": "S1", "hs_code": "72081000"},
+        {**base, "id": "S2", "hs_code": None},
+        {**base, "id": "S3", "hs_code": "72081000", "country_code": None},
+    ]
+
+    assert backfill.backfill_chunk(conn, records) == 1
+    assert written == [("S1", "72081000", None, None, "HS_DERIVED", date(2024, 1, 1))]
+    assert conn.commits == 1
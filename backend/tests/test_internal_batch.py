@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from uuid import UUID
+
+import pytest
+from app.api.routes import internal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from packages.classifier import Classification
+from packages.classifier import repo as classifier_repo
+from packages.emissions_linker import EmissionLinkBatch, EmissionLinkResult
+from starlette.requests import ClientDisconnect
+
+_IDS = [UUID(int=n) for n in range(1, 6)]
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    recorded = {"fetches": [], "batches": []}
+    known = {str(shipment_id) for shipment_id in _IDS[:4]}
+
+    @asynccontextmanager
+    async def connection():
+        yield None
+
+    async def get_shipments(conn, shipment_ids):
+        recorded["fetches"].append(list(shipment_ids))
+        return {
+            str(shipment_id): {"id": str(shipment_id)}
+            for shipment_id in shipment_ids
+            if str(shipment_id) in known
+        }
+
+    def link_many(records, *, force, skip_unresolved):
+        records = list(records)
+        recorded["batches"].append((len(records), force, skip_unresolved))
+        return EmissionLinkBatch(
+            results=[
+                EmissionLinkResult(
+                    shipment_id=record["id"],
+                    classification=Classification("72081000", "7208100000", "DIRECT_TARIC"),
+                    emission_intensity=1.5,
+                    emission_source="EU",
+                )
+                # The third shipment has no derivable HS code.
+                for record in records
+                if record["id"] != str(_IDS[2])
+            ],
+            drafts=classifier_repo.DraftUpsertCounts(),
+        )
+
+    monkeypatch.setattr(internal.classifier_async_repo, "get_async_connection", connection)
+    monkeypatch.setattr(internal, "_get_shipments", get_shipments)
+    monkeypatch.setattr(internal, "classify_and_link_many", link_many)
+    return recorded
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(internal.router, prefix="/internal")
+    return TestClient(app)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_results_in_input_order_per_chunk(client, calls):
+    response = client.post(
+        "/internal/classify/batch?chunk_size=2&force=true", json=[str(i) for i in _IDS]
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = _lines(response)
+    assert [line["shipment_id"] for line in lines] == [str(i) for i in _IDS]
+    assert lines[0]["taric_code"] == "7208100000" and lines[0]["emission_intensity"] == 1.5
+    assert lines[2]["error"] == "Unable to classify shipment"
+    assert lines[4]["error"] == "Shipment not found"
+    assert [len(fetch) for fetch in calls["fetches"]] == [2, 2, 1]
+    assert calls["batches"][0] == (2, True, True)
+
+
+def test_batch_accepts_ndjson_and_drops_duplicates(client, calls):
+    body = f'"{_IDS[0]}"\n{{"shipment_id": "{_IDS[1]}"}}\n\n"{_IDS[0]}"'
+
+    response = client.post(
+        "/internal/classify/batch",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert [line["shipment_id"] for line in _lines(response)] == [str(_IDS[0]), str(_IDS[1])]
+    assert calls["fetches"] == [[_IDS[0], _IDS[1]]]
+
+
+@pytest.mark.parametrize("body", [["not-a-uuid"], {"ids": []}])
+def test_batch_rejects_invalid_ids(client, calls, body):
+    response = client.post("/internal/classify/batch", json=body)
+
+    assert response.status_code == 422
+    assert calls["fetches"] == []
+
+
+def test_batch_validates_classifications_before_emitting_them(client, calls, monkeypatch):
+    def link_many(records, *, force, skip_unresolved):
+        return EmissionLinkBatch(
+            results=[
+                EmissionLinkResult(
+                    shipment_id=record["id"],
+                    classification=Classification("7208", None, "HS_DERIVED"),
+                    emission_intensity=None,
+                    emission_source=None,
+                )
+                for record in records
+            ],
+            drafts=classifier_repo.DraftUpsertCounts(),
+        )
+
+    monkeypatch.setattr(internal, "classify_and_link_many", link_many)
+
+    response = client.post("/internal/classify/batch", json=[str(_IDS[0])])
+
+    assert _lines(response) == [{"shipment_id": str(_IDS[0]), "error": "Invalid classification"}]
+
+
+def test_batch_reports_a_malformed_ndjson_line_after_earlier_chunks(client, calls):
+    body = f'"{_IDS[0]}"\n"{_IDS[1]}"\n"not-a-uuid"\n"{_IDS[3]}"\n'
+
+    response = client.post(
+        "/internal/classify/batch?chunk_size=1",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    lines = _lines(response)
+    assert [line.get("shipment_id") for line in lines] == [str(_IDS[0]), str(_IDS[1]), None]
+    assert lines[-1]["error"] == "Invalid shipment id: 'not-a-uuid'"
+    assert calls["fetches"] == [[_IDS[0]], [_IDS[1]]]
+
+
+def test_batch_limits_json_array_bodies(client, calls, monkeypatch):
+    monkeypatch.setattr(internal, "MAX_JSON_IDS", 2)
+
+    response = client.post("/internal/classify/batch", json=[str(i) for i in _IDS[:3]])
+
+    assert response.status_code == 413
+    assert calls["fetches"] == []
+
+
+@pytest.mark.asyncio
+async def test_ndjson_ids_are_parsed_across_body_chunks_through_a_bounded_queue():
+    ids = internal._NdjsonShipmentIds(maxsize=1)
+    split = f'"{_IDS[2]}"\n'.encode()
+    sent = []
+
+    async def body():
+        for chunk in (f'"{_IDS[0]}"\n"{_IDS[1]}"\n'.encode() + split[:9], split[9:]):
+            sent.append(chunk)
+            yield chunk
+        yield b""
+
+    reading = asyncio.create_task(ids.read(body()))
+    for _ in range(3):
+        await asyncio.sleep(0)
+    # The second id waits until the first one has been taken, so the body is not read on.
+    assert not reading.done() and len(sent) == 1
+
+    assert await _collect(ids) == _IDS[:3]
+    await reading
+
+
+@pytest.mark.asyncio
+async def test_ndjson_ids_end_when_the_client_disconnects():
+    ids = internal._NdjsonShipmentIds(maxsize=4)
+
+    async def body():
+        yield f'"{_IDS[0]}"\n"{_IDS[1]}'.encode()
+        raise ClientDisconnect()
+
+    await ids.read(body())
+
+    assert await _collect(ids) == _IDS[:1]
+
+
+async def _collect(ids):
+    return [shipment_id async for shipment_id in ids]
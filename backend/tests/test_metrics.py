@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from app import metrics
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from packages.classifier import tracing
+from packages.classifier.cache import CacheStats
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def _sample(name, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    metrics.install(app)
+    yield TestClient(app)
+    tracing.remove_observer(metrics._observe_trace)
+
+
+def test_requests_are_labelled_by_route_template(client):
+    labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+    unmatched = {"method": "GET", "route": metrics.UNMATCHED_ROUTE, "status": "404"}
+    before_unmatched = _sample("http_request_duration_seconds_count", **unmatched)
+
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/no/such/path")
+
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert _sample("http_request_duration_seconds_count", **unmatched) == before_unmatched + 1
+    assert _sample("http_requests_in_progress", method="GET") == 0
+
+
+def test_metrics_endpoint_exposes_classifier_traces(client):
+    before = _sample("classifier_stage_duration_seconds_count", stage="pick_taric")
+
+    with tracing.traced() as trace:
+        with tracing.stage("pick_taric"):
+            tracing.set_branch("DIRECT_TARIC")
+    response = client.get("/metrics")
+
+    # Metrics only need timings; full tracing stays off.
+    assert trace is not None and not trace.detailed
+    assert _sample("classifier_stage_duration_seconds_count", stage="pick_taric") == before + 1
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'classifier_classify_duration_seconds_count{branch="DIRECT_TARIC"}' in response.text
+
+
+def test_refresh_mirrors_process_counters_as_increments(monkeypatch):
+    stats = [
+        CacheStats(10, 4, 0, 0, 0, 3),
+        CacheStats(15, 4, 0, 0, 0, 3),
+        CacheStats(2, 1, 0, 0, 0, 1),
+    ]
+    monkeypatch.setattr(metrics, "_MIRRORED", {})
+    before = _sample("classifier_taric_cache_lookups_total", result="hit")
+
+    for current in stats:
+        monkeypatch.setattr(metrics.classifier_repo, "taric_cache_stats", lambda s=current: s)
+        metrics.refresh_classifier_metrics()
+
+    # 10, then +5, then a reset counted as 2 new hits.
+    assert _sample("classifier_taric_cache_lookups_total", result="hit") == before + 17
+    assert _sample("classifier_taric_cache_entries") == 1
+
+
+def test_worker_processes_are_aggregated(tmp_path):
+    script = "from app import metrics; metrics.BATCH_SHIPMENTS.labels('linked').inc(3)"
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+        "PYTHONPATH": os.pathsep.join([str(BACKEND.parent), str(BACKEND)]),
+    }
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", script], env=env, cwd=BACKEND, check=True)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+
+    assert registry.get_sample_value("classifier_batch_shipments_total", {"outcome": "linked"}) == 6
@@ -0,0 +1,7 @@
+-- Trigram index backing text-to-HS lookups on hs_codes.description.
+-- Serves both the ILIKE '%hint%' path and the ranked word_similarity path
+-- (pg_trgm operator <%) through v_hs_codes.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_hs_codes_description_trgm
+  ON hs_codes USING gin (description gin_trgm_ops);
@@ -0,0 +1,28 @@
+-- Rebuild mv_hs_taric_today with its refresh date and validity bounds so the
+-- classifier can serve lookups for that date from the view's index instead of
+-- evaluating is_valid_on over v_taric_nomenclature. Only rebuilds once.
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1
+    FROM pg_attribute
+    WHERE attrelid = to_regclass('mv_hs_taric_today')
+      AND attname = 'as_of'
+      AND NOT attisdropped
+  ) THEN
+    DROP MATERIALIZED VIEW IF EXISTS mv_hs_taric_today;
+    CREATE MATERIALIZED VIEW mv_hs_taric_today AS
+    SELECT t.hs_code8,
+           t.taric_code,
+           t.description,
+           t.valid_from,
+           t.valid_to,
+           CURRENT_DATE AS as_of
+    FROM v_taric_nomenclature t
+    WHERE is_valid_on(t.valid_from, t.valid_to, CURRENT_DATE);
+  END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_mv_hs_taric_today_hs
+  ON mv_hs_taric_today(hs_code8);
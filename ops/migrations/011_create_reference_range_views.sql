@@ -0,0 +1,46 @@
+-- Date-ranged materialized views over the TARIC nomenclature, TARIC measures
+-- and CBAM defaults. Validity is stored as an inclusive daterange so lookups use
+-- `validity @> ref_date`, answered by a GiST probe on (code, validity) instead
+-- of evaluating is_valid_on row by row. Measures are coalesced per
+-- (taric_code, country_code) into non-overlapping ranges, which is all the
+-- classifier needs from them. Refresh with `python -m packages.classifier.refresh`
+-- after every reference data load.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_taric_nomenclature_ranges AS
+SELECT t.taric_code,
+       t.hs_code8,
+       t.description,
+       t.valid_from,
+       t.valid_to,
+       daterange(t.valid_from, t.valid_to, '[]') AS validity
+FROM v_taric_nomenclature t
+WHERE t.valid_from IS NULL OR t.valid_to IS NULL OR t.valid_from <= t.valid_to;
+
+CREATE INDEX IF NOT EXISTS idx_mv_taric_nomenclature_ranges_hs
+  ON mv_taric_nomenclature_ranges USING gist (hs_code8, validity);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_taric_measure_ranges AS
+SELECT m.taric_code,
+       m.country_code,
+       unnest(range_agg(daterange(m.valid_from, m.valid_to, '[]'))) AS validity
+FROM v_taric_measures m
+WHERE m.valid_from IS NULL OR m.valid_to IS NULL OR m.valid_from <= m.valid_to
+GROUP BY m.taric_code, m.country_code;
+
+CREATE INDEX IF NOT EXISTS idx_mv_taric_measure_ranges_taric
+  ON mv_taric_measure_ranges USING gist (taric_code, validity);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_cbam_default_ranges AS
+SELECT d.hs_code8,
+       d.country_code,
+       d.emission_intensity,
+       d.source,
+       d.valid_from,
+       d.valid_to,
+       daterange(d.valid_from, d.valid_to, '[]') AS validity
+FROM cbam_default_emissions d
+WHERE d.valid_from IS NULL OR d.valid_to IS NULL OR d.valid_from <= d.valid_to;
+
+CREATE INDEX IF NOT EXISTS idx_mv_cbam_default_ranges_hs
+  ON mv_cbam_default_ranges USING gist (hs_code8, validity);
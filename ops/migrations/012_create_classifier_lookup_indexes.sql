@@ -0,0 +1,26 @@
+-- Composite and partial indexes matching the lookups in packages/classifier/repo.py.
+-- Rulings are only ever read with status = 'ACTIVE', by TARIC or HS code, in
+-- precedence order, so the partial indexes return candidates already sorted.
+CREATE INDEX IF NOT EXISTS idx_bti_rulings_active_taric
+  ON bti_rulings(taric_code, precedence, valid_from DESC)
+  WHERE status = 'ACTIVE' AND taric_code IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_bti_rulings_active_hs
+  ON bti_rulings(hs_code8, precedence, valid_from DESC)
+  WHERE status = 'ACTIVE';
+
+-- taric_validity reads the latest row per TARIC code through v_taric_nomenclature.
+CREATE INDEX IF NOT EXISTS idx_taric_nomenclature_code
+  ON taric_nomenclature(code, valid_from DESC);
+
+-- Base tables behind the reference views, keyed the way the views are filtered
+-- so reads through v_taric_nomenclature, v_taric_measures and
+-- cbam_default_emissions stay index driven.
+CREATE INDEX IF NOT EXISTS idx_taric_nomenclature_cn
+  ON taric_nomenclature(cn_code, valid_from, valid_to);
+
+CREATE INDEX IF NOT EXISTS idx_taric_measures_taric_country
+  ON taric_measures(taric_code, country_code, valid_from, valid_to);
+
+CREATE INDEX IF NOT EXISTS idx_cbam_default_emissions_hs_country
+  ON cbam_default_emissions(hs_code8, country_code, valid_from DESC);
@@ -0,0 +1,10 @@
+-- Watermarks of the reference materialized views, written by
+-- `python -m packages.classifier.refresh`. A view is only refreshed when the
+-- watermark of its source tables differs from the stored one; duration_ms keeps
+-- the cost of the last refresh.
+CREATE TABLE IF NOT EXISTS reference_refresh_state (
+  view_name text PRIMARY KEY,
+  watermark text NOT NULL,
+  refreshed_at timestamptz NOT NULL DEFAULT now(),
+  duration_ms integer NOT NULL
+);
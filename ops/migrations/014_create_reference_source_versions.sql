@@ -0,0 +1,43 @@
+-- Transactional change counters for the reference source tables. Every
+-- statement that writes one of them (including TRUNCATE) bumps its row in the
+-- writer's own transaction, so the counter only moves once the load commits
+-- and rolls back with it. The refresh job and the reference version stamp read
+-- these counters instead of the non-transactional pg_stat_user_tables
+-- statistics. Concurrent loaders of the same table serialise on its row.
+CREATE TABLE IF NOT EXISTS reference_source_versions (
+  table_name text PRIMARY KEY,
+  version bigint NOT NULL,
+  changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_reference_source_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO reference_source_versions (table_name, version, changed_at)
+  VALUES (TG_TABLE_NAME, 1, now())
+  ON CONFLICT (table_name) DO UPDATE
+    SET version = reference_source_versions.version + 1,
+        changed_at = EXCLUDED.changed_at;
+  RETURN NULL;
+END
+$$;
+
+DO $$
+DECLARE
+  source text;
+BEGIN
+  FOREACH source IN ARRAY ARRAY[
+    'taric_nomenclature', 'taric_measures', 'hs_codes', 'bti_rulings', 'cbam_default_emissions'
+  ] LOOP
+    IF to_regclass(source) IS NOT NULL THEN
+      EXECUTE format('DROP TRIGGER IF EXISTS trg_%1$s_source_version ON %1$I', source);
+      EXECUTE format(
+        'CREATE TRIGGER trg_%1$s_source_version '
+        'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %1$I '
+        'FOR EACH STATEMENT EXECUTE FUNCTION bump_reference_source_version()',
+        source
+      );
+    END IF;
+  END LOOP;
+END
+$$;
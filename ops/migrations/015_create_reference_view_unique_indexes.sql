@@ -0,0 +1,77 @@
+-- Unique indexes that let `python -m packages.classifier.refresh` run
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY. The base tables have no keys, so the
+-- views are rebuilt to guarantee unique rows: exact duplicates in the sources
+-- collapse into one row per key, and CBAM defaults repeated for the same
+-- (hs_code8, country_code, valid_from, valid_to) keep the highest intensity.
+-- Measure ranges are unique by construction (range_agg per taric_code and
+-- country_code). Each view is only rebuilt once, when its key index is missing.
+DO $$
+BEGIN
+  IF to_regclass('uq_mv_hs_taric_today_key') IS NULL THEN
+    DROP MATERIALIZED VIEW IF EXISTS mv_hs_taric_today;
+    CREATE MATERIALIZED VIEW mv_hs_taric_today AS
+    SELECT DISTINCT ON (t.taric_code, t.hs_code8, t.valid_from, t.valid_to)
+           t.hs_code8,
+           t.taric_code,
+           t.description,
+           t.valid_from,
+           t.valid_to,
+           CURRENT_DATE AS as_of
+    FROM v_taric_nomenclature t
+    WHERE is_valid_on(t.valid_from, t.valid_to, CURRENT_DATE)
+    ORDER BY t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description;
+
+    CREATE INDEX idx_mv_hs_taric_today_hs ON mv_hs_taric_today(hs_code8);
+    CREATE UNIQUE INDEX uq_mv_hs_taric_today_key
+      ON mv_hs_taric_today (taric_code, hs_code8, valid_from, valid_to);
+  END IF;
+
+  IF to_regclass('uq_mv_taric_nomenclature_ranges_key') IS NULL THEN
+    DROP MATERIALIZED VIEW IF EXISTS mv_taric_nomenclature_ranges;
+    CREATE MATERIALIZED VIEW mv_taric_nomenclature_ranges AS
+    SELECT DISTINCT ON (t.taric_code, t.hs_code8, t.valid_from, t.valid_to)
+           t.taric_code,
+           t.hs_code8,
+           t.description,
+           t.valid_from,
+           t.valid_to,
+           daterange(t.valid_from, t.valid_to, '[]') AS validity
+    FROM v_taric_nomenclature t
+    WHERE t.valid_from IS NULL OR t.valid_to IS NULL OR t.valid_from <= t.valid_to
+    ORDER BY t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description;
+
+    CREATE INDEX idx_mv_taric_nomenclature_ranges_hs
+      ON mv_taric_nomenclature_ranges USING gist (hs_code8, validity);
+    CREATE UNIQUE INDEX uq_mv_taric_nomenclature_ranges_key
+      ON mv_taric_nomenclature_ranges (taric_code, hs_code8, valid_from, valid_to);
+  END IF;
+
+  IF to_regclass('uq_mv_cbam_default_ranges_key') IS NULL THEN
+    DROP MATERIALIZED VIEW IF EXISTS mv_cbam_default_ranges;
+    CREATE MATERIALIZED VIEW mv_cbam_default_ranges AS
+    SELECT DISTINCT ON (d.hs_code8, d.country_code, d.valid_from, d.valid_to)
+           d.hs_code8,
+           d.country_code,
+           d.emission_intensity,
+           d.source,
+           d.valid_from,
+           d.valid_to,
+           daterange(d.valid_from, d.valid_to, '[]') AS validity
+    FROM cbam_default_emissions d
+    WHERE d.valid_from IS NULL OR d.valid_to IS NULL OR d.valid_from <= d.valid_to
+    ORDER BY d.hs_code8, d.country_code, d.valid_from, d.valid_to,
+             d.emission_intensity DESC, d.source;
+
+    CREATE INDEX idx_mv_cbam_default_ranges_hs
+      ON mv_cbam_default_ranges USING gist (hs_code8, validity);
+    CREATE UNIQUE INDEX uq_mv_cbam_default_ranges_key
+      ON mv_cbam_default_ranges (hs_code8, country_code, valid_from, valid_to);
+  END IF;
+END
+$$;
+
+-- Superseded by uq_mv_taric_measure_ranges_key; created by earlier refresh jobs.
+DROP INDEX IF EXISTS uq_mv_taric_measure_ranges;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_taric_measure_ranges_key
+  ON mv_taric_measure_ranges (taric_code, country_code, validity);
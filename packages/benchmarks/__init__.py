@@ -0,0 +1 @@
+"""Benchmarks for the classifier and emissions linker (run as ``python -m`` modules)."""
@@ -0,0 +1,218 @@
+"""Benchmark classification and linking end to end on a seeded database.
+
+Seed the data with :mod:`packages.benchmarks.seed` first, then run
+``python -m packages.benchmarks.classifier_suite`` against the same
+``DATABASE_URL`` (and ``--schema``). Four paths are measured:
+
+* ``classify`` and ``classify_and_link``: one call per shipment, over a random
+  sample of ``--calls`` shipments; latency percentiles are per call;
+* ``classify_many`` and ``classify_and_link_many``: every shipment (or the first
+  ``--batch-limit``) in chunks of ``--chunk-size``, as the batch job reads them;
+  latency percentiles are per chunk, alongside shipments per second.
+
+Statements per shipment are counted through :mod:`packages.classifier.tracing`.
+Linking always reclassifies (``force=True``) so repeated runs do the same work;
+it writes snapshots and drafts. The report is JSON tagged with the git commit
+and the data set size, so runs of different commits can be compared.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event, text
+
+from packages.classifier import queries, repo, tracing
+from packages.classifier.resolver import classify, classify_many
+from packages.emissions_linker.batch import (
+    _SHIPMENT_COLUMNS,
+    DEFAULT_CHUNK_SIZE,
+    iter_shipment_chunks,
+)
+from packages.emissions_linker.linker import (
+    _build_context,
+    classify_and_link,
+    classify_and_link_many,
+)
+
+from .seed import SEEDED_TABLES, _check_schema_name
+
+PATHS = ("classify", "classify_and_link", "classify_many", "classify_and_link_many")
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p90_ms": ordered[int(len(ordered) * 0.90)] * 1000,
+        "p99_ms": ordered[int(len(ordered) * 0.99)] * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def _use_schema(schema: str) -> None:
+    # Set per pooled connection, outside any transaction, so it outlives rollbacks.
+    statement = f"SET SESSION search_path TO {_check_schema_name(schema)}, public"
+
+    def set_search_path(dbapi_connection, _record) -> None:
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(statement)
+        dbapi_connection.autocommit = autocommit
+
+    for engine in (repo.get_engine(), repo.get_read_engine()):
+        if engine is not None:
+            event.listen(engine, "connect", set_search_path)
+
+
+def _sample(count: int, seed: int) -> list[dict[str, Any]]:
+    with repo.get_connection() as conn:
+        result = conn.execute(
+            text(f"{_SHIPMENT_COLUMNS} ORDER BY md5(id::text || :seed) LIMIT :count"),
+            {"seed": str(seed), "count": count},
+        )
+        return [dict(row) for row in result.mappings()]
+
+
+def _per_call(records: list[dict[str, Any]], call: Callable[[dict[str, Any]], Any]) -> dict:
+    latencies, statements, unresolved = [], 0, 0
+    for record in records:
+        with tracing.traced(force=True) as trace:
+            started = time.perf_counter()
+            try:
+                call(record)
+            except ValueError:
+                unresolved += 1
+            latencies.append(time.perf_counter() - started)
+        statements += trace.queries
+    return {
+        "shipments": len(records),
+        "unresolved": unresolved,
+        "queries_per_shipment": statements / len(records) if records else 0.0,
+        "per_call": _percentiles(latencies),
+    }
+
+
+def _batched(
+    call: Callable[[list[dict[str, Any]]], int], chunk_size: int, limit: int | None
+) -> dict:
+    latencies, statements, processed, resolved = [], 0, 0, 0
+    started = time.perf_counter()
+    with repo.get_connection() as reader:
+        for chunk in iter_shipment_chunks(reader, chunk_size=chunk_size, limit=limit):
+            with tracing.traced(force=True) as trace:
+                chunk_started = time.perf_counter()
+                resolved += call(chunk)
+                latencies.append(time.perf_counter() - chunk_started)
+            statements += trace.queries
+            processed += len(chunk)
+    elapsed = time.perf_counter() - started
+    return {
+        "shipments": processed,
+        "unresolved": processed - resolved,
+        "chunk_size": chunk_size,
+        "elapsed_s": elapsed,
+        "shipments_per_s": processed / elapsed if elapsed else 0.0,
+        "queries_per_shipment": statements / processed if processed else 0.0,
+        "per_chunk": _percentiles(latencies),
+    }
+
+
+def _classify_chunk(chunk: list[dict[str, Any]]) -> int:
+    contexts = [_build_context(record) for record in chunk]
+    return sum(result is not None for result in classify_many(contexts, skip_unresolved=True))
+
+
+def _link_chunk(chunk: list[dict[str, Any]]) -> int:
+    return len(classify_and_link_many(chunk, force=True, skip_unresolved=True).results)
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _row_counts() -> dict[str, int]:
+    with repo.get_connection() as conn:
+        return {
+            table: conn.execute(text(f"SELECT count(*) FROM {table}")).scalar_one()
+            for table in SEEDED_TABLES
+        }
+
+
+def run(
+    *,
+    paths: tuple[str, ...] = PATHS,
+    calls: int = 1000,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_limit: int | None = None,
+    seed: int = 7,
+) -> dict:
+    sample = _sample(calls, seed) if {"classify", "classify_and_link"} & set(paths) else []
+    measures = {
+        "classify": lambda: _per_call(sample, lambda record: classify(_build_context(record))),
+        "classify_and_link": lambda: _per_call(
+            sample, lambda record: classify_and_link(record, force=True)
+        ),
+        "classify_many": lambda: _batched(_classify_chunk, chunk_size, batch_limit),
+        "classify_and_link_many": lambda: _batched(_link_chunk, chunk_size, batch_limit),
+    }
+    results = {path: measures[path]() for path in paths}
+    return {
+        "commit": _commit(),
+        "run_at": datetime.now(UTC).isoformat(),
+        "rows": _row_counts(),
+        "prepared_statements": queries.PREPARED_STATEMENTS,
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS))
+    parser.add_argument("--calls", type=int, default=1000, help="shipments per single-call path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--batch-limit", type=int, default=None, help="shipments per batch path")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--schema", default=None, help="schema created by the seed module")
+    parser.add_argument("--output", type=Path, default=None, help="write the report here too")
+    args = parser.parse_args(argv)
+
+    if args.schema:
+        _use_schema(args.schema)
+    report = run(
+        paths=tuple(args.paths),
+        calls=args.calls,
+        chunk_size=args.chunk_size,
+        batch_limit=args.batch_limit,
+        seed=args.seed,
+    )
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n")
+    print(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""Measure the client-side cost of one repository lookup per execution strategy.
+
+Run it with ``python -m packages.benchmarks.lookup_overhead`` against
+``DATABASE_URL``. The same most-specific-TARIC lookup is executed three ways:
+
+* ``adhoc``: a fresh ``text()`` per call and rows mapped through dicts, as the
+  repository did before the query registry;
+* ``compiled``: the registered statement executed through SQLAlchemy with
+  positional row mapping (``CLASSIFIER_PREPARED_STATEMENTS=0``);
+* ``prepared``: the registered statement as a server-side prepared statement.
+
+Both wall time and process CPU time are reported per lookup, as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from collections.abc import Callable
+from contextlib import closing
+from datetime import date
+
+from sqlalchemy import text
+
+from packages.classifier import queries, reference_index, repo
+
+
+def _sample_keys(conn, count: int, seed: int, ref_date: date) -> list[dict]:
+    rows = repo._fetchall(
+        conn,
+        """
+        SELECT DISTINCT hs_code8
+        FROM mv_taric_nomenclature_ranges
+        WHERE validity @> CAST(:ref_date AS date)
+        """,
+        ref_date=ref_date,
+    )
+    rng = random.Random(seed)
+    codes = [row["hs_code8"] for row in rows] or ["00000000"]
+    return [
+        {
+            "hs_code8": rng.choice(codes),
+            "country": rng.choice(["NL", "DE", "FR"]),
+            "ref_date": ref_date,
+        }
+        for _ in range(count)
+    ]
+
+
+def _adhoc(conn, params: dict) -> repo.TaricRecord | None:
+    result = conn.execute(text(repo._PICK_TARIC_SQL), params)
+    rows = [dict(row._mapping) for row in result]
+    return repo._taric_record(rows[0]) if rows else None
+
+
+def _compiled(conn, params: dict) -> repo.TaricRecord | None:
+    with closing(conn.execute(repo._PICK_TARIC.statement, params)) as result:
+        records = [repo.TaricRecord(*row) for row in result.fetchall()]
+    return records[0] if records else None
+
+
+def _prepared(conn, params: dict) -> repo.TaricRecord | None:
+    records = [
+        repo.TaricRecord(*row) for row in queries._prepared_rows(conn, repo._PICK_TARIC, params)
+    ]
+    return records[0] if records else None
+
+
+def _measure(conn, lookup: Callable, keys: list[dict], warmup: int) -> dict[str, float]:
+    for params in keys[:warmup]:
+        lookup(conn, params)
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    for params in keys:
+        lookup(conn, params)
+    cpu = time.process_time() - cpu_started
+    wall = time.perf_counter() - wall_started
+    return {
+        "wall_us_per_lookup": wall / len(keys) * 1e6,
+        "cpu_us_per_lookup": cpu / len(keys) * 1e6,
+    }
+
+
+def run(
+    lookups: int = 5000, seed: int = 7, ref_date: date | None = None, warmup: int = 200
+) -> dict:
+    ref_date = ref_date or date.today()
+    reference_index.install_index(None)
+    strategies = {"adhoc": _adhoc, "compiled": _compiled, "prepared": _prepared}
+    with repo.get_connection() as conn:
+        keys = _sample_keys(conn, lookups, seed, ref_date)
+        results = {
+            name: _measure(conn, lookup, keys, warmup) for name, lookup in strategies.items()
+        }
+        conn.rollback()
+
+    baseline = results["adhoc"]["cpu_us_per_lookup"]
+    for stats in results.values():
+        stats["cpu_us_saved_vs_adhoc"] = baseline - stats["cpu_us_per_lookup"]
+    return {"lookups": lookups, "ref_date": ref_date.isoformat(), "strategies": results}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--ref-date", type=date.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.lookups, args.seed, args.ref_date, args.warmup), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""Compare memory and construction cost of the classifier's record types.
+
+Run it with ``python -m packages.benchmarks.records``; it needs no database.
+For each record shape it builds ``--count`` instances (scaled to a million in
+the report) under ``tracemalloc`` and times construction separately:
+
+* ``pydantic_result``: the validated :class:`ClassificationResult` model;
+* ``classification``: the :class:`Classification` named tuple used by batches;
+* ``taric_record_dict`` / ``taric_record_slots``: a ``TaricRecord``-shaped
+  dataclass with and without ``__slots__``.
+
+Results are printed as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date
+
+from packages.classifier import repo
+from packages.classifier.types import Classification, ClassificationResult
+
+
+@dataclass
+class _UnslottedTaricRecord:
+    taric_code: str
+    hs_code8: str
+    valid_from: date | None
+    valid_to: date | None
+    description: str | None
+
+
+def _row(i: int) -> tuple:
+    hs_code8 = f"{72000000 + i % 100000:08d}"
+    return hs_code8, f"{hs_code8}{i % 100:02d}", date(2024, 1, 1)
+
+
+def _builders() -> dict[str, Callable[[tuple], object]]:
+    return {
+        "pydantic_result": lambda row: ClassificationResult(
+            hs_code8=row[0], taric_code=row[1], source="DIRECT_TARIC", validity_from=row[2]
+        ),
+        "classification": lambda row: Classification(
+            row[0], row[1], "DIRECT_TARIC", validity_from=row[2]
+        ),
+        "taric_record_dict": lambda row: _UnslottedTaricRecord(row[1], row[0], row[2], None, None),
+        "taric_record_slots": lambda row: repo.TaricRecord(row[1], row[0], row[2], None, None),
+    }
+
+
+def _measure(build: Callable[[tuple], object], rows: list[tuple]) -> dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    records = [build(row) for row in rows]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+
+    gc.collect()
+    started = time.perf_counter()
+    for row in rows:
+        build(row)
+    elapsed = time.perf_counter() - started
+    scale = 1_000_000 / len(rows)
+    return {
+        "mb_per_million": allocated * scale / 2**20,
+        "ns_per_record": elapsed / len(rows) * 1e9,
+    }
+
+
+def run(count: int = 200_000) -> dict:
+    # Field values are built up front so only the record itself is measured.
+    rows = [_row(i) for i in range(count)]
+    results = {name: _measure(build, rows) for name, build in _builders().items()}
+    return {"records": count, "types": results}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.count), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
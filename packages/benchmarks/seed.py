@@ -0,0 +1,441 @@
+"""Seed Postgres with synthetic TARIC reference data, rulings and shipments.
+
+Run it with ``python -m packages.benchmarks.seed --shipments 100000`` against
+``DATABASE_URL``. With ``--schema NAME`` a fresh schema receives the base tables
+and ``ops/migrations`` first; otherwise the current schema must already have
+them, and ``--reset`` empties the seeded tables before loading.
+
+The data is deterministic for a given ``--seed``:
+
+* an HS catalogue of ``--hs-codes`` 8-digit codes, mostly in CBAM chapters
+  (cement, electricity, hydrogen, fertilisers, iron and steel, aluminium);
+* per HS code, the ``00`` TARIC code plus up to four subdivisions, some of them
+  expired, and measures for most subdivisions (erga omnes or per country);
+* BTI rulings for ``--ruling-share`` of the HS codes, some country-scoped or
+  revoked, and CBAM defaults (generic plus per country) for CBAM chapters;
+* ``--shipments`` shipments whose HS codes follow a Zipf distribution with
+  exponent ``--skew``. They carry a TARIC or HS hint, and ``--text-share`` of
+  them only a description.
+
+Rows are loaded with ``COPY`` in batches, the reference views are refreshed and
+the tables analysed. Counts are printed as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import random
+import re
+import uuid
+from collections.abc import Iterable, Iterator, Sequence
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy.engine import Connection
+
+from packages.classifier import refresh, repo
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "ops" / "migrations"
+
+# Tables the migrations build on; they are owned by the application schema.
+BASE_SCHEMA = """
+CREATE TABLE taric_nomenclature (
+  code varchar(10) NOT NULL,
+  cn_code varchar(8) NOT NULL,
+  description text,
+  valid_from date,
+  valid_to date,
+  parent_code varchar(10)
+);
+CREATE TABLE taric_measures (
+  taric_code varchar(10) NOT NULL,
+  measure_type text,
+  country_code varchar(2),
+  valid_from date,
+  valid_to date,
+  additional_code text,
+  footnotes text
+);
+CREATE TABLE hs_codes (
+  hs_code8 varchar(8) NOT NULL,
+  chapter varchar(2),
+  heading varchar(4),
+  subheading varchar(6),
+  description text,
+  valid_from date,
+  valid_to date
+);
+CREATE TABLE cbam_default_emissions (
+  hs_code8 varchar(8) NOT NULL,
+  country_code varchar(2),
+  emission_intensity double precision NOT NULL,
+  source text,
+  valid_from date,
+  valid_to date
+);
+CREATE TABLE shipments (
+  id uuid PRIMARY KEY,
+  arrived_at date,
+  country_code varchar(2),
+  hs_code varchar(10),
+  description text,
+  net_weight_kg numeric,
+  gross_weight_kg numeric
+);
+CREATE TABLE cbam_report_drafts (
+  shipment_id uuid PRIMARY KEY,
+  emission_intensity double precision,
+  emission_source text
+);
+"""
+
+SEEDED_TABLES = (
+    "cbam_report_drafts",
+    "shipment_classifications",
+    "shipments",
+    "bti_rulings",
+    "cbam_default_emissions",
+    "taric_measures",
+    "taric_nomenclature",
+    "hs_codes",
+)
+
+# Chapter -> product nouns; CBAM chapters get most of the catalogue.
+CBAM_CHAPTERS = {
+    "25": ("cement clinker", "portland cement", "aluminous cement"),
+    "27": ("electrical energy",),
+    "28": ("hydrogen", "anhydrous ammonia", "nitric acid"),
+    "31": ("urea fertiliser", "ammonium nitrate", "nitrogenous fertiliser"),
+    "72": ("flat-rolled non-alloy steel", "pig iron", "ferro-alloys", "steel bars and rods"),
+    "73": ("steel tubes and pipes", "steel structures", "steel screws and bolts"),
+    "76": ("unwrought aluminium", "aluminium alloy plates", "aluminium foil"),
+}
+OTHER_CHAPTERS = {
+    "39": ("polyethylene granules", "plastic sheets"),
+    "84": ("centrifugal pumps", "industrial machinery parts"),
+    "85": ("electrical transformers", "insulated wire"),
+    "94": ("office seats", "metal furniture"),
+}
+QUALIFIERS = (
+    "hot-rolled",
+    "cold-rolled",
+    "coated",
+    "in coils",
+    "not in coils",
+    "of a width of 600 mm or more",
+    "of a thickness of less than 3 mm",
+    "alloyed",
+    "not alloyed",
+    "unwrought",
+    "for industrial use",
+    "other",
+)
+# Origin countries weighted roughly by EU import share.
+COUNTRIES = (
+    ("CN", 30),
+    ("TR", 15),
+    ("IN", 12),
+    ("UA", 8),
+    ("KR", 8),
+    ("GB", 7),
+    ("US", 6),
+    ("NO", 5),
+    ("BR", 5),
+    ("VN", 4),
+)
+TARIC_SUFFIXES = ("10", "20", "30", "80", "90")
+
+
+@dataclass(frozen=True)
+class SeedConfig:
+    shipments: int = 1000
+    hs_codes: int = 2000
+    seed: int = 42
+    skew: float = 1.1
+    text_share: float = 0.1
+    ruling_share: float = 0.05
+    start: date = date(2022, 1, 1)
+    end: date = date(2024, 12, 31)
+
+
+@dataclass(frozen=True)
+class _HsCode:
+    hs_code8: str
+    description: str
+    taric_codes: tuple[str, ...]
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _day(rng: random.Random, start: date, end: date) -> date:
+    return start + timedelta(days=rng.randrange((end - start).days + 1))
+
+
+def _batched(rows: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _copy(conn: Connection, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    """``COPY`` ``rows`` into ``table``, 50k rows per round trip; ``None`` loads as NULL."""
+
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.dbapi_connection.cursor()
+    count = 0
+    for chunk in _batched(rows, 50_000):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        count += len(chunk)
+    cursor.close()
+    return count
+
+
+def _catalogue(rng: random.Random, config: SeedConfig) -> list[_HsCode]:
+    chapters = [*CBAM_CHAPTERS.items(), *OTHER_CHAPTERS.items()]
+    weights = [4 if chapter in CBAM_CHAPTERS else 1 for chapter, _ in chapters]
+    codes: dict[str, _HsCode] = {}
+    while len(codes) < config.hs_codes:
+        chapter, nouns = rng.choices(chapters, weights)[0]
+        hs_code8 = f"{chapter}{rng.randrange(10**6):06d}"
+        if hs_code8 in codes:
+            continue
+        description = " ".join([rng.choice(nouns), *rng.sample(QUALIFIERS, 2)])
+        subdivisions = rng.sample(TARIC_SUFFIXES, rng.choice((0, 1, 2, 2, 3, 4)))
+        taric_codes = (f"{hs_code8}00", *(hs_code8 + suffix for suffix in sorted(subdivisions)))
+        codes[hs_code8] = _HsCode(hs_code8, description, taric_codes)
+    return list(codes.values())
+
+
+def _reference_rows(rng: random.Random, config: SeedConfig, catalogue: list[_HsCode]) -> dict:
+    opened = config.start - timedelta(days=3 * 365)
+    countries = [country for country, _ in COUNTRIES]
+    hs_rows, nomenclature, measures, rulings, defaults = [], [], [], [], []
+    for hs in catalogue:
+        hs_rows.append(
+            (
+                hs.hs_code8,
+                hs.hs_code8[:2],
+                hs.hs_code8[:4],
+                hs.hs_code8[:6],
+                hs.description,
+                opened,
+                None,
+            )
+        )
+        for taric_code in hs.taric_codes:
+            ends = None
+            if not taric_code.endswith("00") and rng.random() < 0.15:
+                ends = _day(rng, config.start, config.end)
+            label = f"{hs.description}, {rng.choice(QUALIFIERS)}"
+            nomenclature.append((taric_code, hs.hs_code8, label, opened, ends, hs.hs_code8 + "00"))
+            if taric_code.endswith("00") or rng.random() < 0.4:
+                continue
+            country = None if rng.random() < 0.3 else rng.choice(countries)
+            starts = _day(rng, opened, ends or config.end)
+            measures.append((taric_code, "103", country, starts, ends))
+
+        if rng.random() < config.ruling_share:
+            starts = _day(rng, opened, config.end)
+            rulings.append(
+                (
+                    _uuid(rng),
+                    f"BTI-{starts.year}-{len(rulings):06d}",
+                    hs.hs_code8,
+                    rng.choice((None, *hs.taric_codes)),
+                    None if rng.random() < 0.6 else rng.choice(countries),
+                    starts,
+                    starts + timedelta(days=3 * 365),
+                    rng.randint(1, 100),
+                    "REVOKED" if rng.random() < 0.05 else "ACTIVE",
+                    "synthetic",
+                )
+            )
+
+        if hs.hs_code8[:2] in CBAM_CHAPTERS:
+            intensity = round(rng.uniform(0.1, 25.0), 3)
+            defaults.append((hs.hs_code8, None, intensity, "EU default", opened, None))
+            for country in rng.sample(countries, rng.randint(0, 3)):
+                country_intensity = round(intensity * rng.uniform(0.7, 1.5), 3)
+                defaults.append(
+                    (hs.hs_code8, country, country_intensity, "country default", opened, None)
+                )
+    return {
+        "hs_codes": hs_rows,
+        "taric_nomenclature": nomenclature,
+        "taric_measures": measures,
+        "bti_rulings": rulings,
+        "cbam_default_emissions": defaults,
+    }
+
+
+def _shipment_rows(
+    rng: random.Random, config: SeedConfig, catalogue: list[_HsCode]
+) -> Iterator[tuple]:
+    ranked = rng.sample(catalogue, len(catalogue))
+    cum_weights = list(
+        itertools.accumulate(1 / rank**config.skew for rank in range(1, len(ranked) + 1))
+    )
+    countries, country_weights = zip(*COUNTRIES, strict=True)
+    for _ in range(config.shipments):
+        hs = rng.choices(ranked, cum_weights=cum_weights)[0]
+        words = hs.description.split()
+        roll = rng.random()
+        if roll < config.text_share:
+            hint = None
+        elif roll < config.text_share + (1 - config.text_share) * 0.7:
+            hint = rng.choice(hs.taric_codes)
+        else:
+            hint = hs.hs_code8
+        net_weight = round(rng.lognormvariate(8, 1.5), 3)
+        yield (
+            _uuid(rng),
+            _day(rng, config.start, config.end),
+            rng.choices(countries, country_weights)[0],
+            hint,
+            " ".join(words[: rng.randint(2, len(words))]),
+            net_weight,
+            round(net_weight * rng.uniform(1.0, 1.1), 3),
+        )
+
+
+_COLUMNS = {
+    "hs_codes": (
+        "hs_code8",
+        "chapter",
+        "heading",
+        "subheading",
+        "description",
+        "valid_from",
+        "valid_to",
+    ),
+    "taric_nomenclature": (
+        "code",
+        "cn_code",
+        "description",
+        "valid_from",
+        "valid_to",
+        "parent_code",
+    ),
+    "taric_measures": ("taric_code", "measure_type", "country_code", "valid_from", "valid_to"),
+    "bti_rulings": (
+        "id",
+        "ruling_ref",
+        "hs_code8",
+        "taric_code",
+        "country_scope",
+        "valid_from",
+        "valid_to",
+        "precedence",
+        "status",
+        "source",
+    ),
+    "cbam_default_emissions": (
+        "hs_code8",
+        "country_code",
+        "emission_intensity",
+        "source",
+        "valid_from",
+        "valid_to",
+    ),
+    "shipments": (
+        "id",
+        "arrived_at",
+        "country_code",
+        "hs_code",
+        "description",
+        "net_weight_kg",
+        "gross_weight_kg",
+    ),
+}
+
+_SCHEMA_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+def _check_schema_name(schema: str) -> str:
+    if not _SCHEMA_NAME.fullmatch(schema):
+        raise ValueError(f"Invalid schema name: {schema!r}")
+    return schema
+
+
+def use_schema(conn: Connection, schema: str) -> None:
+    conn.exec_driver_sql(f"SET search_path TO {_check_schema_name(schema)}, public")
+
+
+def create_schema(conn: Connection, schema: str) -> None:
+    """Create ``schema`` with the base tables and every migration applied."""
+
+    conn.exec_driver_sql(f"CREATE SCHEMA {_check_schema_name(schema)}")
+    use_schema(conn, schema)
+    conn.exec_driver_sql(BASE_SCHEMA)
+    for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        conn.exec_driver_sql(migration.read_text())
+
+
+def seed(conn: Connection, config: SeedConfig, *, reset: bool = False) -> dict[str, int]:
+    """Load the synthetic data set into ``conn``'s schema and refresh the views."""
+
+    if reset:
+        conn.exec_driver_sql(f"TRUNCATE {', '.join(SEEDED_TABLES)}")
+
+    rng = random.Random(config.seed)
+    catalogue = _catalogue(rng, config)
+    tables = {
+        **_reference_rows(rng, config, catalogue),
+        "shipments": _shipment_rows(rng, config, catalogue),
+    }
+    counts = {table: _copy(conn, table, _COLUMNS[table], rows) for table, rows in tables.items()}
+    conn.commit()
+
+    refresh.refresh_reference_views(conn, force=True)
+    for table in _COLUMNS:
+        conn.exec_driver_sql(f"ANALYZE {table}")
+    conn.commit()
+    return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = SeedConfig()
+    parser.add_argument("--shipments", type=int, default=defaults.shipments)
+    parser.add_argument("--hs-codes", type=int, default=defaults.hs_codes)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--skew", type=float, default=defaults.skew, help="Zipf exponent")
+    parser.add_argument("--text-share", type=float, default=defaults.text_share)
+    parser.add_argument("--ruling-share", type=float, default=defaults.ruling_share)
+    parser.add_argument("--schema", default=None, help="create this schema and seed it")
+    parser.add_argument("--reset", action="store_true", help="empty the seeded tables first")
+    args = parser.parse_args(argv)
+
+    config = SeedConfig(
+        shipments=args.shipments,
+        hs_codes=args.hs_codes,
+        seed=args.seed,
+        skew=args.skew,
+        text_share=args.text_share,
+        ruling_share=args.ruling_share,
+    )
+    with repo.get_engine().connect() as conn:
+        if args.schema:
+            create_schema(conn, args.schema)
+            conn.commit()
+        elif not args.reset and conn.exec_driver_sql("SELECT 1 FROM shipments LIMIT 1").first():
+            parser.error("shipments is not empty; pass --reset or --schema")
+        counts = seed(conn, config, reset=args.reset)
+    print(
+        json.dumps({"config": asdict(config), "schema": args.schema, "rows": counts}, default=str)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,97 @@
+"""Compare the in-process BM25 text index with the database text lookup.
+
+Run it with ``python -m packages.benchmarks.text_search`` against ``DATABASE_URL``.
+Queries are sampled from the HS catalogue itself (a few words of a description),
+then resolved once through ``repo.derive_hs_from_text`` per query, once through
+``repo.derive_hs_from_text_many`` and once through ``HsTextIndex.search_many``.
+Results are printed as JSON.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date
+
+from packages.classifier import repo, text_index
+
+
+def _sample_queries(index: text_index.HsTextIndex, count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    descriptions = [doc.description for doc in index.docs if doc.description]
+    queries = []
+    for _ in range(count):
+        words = rng.choice(descriptions).split()
+        size = min(len(words), rng.randint(1, 3))
+        start = rng.randint(0, len(words) - size)
+        queries.append(" ".join(words[start : start + size]))
+    return queries
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[int(len(ordered) * 0.95)] * 1000,
+        "p99_ms": ordered[int(len(ordered) * 0.99)] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def run(queries: int = 1000, seed: int = 7, ref_date: date | None = None) -> dict:
+    ref_date = ref_date or date.today()
+    text_index.install_index(None)
+    with repo.get_connection() as conn:
+        started = time.perf_counter()
+        index = text_index.load_text_index(conn)
+        build_seconds = time.perf_counter() - started
+        hints = _sample_queries(index, queries, seed)
+        keys = [(hint, ref_date) for hint in hints]
+
+        per_query = []
+        for hint in hints:
+            started = time.perf_counter()
+            repo.derive_hs_from_text(conn, hint, ref_date)
+            per_query.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        repo.derive_hs_from_text_many(conn, keys)
+        db_bulk_seconds = time.perf_counter() - started
+
+    index_per_query = []
+    for hint in hints:
+        started = time.perf_counter()
+        index.best_match(hint, ref_date)
+        index_per_query.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    index.search_many(keys, top_k=1)
+    index_bulk_seconds = time.perf_counter() - started
+
+    return {
+        "queries": len(hints),
+        "catalogue_rows": len(index.docs),
+        "text_match_mode": repo.TEXT_MATCH_MODE,
+        "index_build_s": build_seconds,
+        "db_per_query": _percentiles(per_query),
+        "db_bulk_s": db_bulk_seconds,
+        "index_per_query": _percentiles(index_per_query),
+        "index_bulk_s": index_bulk_seconds,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--ref-date", type=date.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.queries, args.seed, args.ref_date), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
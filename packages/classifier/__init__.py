@@ -1,9 +1,23 @@
 """Classifier package that resolves HS and TARIC codes."""
 
-from .resolver import ClassificationContext, ClassificationResult, classify
+from .resolver import (
+    Classification,
+    ClassificationContext,
+    ClassificationResult,
+    classify,
+    classify_async,
+    classify_compact,
+    classify_compact_async,
+    classify_many,
+)
 
 __all__ = [
+    "Classification",
     "ClassificationContext",
     "ClassificationResult",
     "classify",
+    "classify_async",
+    "classify_compact",
+    "classify_compact_async",
+    "classify_many",
 ]
@@ -0,0 +1,374 @@
+"""Asyncio variant of the classifier repository on a SQLAlchemy ``AsyncEngine``.
+
+The statements and row mapping are shared with :mod:`packages.classifier.repo`;
+only the execution differs. Lookups served by an installed reference index never
+touch the database, exactly like their synchronous counterparts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from datetime import date
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from . import pool, queries, reference_index, repo, text_index, tracing
+from .rules import RulingCandidate
+from .types import Classification, ClassificationResult
+
+logger = logging.getLogger(__name__)
+
+_ASYNC_DRIVER = "postgresql+asyncpg"
+_ENGINE: AsyncEngine | None = None
+_READ_ENGINE: AsyncEngine | None = None
+_ENGINE_PID: int | None = None
+_POOL_METRICS = pool.PoolMetrics()
+_READ_POOL_METRICS = pool.PoolMetrics()
+
+
+def _async_dsn(dsn: str | None = None) -> str:
+    dsn = dsn or os.getenv("DATABASE_ASYNC_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise RuntimeError("DATABASE_URL environment variable must be set")
+    url = make_url(dsn.replace("postgres://", "postgresql://", 1))
+    if url.drivername != _ASYNC_DRIVER:
+        url = url.set(drivername=_ASYNC_DRIVER)
+    return url.render_as_string(hide_password=False)
+
+
+def _create_async_engine(dsn: str, metrics: pool.PoolMetrics) -> AsyncEngine:
+    settings = pool.PoolSettings.from_env()
+    engine = create_async_engine(dsn, **settings.engine_kwargs())
+    event.listen(engine.sync_engine, "before_cursor_execute", tracing.record_query)
+    pool.instrument(engine.sync_engine, metrics, settings)
+    return engine
+
+
+def _check_fork() -> None:
+    global _ENGINE_PID
+    if _ENGINE_PID != os.getpid():
+        _forget_engine_after_fork()
+        _ENGINE_PID = os.getpid()
+
+
+def get_async_engine() -> AsyncEngine:
+    """Return this process's async engine; pool settings match :func:`repo.get_engine`."""
+
+    global _ENGINE
+    _check_fork()
+    if _ENGINE is None:
+        _ENGINE = _create_async_engine(_async_dsn(), _POOL_METRICS)
+    return _ENGINE
+
+
+def get_async_read_engine() -> AsyncEngine | None:
+    """Async engine for ``DATABASE_READ_URL``, or ``None`` when no replica is configured."""
+
+    global _READ_ENGINE
+    dsn = os.getenv("DATABASE_READ_URL")
+    if not dsn:
+        return None
+    _check_fork()
+    if _READ_ENGINE is None:
+        _READ_ENGINE = _create_async_engine(_async_dsn(dsn), _READ_POOL_METRICS)
+    return _READ_ENGINE
+
+
+def _forget_engine_after_fork() -> None:
+    global _ENGINE, _READ_ENGINE, _ENGINE_PID
+    for engine in (_ENGINE, _READ_ENGINE):
+        if engine is not None:
+            engine.sync_engine.dispose(close=False)
+    _ENGINE = _READ_ENGINE = None
+    _ENGINE_PID = None
+    _POOL_METRICS.reset()
+    _READ_POOL_METRICS.reset()
+
+
+os.register_at_fork(after_in_child=_forget_engine_after_fork)
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[AsyncConnection]:
+    engine = get_async_engine()
+    with _POOL_METRICS.timed_checkout():
+        conn = await engine.connect()
+    try:
+        yield conn
+    finally:
+        await asyncio.shield(conn.close())
+
+
+async def _replica_connection() -> AsyncConnection | None:
+    # Shares the lag probe result (and its interval) with the sync repository.
+    engine = get_async_read_engine()
+    if engine is None or repo._cached_replica_usable() is False:
+        return None
+    try:
+        with _READ_POOL_METRICS.timed_checkout():
+            conn = await engine.connect()
+    except Exception:
+        logger.warning("Replica unavailable; reading from the primary", exc_info=True)
+        repo._record_replica_lag(float("inf"))
+        return None
+    usable = repo._cached_replica_usable()
+    if usable is None:
+        try:
+            rows = await _fetchall(conn, repo._REPLICA_LAG_SQL)
+            lag = float(rows[0]["lag_seconds"])
+            await conn.rollback()
+        except Exception:
+            logger.warning("Replica lag probe failed", exc_info=True)
+            lag = float("inf")
+        usable = repo._record_replica_lag(lag)
+    if usable:
+        return conn
+    await asyncio.shield(conn.close())
+    return None
+
+
+@asynccontextmanager
+async def get_async_read_connection(
+    primary: AsyncConnection | None = None,
+) -> AsyncIterator[AsyncConnection]:
+    """Asyncio mirror of :func:`repo.get_read_connection`."""
+
+    replica = await _replica_connection()
+    if replica is not None:
+        repo._READ_ROUTES["replica"] += 1
+        try:
+            yield replica
+        finally:
+            await asyncio.shield(replica.close())
+        return
+    repo._READ_ROUTES["primary"] += 1
+    if primary is not None:
+        yield primary
+        return
+    async with get_async_connection() as conn:
+        yield conn
+
+
+def pool_stats(*, replica: bool = False) -> pool.PoolStats:
+    """Saturation and checkout counters of :func:`get_async_engine`'s (or the replica's) pool."""
+
+    return (_READ_POOL_METRICS if replica else _POOL_METRICS).stats()
+
+
+async def _fetchall(conn: AsyncConnection, statement: str, **params) -> Sequence[dict]:
+    result = await conn.execute(text(statement), params)
+    return [dict(row) for row in result.mappings()]
+
+
+async def _fetch_rows(conn: AsyncConnection, query: queries.Query, **params) -> Sequence[tuple]:
+    # asyncpg prepares statements itself and caches them per connection, keyed
+    # by the SQL the registered query compiles to.
+    result = await conn.execute(query.statement, params)
+    return result.fetchall()
+
+
+async def get_applicable_rulings(
+    conn: AsyncConnection,
+    hs_code8: str,
+    taric_code: str | None,
+    country: str,
+    ref_date: date,
+) -> list[RulingCandidate]:
+    index = reference_index.active_index()
+    if index is not None:
+        return index.get_applicable_rulings(hs_code8, taric_code, country, ref_date)
+
+    params = {
+        "hs_code8": hs_code8,
+        "taric_code": taric_code,
+        "country": country,
+        "ref_date": ref_date,
+    }
+    if taric_code:
+        rows = await _fetch_rows(conn, repo._RULINGS_BY_TARIC, **params)
+        if rows:
+            return [repo._ruling_from_columns(*row) for row in rows]
+    rows = await _fetch_rows(conn, repo._RULINGS_BY_HS, **params)
+    return [repo._ruling_from_columns(*row) for row in rows]
+
+
+async def taric_validity(conn: AsyncConnection, taric_code: str) -> tuple[date | None, date | None]:
+    index = reference_index.active_index()
+    if index is not None:
+        return index.taric_validity(taric_code)
+
+    rows = await _fetch_rows(conn, repo._TARIC_VALIDITY, taric_code=taric_code)
+    if not rows:
+        return None, None
+    valid_from, valid_to = rows[0]
+    return valid_from, valid_to
+
+
+async def _mv_today(conn: AsyncConnection) -> date | None:
+    # Shares the remembered refresh date (and its TTL) with the sync repository.
+    cached = repo._cached_mv_today()
+    if cached is not repo._STALE:
+        return cached
+    as_of = None
+    if await _fetchall(conn, repo._MV_TODAY_COLUMN_SQL):
+        rows = await _fetchall(conn, repo._MV_TODAY_AS_OF_SQL)
+        as_of = rows[0]["as_of"] if rows else None
+    return repo._remember_mv_today(as_of)
+
+
+async def taric_candidates(
+    conn: AsyncConnection, hs_code8: str, ref_date: date
+) -> list[repo.TaricRecord]:
+    index = reference_index.active_index()
+    if index is not None:
+        repo._record_path("taric_candidates", "index")
+        return index.taric_candidates(hs_code8, ref_date)
+
+    if ref_date == await _mv_today(conn):
+        repo._record_path("taric_candidates", "mv_today")
+        rows = await _fetch_rows(conn, repo._TARIC_CANDIDATES_TODAY, hs_code8=hs_code8)
+    else:
+        repo._record_path("taric_candidates", "view")
+        rows = await _fetch_rows(conn, repo._TARIC_CANDIDATES, hs_code8=hs_code8, ref_date=ref_date)
+    return [repo.TaricRecord(*row) for row in rows]
+
+
+async def pick_most_specific_taric(
+    conn: AsyncConnection, hs_code8: str, country: str, ref_date: date
+) -> repo.TaricRecord | None:
+    index = reference_index.active_index()
+    if index is not None:
+        repo._record_path("pick_most_specific_taric", "index")
+        return index.pick_most_specific_taric(hs_code8, country, ref_date)
+
+    today = ref_date == await _mv_today(conn)
+    repo._record_path("pick_most_specific_taric", "mv_today" if today else "view")
+    rows = await _fetch_rows(
+        conn,
+        repo._PICK_TARIC_TODAY if today else repo._PICK_TARIC,
+        hs_code8=hs_code8,
+        country=country,
+        ref_date=ref_date,
+    )
+    return repo.TaricRecord(*rows[0]) if rows else None
+
+
+async def taric_stable_interval(
+    conn: AsyncConnection, hs_code8: str, country: str, ref_date: date
+) -> tuple[date | None, date | None]:
+    index = reference_index.active_index()
+    if index is not None:
+        return index.stable_interval(hs_code8, country, ref_date)
+
+    rows = await _fetch_rows(
+        conn, repo._STABLE_INTERVAL, hs_code8=hs_code8, country=country, ref_date=ref_date
+    )
+    if not rows:
+        return None, None
+    lower_bound, upper_bound = rows[0]
+    return lower_bound, upper_bound
+
+
+async def _refresh_stamp(conn: AsyncConnection) -> str | None:
+    cached = repo._cached_refresh_stamp()
+    if cached is not repo._STALE:
+        return cached
+    stamp = None
+    if (await _fetchall(conn, repo._REFRESH_STATE_EXISTS_SQL))[0]["present"]:
+        stamp = (await _fetchall(conn, repo._REFRESH_STAMP_SQL))[0]["stamp"]
+    return repo._remember_refresh_stamp(stamp)
+
+
+async def cached_pick_most_specific_taric(
+    conn: AsyncConnection, hs_code8: str, country: str, ref_date: date
+) -> repo.TaricRecord | None:
+    """Asyncio mirror of :func:`repo.cached_pick_most_specific_taric`, sharing its cache."""
+
+    if repo._TARIC_CACHE is None:
+        return await pick_most_specific_taric(conn, hs_code8, country, ref_date)
+    version = repo._index_cache_version() or await _refresh_stamp(conn)
+    key = (hs_code8, country)
+    cached = repo._cached_pick(key, ref_date, version)
+    if cached is not repo._NOT_CACHED:
+        return cached
+
+    record = await pick_most_specific_taric(conn, hs_code8, country, ref_date)
+    valid_from, valid_until = await taric_stable_interval(conn, hs_code8, country, ref_date)
+    repo._TARIC_CACHE.put(key, valid_from, valid_until, record)
+    return record
+
+
+async def derive_hs_from_text(
+    conn: AsyncConnection, text_hint: str | None, ref_date: date
+) -> str | None:
+    if not text_hint:
+        return None
+    index = text_index.active_index()
+    if index is not None:
+        return index.best_match(text_hint, ref_date)
+    query, params = repo._derive_hs_query(text_hint, ref_date)
+    rows = await _fetch_rows(conn, query, **params)
+    return rows[0][0] if rows else None
+
+
+async def latest_snapshot(conn: AsyncConnection, shipment_id: str) -> dict | None:
+    rows = await _fetchall(conn, repo._LATEST_SNAPSHOT_SQL, shipment_id=shipment_id)
+    return rows[0] if rows else None
+
+
+async def get_cbam_default(
+    conn: AsyncConnection, hs_code8: str, country: str, ref_date: date
+) -> repo.EmissionDefault | None:
+    rows = await _fetch_rows(
+        conn, repo._CBAM_DEFAULT, hs_code8=hs_code8, country=country, ref_date=ref_date
+    )
+    return repo.EmissionDefault(*rows[0]) if rows else None
+
+
+async def persist_classification_snapshot(
+    conn: AsyncConnection,
+    shipment_id: str,
+    result_hs: str,
+    result_taric: str | None,
+    ruling_id: str | None,
+    source: str,
+    ref_date: date,
+    *,
+    commit: bool = True,
+) -> None:
+    await conn.execute(
+        text(repo._INSERT_SNAPSHOT_SQL),
+        {
+            "shipment_id": shipment_id,
+            "hs_code8": result_hs,
+            "taric_code": result_taric,
+            "ruling_id": ruling_id,
+            "source": source,
+            "ref_date": ref_date,
+        },
+    )
+    if commit:
+        await conn.commit()
+
+
+async def upsert_cbam_report_draft(
+    conn: AsyncConnection,
+    shipment_id: str,
+    result: Classification | ClassificationResult,
+    emission_intensity: float | None,
+    emission_source: str | None,
+    *,
+    commit: bool = True,
+) -> None:
+    await conn.execute(
+        text(repo._UPSERT_DRAFT_SQL),
+        repo._draft_params(shipment_id, result, emission_intensity, emission_source),
+    )
+    if commit:
+        await conn.commit()
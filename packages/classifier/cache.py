@@ -0,0 +1,150 @@
+"""Bounded, expiring caches for classifier lookups.
+
+Entries are stored against the validity interval over which a lookup result is
+known to stay the same, so one cached decision serves every reference date in
+that interval. The cache is also bound to a reference data version and drops
+all entries as soon as a different version is observed.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from datetime import date
+from threading import Lock
+from typing import Any
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    valid_from: date | None
+    valid_until: date | None
+    value: Any
+    expires_at: float
+
+    def covers(self, ref_date: date) -> bool:
+        return (self.valid_from is None or self.valid_from <= ref_date) and (
+            self.valid_until is None or ref_date < self.valid_until
+        )
+
+
+class IntervalCache:
+    """LRU cache with TTL whose entries cover ``[valid_from, valid_until)``.
+
+    ``None`` bounds are open-ended. Lookups scan the handful of intervals stored
+    for a key, so keys should be chosen such that they have few distinct results.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        ttl: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = Lock()
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._by_key: dict[Hashable, list[tuple]] = {}
+        self._version: str | None = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key: Hashable, ref_date: date, default: Any = _MISSING) -> Any:
+        """Return the cached value covering ``ref_date`` or ``default``."""
+
+        now = self._clock()
+        with self._lock:
+            for slot in self._by_key.get(key, ()):
+                entry = self._entries[slot]
+                if not entry.covers(ref_date):
+                    continue
+                if entry.expires_at <= now:
+                    self._expirations += 1
+                    self._discard(slot)
+                    break
+                self._entries.move_to_end(slot)
+                self._hits += 1
+                return entry.value
+            self._misses += 1
+        return default
+
+    def put(
+        self,
+        key: Hashable,
+        valid_from: date | None,
+        valid_until: date | None,
+        value: Any,
+    ) -> None:
+        slot = (key, valid_from, valid_until)
+        with self._lock:
+            if slot in self._entries:
+                self._discard(slot)
+            self._entries[slot] = _Entry(valid_from, valid_until, value, self._clock() + self.ttl)
+            self._by_key.setdefault(key, []).append(slot)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self._evictions += 1
+
+    def sync_version(self, version: str | None) -> None:
+        """Drop every entry when the reference data version has changed."""
+
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            if self._entries:
+                self._invalidations += 1
+            self._entries.clear()
+            self._by_key.clear()
+            self._version = version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                invalidations=self._invalidations,
+                size=len(self._entries),
+            )
+
+    def _discard(self, slot: tuple) -> None:
+        del self._entries[slot]
+        slots = self._by_key[slot[0]]
+        slots.remove(slot)
+        if not slots:
+            del self._by_key[slot[0]]
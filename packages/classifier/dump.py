@@ -0,0 +1,275 @@
+"""Frozen reference dumps, read with the embedded DuckDB engine.
+
+A dump is a directory holding one Parquet or CSV file per reference table
+(``taric_nomenclature``, ``taric_measures``, ``bti_rulings``, ``hs_codes`` and
+``cbam_default_emissions``) with the columns of the Postgres base tables;
+``python -m packages.classifier.dump export DIR`` writes one from ``DATABASE_URL``.
+
+:func:`install_dump` loads a dump into the in-process reference and text
+indexes. From then on the repository answers every lookup made by
+:func:`~packages.classifier.resolver.classify_many` from memory, so classification
+needs no database at all. :func:`connect` exposes the dump as DuckDB views
+(mirroring the canonical ``v_*`` views) for set-based work such as the CBAM
+default join of :mod:`packages.emissions_linker.offline`.
+
+DuckDB is an optional dependency (``backend/requirements-offline.txt``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy.engine import Connection
+
+from . import reference_index, repo, text_index
+
+DUMP_COLUMNS = {
+    "taric_nomenclature": ("code", "cn_code", "description", "valid_from", "valid_to"),
+    "taric_measures": ("taric_code", "measure_type", "country_code", "valid_from", "valid_to"),
+    "bti_rulings": (
+        "id",
+        "ruling_ref",
+        "hs_code8",
+        "taric_code",
+        "country_scope",
+        "valid_from",
+        "valid_to",
+        "precedence",
+        "status",
+        "source",
+    ),
+    "hs_codes": ("hs_code8", "description", "valid_from", "valid_to"),
+    "cbam_default_emissions": (
+        "hs_code8",
+        "country_code",
+        "emission_intensity",
+        "source",
+        "valid_from",
+        "valid_to",
+    ),
+}
+
+# Canonical views over the dump, typed explicitly so Parquet and CSV dumps (read
+# as text, which keeps leading zeros in codes) behave the same.
+_VIEWS = {
+    "v_taric_nomenclature": """
+        SELECT CAST(code AS VARCHAR) AS taric_code,
+               CAST(cn_code AS VARCHAR) AS hs_code8,
+               CAST(description AS VARCHAR) AS description,
+               CAST(valid_from AS DATE) AS valid_from,
+               CAST(valid_to AS DATE) AS valid_to
+        FROM taric_nomenclature
+    """,
+    "v_taric_measures": """
+        SELECT CAST(taric_code AS VARCHAR) AS taric_code,
+               CAST(country_code AS VARCHAR) AS country_code,
+               CAST(valid_from AS DATE) AS valid_from,
+               CAST(valid_to AS DATE) AS valid_to
+        FROM taric_measures
+    """,
+    "v_bti_rulings": """
+        SELECT CAST(id AS VARCHAR) AS id,
+               CAST(hs_code8 AS VARCHAR) AS hs_code8,
+               CAST(taric_code AS VARCHAR) AS taric_code,
+               CAST(country_scope AS VARCHAR) AS country_scope,
+               CAST(precedence AS INTEGER) AS precedence,
+               CAST(valid_from AS DATE) AS valid_from,
+               CAST(valid_to AS DATE) AS valid_to,
+               CAST(status AS VARCHAR) AS status,
+               CAST(source AS VARCHAR) AS source
+        FROM bti_rulings
+    """,
+    "v_hs_codes": """
+        SELECT CAST(hs_code8 AS VARCHAR) AS hs_code8,
+               CAST(description AS VARCHAR) AS description,
+               CAST(valid_from AS DATE) AS valid_from,
+               CAST(valid_to AS DATE) AS valid_to
+        FROM hs_codes
+    """,
+    "v_cbam_default_emissions": """
+        SELECT CAST(hs_code8 AS VARCHAR) AS hs_code8,
+               CAST(country_code AS VARCHAR) AS country_code,
+               CAST(emission_intensity AS DOUBLE) AS emission_intensity,
+               CAST(source AS VARCHAR) AS source,
+               CAST(valid_from AS DATE) AS valid_from,
+               CAST(valid_to AS DATE) AS valid_to
+        FROM cbam_default_emissions
+    """,
+}
+
+
+def require_duckdb() -> Any:
+    try:
+        import duckdb
+    except ImportError as error:
+        raise RuntimeError(
+            "Reference dumps need the optional duckdb package "
+            "(pip install -r backend/requirements-offline.txt)"
+        ) from error
+    return duckdb
+
+
+def sql_literal(value: str) -> str:
+    """``value`` quoted as a DuckDB string literal."""
+
+    return "'" + value.replace("'", "''") + "'"
+
+
+def file_source(path: Path) -> str:
+    """DuckDB table function scanning a Parquet or CSV (optionally gzipped) file."""
+
+    if path.suffix == ".parquet":
+        return f"read_parquet({sql_literal(str(path))})"
+    if path.name.endswith((".csv", ".csv.gz")):
+        return f"read_csv_auto({sql_literal(str(path))}, header = true, all_varchar = true)"
+    raise ValueError(f"Unsupported file type: {path} (expected .parquet, .csv or .csv.gz)")
+
+
+def _table_file(directory: Path, table: str) -> Path:
+    for suffix in (".parquet", ".csv", ".csv.gz"):
+        path = directory / f"{table}{suffix}"
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"{directory} has no {table}.parquet or {table}.csv")
+
+
+def dump_version(directory: Path) -> str:
+    """Content hash of the dump's files, used as the reference data version."""
+
+    digest = hashlib.sha1()
+    for table in DUMP_COLUMNS:
+        path = _table_file(directory, table)
+        digest.update(path.name.encode())
+        with path.open("rb") as handle:
+            while block := handle.read(1 << 20):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def connect(directory: Path) -> Any:
+    """Open an in-memory DuckDB database with the dump's tables and views defined."""
+
+    con = require_duckdb().connect()
+    for table in DUMP_COLUMNS:
+        con.execute(
+            f"CREATE VIEW {table} AS SELECT * FROM {file_source(_table_file(directory, table))}"
+        )
+    for view, statement in _VIEWS.items():
+        con.execute(f"CREATE VIEW {view} AS {statement}")
+    return con
+
+
+def fetch_dicts(con: Any, statement: str) -> list[dict[str, Any]]:
+    cursor = con.execute(statement)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row, strict=True)) for row in cursor.fetchall()]
+
+
+def load_dump(
+    directory: Path,
+) -> tuple[reference_index.ReferenceIndex, text_index.HsTextIndex]:
+    """Build the reference and text indexes from the dump in ``directory``."""
+
+    version = dump_version(directory)
+    con = connect(directory)
+    try:
+        index = reference_index.ReferenceIndex.from_rows(
+            version,
+            fetch_dicts(
+                con,
+                "SELECT taric_code, hs_code8, valid_from, valid_to, description "
+                "FROM v_taric_nomenclature",
+            ),
+            fetch_dicts(
+                con, "SELECT taric_code, country_code, valid_from, valid_to FROM v_taric_measures"
+            ),
+            fetch_dicts(
+                con,
+                "SELECT id, hs_code8, taric_code, country_scope, precedence, valid_from, "
+                "valid_to, source FROM v_bti_rulings WHERE status = 'ACTIVE'",
+            ),
+        )
+        texts = text_index.HsTextIndex.from_rows(
+            version,
+            fetch_dicts(
+                con,
+                "SELECT hs_code8, description, valid_from, valid_to "
+                "FROM v_hs_codes WHERE description IS NOT NULL",
+            ),
+        )
+    finally:
+        con.close()
+    return index, texts
+
+
+def install_dump(directory: Path) -> str:
+    """Load the dump and install its indexes; returns the dump's version."""
+
+    index, texts = load_dump(directory)
+    reference_index.install_index(index)
+    text_index.install_index(texts)
+    return index.version
+
+
+def export_dump(conn: Connection, directory: Path, *, shipments: bool = False) -> dict[str, Path]:
+    """Write every reference table (and optionally ``shipments``) as CSV into ``directory``."""
+
+    tables = dict(DUMP_COLUMNS)
+    if shipments:
+        tables["shipments"] = (
+            "id",
+            "arrived_at",
+            "country_code",
+            "hs_code",
+            "description",
+            "net_weight_kg",
+            "gross_weight_kg",
+        )
+    directory.mkdir(parents=True, exist_ok=True)
+    cursor = conn.connection.dbapi_connection.cursor()
+    written = {}
+    try:
+        for table, columns in tables.items():
+            path = directory / f"{table}.csv"
+            query = f"SELECT {', '.join(columns)} FROM {table}"
+            statement = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)"
+            with path.open("w", newline="") as handle:
+                cursor.copy_expert(statement, handle)
+            written[table] = path
+    finally:
+        cursor.close()
+    return written
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="dump the reference tables of DATABASE_URL")
+    export.add_argument("directory", type=Path)
+    export.add_argument("--shipments", action="store_true", help="export shipments too")
+    check = commands.add_parser("check", help="load a dump and report its version and size")
+    check.add_argument("directory", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        with repo.get_engine().connect() as conn:
+            written = export_dump(conn, args.directory, shipments=args.shipments)
+        print(json.dumps({table: str(path) for table, path in written.items()}))
+    else:
+        index, texts = load_dump(args.directory)
+        summary = {
+            "version": index.version,
+            "hs_codes": len(index.tarics_by_hs),
+            "taric_codes": len(index.tarics_by_code),
+            "text_documents": len(texts.docs),
+        }
+        print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
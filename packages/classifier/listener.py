@@ -0,0 +1,120 @@
+"""Invalidate in-process reference caches when the reference views are refreshed.
+
+:mod:`.refresh` sends a ``NOTIFY`` on :data:`CHANNEL` after it refreshed at
+least one view. :class:`ReferenceChangeListener` keeps a dedicated connection
+``LISTEN``-ing on that channel in a daemon thread and calls
+:func:`handle_reference_change` for every notification, so caches are dropped
+at once instead of when their TTL runs out.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import select
+import threading
+
+from sqlalchemy.engine import Engine
+
+from . import reference_index, repo, text_index
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "classifier_reference"
+
+
+def handle_reference_change(payload: str | None = None) -> None:
+    """Drop cached reference lookups and reload the in-process indexes if installed.
+
+    ``payload`` is the JSON sent by :func:`.refresh.notify_reference_change`;
+    ``None`` means notifications may have been missed (e.g. after a reconnect).
+    """
+
+    version = json.loads(payload).get("version") if payload else None
+    repo.invalidate_reference_caches()
+    if version is not None:
+        reference_index.set_reference_version(version)
+    if reference_index.active_index() is None and text_index.active_index() is None:
+        return
+    with repo.get_connection() as conn:
+        if reference_index.active_index() is not None:
+            reference_index.refresh_index(conn)
+        if text_index.active_index() is not None:
+            text_index.refresh_text_index(conn)
+
+
+class ReferenceChangeListener:
+    """Background ``LISTEN`` loop calling :func:`handle_reference_change`."""
+
+    def __init__(
+        self,
+        engine: Engine | None = None,
+        *,
+        channel: str = CHANNEL,
+        poll_interval: float = 5.0,
+        retry_interval: float = 10.0,
+    ) -> None:
+        self.engine = engine
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="classifier-reference-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout if timeout is not None else self.poll_interval + 1)
+            self._thread = None
+
+    def _connect(self):
+        # A detached DBAPI connection: LISTEN state must not leak back into the pool.
+        proxied = (self.engine or repo.get_engine()).raw_connection()
+        proxied.detach()
+        dbapi_conn = proxied.dbapi_connection
+        dbapi_conn.autocommit = True
+        with dbapi_conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return dbapi_conn
+
+    def _run(self) -> None:
+        first = True
+        while not self._stop.is_set():
+            try:
+                dbapi_conn = self._connect()
+            except Exception:
+                logger.exception("Could not LISTEN on %s; retrying", self.channel)
+                self._stop.wait(self.retry_interval)
+                continue
+            try:
+                if not first:
+                    # Anything sent while disconnected was lost.
+                    handle_reference_change(None)
+                first = False
+                self._listen(dbapi_conn)
+            except Exception:
+                logger.exception("Reference listener on %s failed; reconnecting", self.channel)
+                self._stop.wait(self.retry_interval)
+            finally:
+                dbapi_conn.close()
+
+    def _listen(self, dbapi_conn) -> None:
+        while not self._stop.is_set():
+            if select.select([dbapi_conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            dbapi_conn.poll()
+            payloads = [notify.payload for notify in dbapi_conn.notifies]
+            dbapi_conn.notifies.clear()
+            # One invalidation covers any burst of notifications.
+            if payloads:
+                logger.info("Reference views refreshed; invalidating caches")
+                handle_reference_change(payloads[-1])
@@ -0,0 +1,186 @@
+"""Connection pool settings and metrics for the classifier engines.
+
+Pool sizing comes from the environment so it can be matched to the database's
+``max_connections`` (every worker process holds up to
+``CLASSIFIER_POOL_SIZE + CLASSIFIER_POOL_MAX_OVERFLOW`` connections per engine):
+
+``CLASSIFIER_POOL_SIZE`` (5), ``CLASSIFIER_POOL_MAX_OVERFLOW`` (10)
+    Connections kept open, and extra ones opened under load and closed on return.
+``CLASSIFIER_POOL_TIMEOUT`` (30)
+    Seconds a checkout waits for a free connection before failing.
+``CLASSIFIER_POOL_RECYCLE`` (1800)
+    Seconds after which a connection is replaced; ``-1`` keeps them forever.
+``CLASSIFIER_POOL_PRE_PING`` (``idle``)
+    ``always`` pings on every checkout, ``idle`` only when the connection sat in
+    the pool longer than ``CLASSIFIER_POOL_PING_IDLE`` seconds (10), ``never``
+    leaves dead connections to be detected by the failing statement.
+
+:class:`PoolMetrics` counts checkouts, overflow checkouts, timeouts and the time
+spent waiting for a connection; :func:`instrument` wires it to an engine.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+PRE_PING_MODES = ("always", "idle", "never")
+
+# Key in the pool's per-DBAPI-connection ``info`` dict.
+_RETURNED_AT_KEY = "classifier_returned_at"
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30.0
+    recycle: int = 1800
+    pre_ping: str = "idle"
+    ping_idle: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> PoolSettings:
+        pre_ping = os.getenv("CLASSIFIER_POOL_PRE_PING", cls.pre_ping).lower()
+        if pre_ping not in PRE_PING_MODES:
+            raise ValueError(f"CLASSIFIER_POOL_PRE_PING must be one of {', '.join(PRE_PING_MODES)}")
+        return cls(
+            size=int(os.getenv("CLASSIFIER_POOL_SIZE") or cls.size),
+            max_overflow=int(os.getenv("CLASSIFIER_POOL_MAX_OVERFLOW") or cls.max_overflow),
+            timeout=float(os.getenv("CLASSIFIER_POOL_TIMEOUT") or cls.timeout),
+            recycle=int(os.getenv("CLASSIFIER_POOL_RECYCLE") or cls.recycle),
+            pre_ping=pre_ping,
+            ping_idle=float(os.getenv("CLASSIFIER_POOL_PING_IDLE") or cls.ping_idle),
+        )
+
+    def engine_kwargs(self) -> dict[str, Any]:
+        """Keyword arguments for ``create_engine`` / ``create_async_engine``."""
+
+        return {
+            "pool_size": self.size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.timeout,
+            "pool_recycle": self.recycle,
+            "pool_pre_ping": self.pre_ping == "always",
+        }
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    overflow_checkouts: int
+    timeouts: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+    @property
+    def wait_seconds_mean(self) -> float:
+        return self.wait_seconds_total / self.checkouts if self.checkouts else 0.0
+
+
+class PoolMetrics:
+    """Checkout counters for one engine's pool."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._pool: Any = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checkouts = 0
+            self._overflow_checkouts = 0
+            self._timeouts = 0
+            self._wait_total = 0.0
+            self._wait_max = 0.0
+
+    def bind(self, pool: Any) -> None:
+        self._pool = pool
+
+    def record_checkout(self, overflow: bool) -> None:
+        with self._lock:
+            self._checkouts += 1
+            self._overflow_checkouts += overflow
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._wait_total += seconds
+            self._wait_max = max(self._wait_max, seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    @contextmanager
+    def timed_checkout(self) -> Iterator[None]:
+        """Measure how long the wrapped ``connect()`` waits for the pool."""
+
+        started = time.perf_counter()
+        try:
+            yield
+        except exc.TimeoutError:
+            self.record_timeout()
+            raise
+        self.record_wait(time.perf_counter() - started)
+
+    def stats(self) -> PoolStats:
+        pool = self._pool
+        queued = isinstance(pool, QueuePool)
+        size = pool.size() if queued else 0
+        checked_out = pool.checkedout() if queued else 0
+        # QueuePool reports a negative overflow while connections are still unopened.
+        overflow = max(pool.overflow(), 0) if queued else 0
+        with self._lock:
+            return PoolStats(
+                size=size,
+                checked_out=checked_out,
+                overflow=overflow,
+                checkouts=self._checkouts,
+                overflow_checkouts=self._overflow_checkouts,
+                timeouts=self._timeouts,
+                wait_seconds_total=self._wait_total,
+                wait_seconds_max=self._wait_max,
+            )
+
+
+def _ping(dbapi_connection: Any) -> None:
+    with closing(dbapi_connection.cursor()) as cursor:
+        cursor.execute("SELECT 1")
+
+
+def instrument(engine: Engine, metrics: PoolMetrics, settings: PoolSettings) -> None:
+    """Attach ``metrics`` (and the ``idle`` pre-ping strategy) to ``engine``'s pool."""
+
+    metrics.bind(engine.pool)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        returned_at = connection_record.info.pop(_RETURNED_AT_KEY, None)
+        if (
+            settings.pre_ping == "idle"
+            and returned_at is not None
+            and time.monotonic() - returned_at > settings.ping_idle
+        ):
+            try:
+                _ping(dbapi_connection)
+            except Exception as error:
+                # The pool discards this connection and retries with a fresh one.
+                raise exc.DisconnectionError() from error
+        pool = engine.pool
+        metrics.record_checkout(isinstance(pool, QueuePool) and pool.checkedout() > pool.size())
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info[_RETURNED_AT_KEY] = time.monotonic()
@@ -0,0 +1,125 @@
+"""Registry of the classifier's hot lookup statements.
+
+Every registered :class:`Query` is compiled once: its :func:`sqlalchemy.text`
+construct is built at import time, and on psycopg2 connections it is also
+``PREPARE``-d on the server the first time a connection runs it, so later calls
+only send ``EXECUTE`` with the parameters and skip parsing and planning.
+:func:`fetch` maps result rows positionally onto a record type without building
+intermediate dicts, so a query's select list must follow the field order of the
+type it is fetched into.
+
+Set ``CLASSIFIER_PREPARED_STATEMENTS=0`` when connections go through a pooler
+that does not keep server sessions (e.g. PgBouncer in transaction mode); the
+compiled statements are still reused.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from collections.abc import Callable
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.elements import TextClause
+
+from . import tracing
+
+T = TypeVar("T")
+
+PREPARED_STATEMENTS = os.getenv("CLASSIFIER_PREPARED_STATEMENTS", "1").lower() not in {
+    "0",
+    "false",
+    "no",
+}
+
+# Named binds as understood by ``text()``; ``::type`` casts are not binds.
+_BIND_RE = re.compile(r"(?<![:\w]):(\w+)")
+# Key in the pool's per-DBAPI-connection ``info`` dict.
+_PREPARED_KEY = "classifier_prepared"
+
+
+@dataclass(frozen=True)
+class Query:
+    """A named statement with declared Postgres parameter types."""
+
+    name: str
+    sql: str
+    param_types: dict[str, str]
+    statement: TextClause = field(init=False, repr=False, compare=False)
+    prepare_sql: str = field(init=False, repr=False, compare=False)
+    execute_sql: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        params = list(self.param_types)
+        undeclared = set(_BIND_RE.findall(self.sql)) - set(params)
+        if undeclared:
+            raise ValueError(f"{self.name}: undeclared parameters {sorted(undeclared)}")
+        positional = _BIND_RE.sub(lambda match: f"${params.index(match.group(1)) + 1}", self.sql)
+        types = ", ".join(self.param_types.values())
+        arguments = ", ".join(f"%({name})s" for name in params)
+        object.__setattr__(self, "statement", text(self.sql))
+        object.__setattr__(
+            self, "prepare_sql", f"PREPARE classifier_{self.name} ({types}) AS {positional}"
+        )
+        object.__setattr__(
+            self,
+            "execute_sql",
+            f"EXECUTE classifier_{self.name}" + (f" ({arguments})" if params else ""),
+        )
+
+
+QUERIES: dict[str, Query] = {}
+
+
+def register(name: str, sql: str, **param_types: str) -> Query:
+    """Register ``sql`` under ``name``; ``param_types`` maps each bind to its SQL type."""
+
+    if name in QUERIES:
+        raise ValueError(f"query {name!r} is already registered")
+    query = QUERIES[name] = Query(name, sql, param_types)
+    return query
+
+
+def _uses_prepared(conn: Connection) -> bool:
+    return PREPARED_STATEMENTS and conn.dialect.driver == "psycopg2"
+
+
+def _prepared_rows(conn: Connection, query: Query, params: dict[str, Any]) -> list[tuple]:
+    if not conn.in_transaction():
+        # Keep the raw cursor inside the transaction ``conn.commit()`` ends.
+        conn.begin()
+    fairy = conn.connection
+    prepared: set[str] = fairy.info.setdefault(_PREPARED_KEY, set())
+    # The raw cursor bypasses the engine's ``before_cursor_execute`` hooks.
+    tracing.record_query()
+    with closing(fairy.dbapi_connection.cursor()) as cursor:
+        if query.name not in prepared:
+            cursor.execute(query.prepare_sql)
+            prepared.add(query.name)
+        cursor.execute(query.execute_sql, params)
+        return cursor.fetchall()
+
+
+def fetch_rows(conn: Connection, query: Query, **params: Any) -> list[tuple]:
+    """Run ``query`` and return its rows as tuples."""
+
+    if _uses_prepared(conn):
+        return _prepared_rows(conn, query, params)
+    with closing(conn.execute(query.statement, params)) as result:
+        return result.fetchall()
+
+
+def fetch(conn: Connection, query: Query, factory: Callable[..., T], **params: Any) -> list[T]:
+    """Run ``query`` and build one ``factory(*row)`` per result row."""
+
+    return [factory(*row) for row in fetch_rows(conn, query, **params)]
+
+
+def forget_prepared(dbapi_connection: Any, connection_record: Any) -> None:
+    """Pool ``connect`` listener: a new server session has no prepared statements."""
+
+    connection_record.info.pop(_PREPARED_KEY, None)
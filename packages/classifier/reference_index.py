@@ -0,0 +1,348 @@
+"""In-process snapshot of the slowly changing classifier reference data.
+
+The index mirrors ``v_taric_nomenclature``, ``v_taric_measures`` and the active
+``bti_rulings`` so the repository can answer TARIC, validity and ruling lookups
+from memory. It is immutable once built; a refreshed snapshot is swapped in
+atomically by :func:`install_index` and readers holding the previous instance
+keep a consistent view.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from bisect import bisect_right
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+from sqlalchemy.engine import Connection
+
+from . import repo
+from .rules import RulingCandidate
+
+_MIN_DATE = date.min
+_MAX_DATE = date.max
+_RULING_LIMIT = 10
+
+_Intervals = tuple[tuple[date, ...], tuple[date, ...]]
+
+
+def _is_valid_on(valid_from: date | None, valid_to: date | None, ref_date: date) -> bool:
+    return (valid_from is None or valid_from <= ref_date) and (
+        valid_to is None or valid_to >= ref_date
+    )
+
+
+def _merge_intervals(intervals: Iterable[tuple[date | None, date | None]]) -> _Intervals:
+    """Coalesce inclusive validity intervals into sorted, non-overlapping arrays."""
+
+    merged: list[list[date]] = []
+    for start, end in sorted((s or _MIN_DATE, e or _MAX_DATE) for s, e in intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return tuple(s for s, _ in merged), tuple(e for _, e in merged)
+
+
+def _covers(intervals: _Intervals | None, ref_date: date) -> bool:
+    if not intervals:
+        return False
+    starts, ends = intervals
+    pos = bisect_right(starts, ref_date) - 1
+    return pos >= 0 and ends[pos] >= ref_date
+
+
+def _edges(valid_from: date | None, valid_to: date | None) -> list[date]:
+    """Dates on which an inclusive validity interval starts or stops applying."""
+
+    edges = []
+    if valid_from is not None and valid_from != _MIN_DATE:
+        edges.append(valid_from)
+    if valid_to is not None and valid_to != _MAX_DATE:
+        edges.append(valid_to + timedelta(days=1))
+    return edges
+
+
+@dataclass(frozen=True, slots=True)
+class _Ruling:
+    id: str
+    hs_code8: str
+    taric_code: str | None
+    country_scope: str | None
+    precedence: int
+    valid_from: date | None
+    valid_to: date | None
+    source: str | None
+
+    def applies(self, country: str | None, ref_date: date) -> bool:
+        return (
+            country is None or self.country_scope is None or self.country_scope == country
+        ) and _is_valid_on(self.valid_from, self.valid_to, ref_date)
+
+    def candidate(self) -> RulingCandidate:
+        return RulingCandidate(
+            id=self.id,
+            hs_code8=self.hs_code8,
+            taric_code=self.taric_code,
+            precedence=self.precedence,
+            valid_from=self.valid_from.isoformat() if self.valid_from else None,
+            valid_to=self.valid_to.isoformat() if self.valid_to else None,
+            source=self.source,
+        )
+
+
+@dataclass(frozen=True)
+class ReferenceIndex:
+    """Immutable lookup structures built from one reference data snapshot."""
+
+    version: str
+    loaded_at: datetime
+    tarics_by_hs: Mapping[str, tuple[repo.TaricRecord, ...]] = field(repr=False)
+    tarics_by_code: Mapping[str, tuple[repo.TaricRecord, ...]] = field(repr=False)
+    measures: Mapping[tuple[str, str | None], _Intervals] = field(repr=False)
+    rulings_by_taric: Mapping[str, tuple[_Ruling, ...]] = field(repr=False)
+    rulings_by_hs: Mapping[str, tuple[_Ruling, ...]] = field(repr=False)
+
+    @classmethod
+    def from_rows(
+        cls,
+        version: str,
+        nomenclature: Iterable[Mapping[str, Any]],
+        measures: Iterable[Mapping[str, Any]],
+        rulings: Iterable[Mapping[str, Any]],
+    ) -> ReferenceIndex:
+        records = [
+            repo.TaricRecord(
+                taric_code=row["taric_code"],
+                hs_code8=row["hs_code8"],
+                valid_from=row.get("valid_from"),
+                valid_to=row.get("valid_to"),
+                description=row.get("description"),
+            )
+            for row in nomenclature
+        ]
+        by_hs: dict[str, list[repo.TaricRecord]] = {}
+        by_code: dict[str, list[repo.TaricRecord]] = {}
+        for record in records:
+            by_hs.setdefault(record.hs_code8, []).append(record)
+            by_code.setdefault(record.taric_code, []).append(record)
+
+        measure_intervals: dict[tuple[str, str | None], list[tuple[date | None, ...]]] = {}
+        for row in measures:
+            key = (row["taric_code"], row.get("country_code"))
+            measure_intervals.setdefault(key, []).append(
+                (row.get("valid_from"), row.get("valid_to"))
+            )
+
+        by_taric: dict[str, list[_Ruling]] = {}
+        by_ruling_hs: dict[str, list[_Ruling]] = {}
+        for row in rulings:
+            ruling = _Ruling(
+                id=str(row["id"]),
+                hs_code8=row["hs_code8"],
+                taric_code=row.get("taric_code"),
+                country_scope=row.get("country_scope"),
+                precedence=row["precedence"],
+                valid_from=row.get("valid_from"),
+                valid_to=row.get("valid_to"),
+                source=row.get("source"),
+            )
+            by_ruling_hs.setdefault(ruling.hs_code8, []).append(ruling)
+            if ruling.taric_code:
+                by_taric.setdefault(ruling.taric_code, []).append(ruling)
+
+        def ruling_order(ruling: _Ruling) -> tuple:
+            return (ruling.precedence, -(ruling.valid_from or _MIN_DATE).toordinal())
+
+        def latest_first(record: repo.TaricRecord) -> tuple:
+            # Mirrors ``ORDER BY valid_from DESC`` where Postgres sorts NULLs first.
+            return (record.valid_from is not None, -(record.valid_from or _MIN_DATE).toordinal())
+
+        return cls(
+            version=version,
+            loaded_at=datetime.now(UTC),
+            tarics_by_hs={
+                hs: tuple(sorted(items, key=lambda r: (-len(r.taric_code), r.taric_code)))
+                for hs, items in by_hs.items()
+            },
+            tarics_by_code={
+                code: tuple(sorted(items, key=latest_first)) for code, items in by_code.items()
+            },
+            measures={key: _merge_intervals(items) for key, items in measure_intervals.items()},
+            rulings_by_taric={
+                code: tuple(sorted(items, key=ruling_order)) for code, items in by_taric.items()
+            },
+            rulings_by_hs={
+                hs: tuple(sorted(items, key=ruling_order)) for hs, items in by_ruling_hs.items()
+            },
+        )
+
+    def taric_candidates(self, hs_code8: str, ref_date: date) -> list[repo.TaricRecord]:
+        return [
+            record
+            for record in self.tarics_by_hs.get(hs_code8, ())
+            if _is_valid_on(record.valid_from, record.valid_to, ref_date)
+        ]
+
+    def measure_matches(self, taric_code: str, country: str, ref_date: date) -> bool:
+        return _covers(self.measures.get((taric_code, None)), ref_date) or _covers(
+            self.measures.get((taric_code, country)), ref_date
+        )
+
+    def pick_most_specific_taric(
+        self, hs_code8: str, country: str, ref_date: date
+    ) -> repo.TaricRecord | None:
+        candidates = self.taric_candidates(hs_code8, ref_date)
+        for candidate in candidates:
+            if self.measure_matches(candidate.taric_code, country, ref_date):
+                return candidate
+        return candidates[0] if candidates else None
+
+    def taric_validity(self, taric_code: str) -> tuple[date | None, date | None]:
+        records = self.tarics_by_code.get(taric_code)
+        if not records:
+            return None, None
+        return records[0].valid_from, records[0].valid_to
+
+    def get_applicable_rulings(
+        self,
+        hs_code8: str,
+        taric_code: str | None,
+        country: str | None,
+        ref_date: date,
+    ) -> list[RulingCandidate]:
+        if taric_code:
+            matched = self._applicable(self.rulings_by_taric.get(taric_code, ()), country, ref_date)
+            if matched:
+                return matched
+        return self._applicable(self.rulings_by_hs.get(hs_code8, ()), country, ref_date)
+
+    def stable_interval(
+        self, hs_code8: str, country: str, ref_date: date
+    ) -> tuple[date | None, date | None]:
+        """Return ``[start, end)`` around ``ref_date`` where TARIC picks cannot change."""
+
+        boundaries: list[date] = []
+        for record in self.tarics_by_hs.get(hs_code8, ()):
+            boundaries.extend(_edges(record.valid_from, record.valid_to))
+            for scope in (None, country):
+                starts, ends = self.measures.get((record.taric_code, scope), ((), ()))
+                for start, end in zip(starts, ends, strict=True):
+                    boundaries.extend(_edges(start, end))
+        lower = max((b for b in boundaries if b <= ref_date), default=None)
+        upper = min((b for b in boundaries if b > ref_date), default=None)
+        return lower, upper
+
+    @staticmethod
+    def _applicable(
+        rulings: Iterable[_Ruling], country: str | None, ref_date: date
+    ) -> list[RulingCandidate]:
+        matched: list[RulingCandidate] = []
+        for ruling in rulings:
+            if ruling.applies(country, ref_date):
+                matched.append(ruling.candidate())
+                if len(matched) == _RULING_LIMIT:
+                    break
+        return matched
+
+
+# Tables behind the in-process reference and text indexes.
+REFERENCE_TABLES = ("bti_rulings", "hs_codes", "taric_measures", "taric_nomenclature")
+
+
+def source_versions(conn: Connection, tables: Iterable[str]) -> dict[str, int]:
+    """Committed change counters of ``tables`` (migration 014); ``0`` if never written."""
+
+    rows = repo._fetchall(
+        conn,
+        """
+        SELECT t.name AS table_name, coalesce(v.version, 0) AS version
+        FROM unnest(CAST(:tables AS text[])) AS t(name)
+        LEFT JOIN reference_source_versions v ON v.table_name = t.name
+        ORDER BY t.name
+        """,
+        tables=list(tables),
+    )
+    return {row["table_name"]: row["version"] for row in rows}
+
+
+def reference_version(conn: Connection) -> str:
+    """Return a cheap stamp that changes whenever a write to the reference tables commits."""
+
+    versions = source_versions(conn, REFERENCE_TABLES)
+    fingerprint = ";".join(f"{table}:{version}" for table, version in versions.items())
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+
+def load_reference_index(conn: Connection, version: str | None = None) -> ReferenceIndex:
+    """Read the reference views into a new :class:`ReferenceIndex`."""
+
+    version = version or reference_version(conn)
+    nomenclature = repo._fetchall(
+        conn,
+        """
+        SELECT taric_code, hs_code8, valid_from, valid_to, description
+        FROM v_taric_nomenclature
+        """,
+    )
+    measures = repo._fetchall(
+        conn,
+        """
+        SELECT taric_code, country_code, valid_from, valid_to
+        FROM v_taric_measures
+        """,
+    )
+    rulings = repo._fetchall(
+        conn,
+        """
+        SELECT id::text, hs_code8, taric_code, country_scope, precedence,
+               valid_from, valid_to, source
+        FROM bti_rulings
+        WHERE status = 'ACTIVE'
+        """,
+    )
+    return ReferenceIndex.from_rows(version, nomenclature, measures, rulings)
+
+
+_ACTIVE: ReferenceIndex | None = None
+_VERSION: str | None = None
+
+
+def active_index() -> ReferenceIndex | None:
+    return _ACTIVE
+
+
+def current_version() -> str | None:
+    """Return the latest reference data version this process has observed."""
+
+    return _VERSION
+
+
+def set_reference_version(version: str | None) -> None:
+    """Record a reference data version announced outside of an index load."""
+
+    global _VERSION
+    _VERSION = version
+
+
+def install_index(index: ReferenceIndex | None) -> None:
+    """Atomically swap the index used by the repository (``None`` disables it)."""
+
+    global _ACTIVE
+    _ACTIVE = index
+    if index is not None:
+        set_reference_version(index.version)
+
+
+def refresh_index(conn: Connection, *, force: bool = False) -> ReferenceIndex:
+    """Reload and install the index when the reference version has changed."""
+
+    current = _ACTIVE
+    version = reference_version(conn)
+    if current is not None and current.version == version and not force:
+        return current
+    index = load_reference_index(conn, version)
+    install_index(index)
+    return index
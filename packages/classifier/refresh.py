@@ -0,0 +1,239 @@
+"""Refresh job for the classifier's reference materialized views.
+
+Run it with ``python -m packages.classifier.refresh`` after every reference data
+load (and daily, for ``mv_hs_taric_today``). For each view it:
+
+* compares a watermark of the view's source tables, built from their
+  transactional change counters (migration 014), with the one stored in
+  ``reference_refresh_state`` (migration 013) and skips the view when nothing
+  changed;
+* refreshes it ``CONCURRENTLY`` when it is populated and has the unique index
+  declared in migration 015, so readers are never blocked;
+* records how long the refresh took.
+
+When at least one view was refreshed, a ``NOTIFY`` on :data:`listener.CHANNEL`
+tells running classifier processes to drop their caches straight away.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from . import reference_index, repo
+from .listener import CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Serialises concurrent runs of the job across hosts.
+_LOCK_KEY = "classifier_reference_refresh"
+
+
+@dataclass(frozen=True)
+class ReferenceView:
+    name: str
+    sources: tuple[str, ...]
+    # Views filtered on CURRENT_DATE go stale at midnight even without writes.
+    daily: bool = False
+
+
+REFERENCE_VIEWS = (
+    ReferenceView("mv_hs_taric_today", ("taric_nomenclature",), daily=True),
+    ReferenceView("mv_taric_nomenclature_ranges", ("taric_nomenclature",)),
+    ReferenceView("mv_taric_measure_ranges", ("taric_measures",)),
+    ReferenceView("mv_cbam_default_ranges", ("cbam_default_emissions",)),
+)
+
+
+@dataclass(frozen=True)
+class RefreshResult:
+    view: str
+    refreshed: bool
+    concurrently: bool
+    duration: float
+    watermark: str
+
+
+def source_watermark(conn: Connection, view: ReferenceView) -> str:
+    """Stamp that changes whenever a write to a source table of ``view`` commits."""
+
+    versions = reference_index.source_versions(conn, view.sources)
+    parts = [f"{table}:{version}" for table, version in versions.items()]
+    if view.daily:
+        today = repo._fetchall(conn, "SELECT CURRENT_DATE AS today")[0]["today"]
+        parts.append(f"today:{today}")
+    return hashlib.sha1(";".join(parts).encode()).hexdigest()[:16]
+
+
+def _stored_watermark(conn: Connection, view: ReferenceView) -> str | None:
+    rows = repo._fetchall(
+        conn,
+        "SELECT watermark FROM reference_refresh_state WHERE view_name = :view_name",
+        view_name=view.name,
+    )
+    return rows[0]["watermark"] if rows else None
+
+
+def _is_populated(conn: Connection, view: ReferenceView) -> bool:
+    rows = repo._fetchall(
+        conn,
+        "SELECT ispopulated FROM pg_matviews WHERE matviewname = :view_name",
+        view_name=view.name,
+    )
+    return bool(rows and rows[0]["ispopulated"])
+
+
+def _has_unique_index(conn: Connection, view: ReferenceView) -> bool:
+    rows = repo._fetchall(
+        conn,
+        """
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            WHERE i.indrelid = to_regclass(:view_name)
+              AND i.indisunique
+              AND i.indpred IS NULL
+              AND i.indexprs IS NULL
+        ) AS present
+        """,
+        view_name=view.name,
+    )
+    return bool(rows and rows[0]["present"])
+
+
+def refresh_view(conn: Connection, view: ReferenceView, *, force: bool = False) -> RefreshResult:
+    """Refresh one view unless its sources are unchanged, and commit."""
+
+    watermark = source_watermark(conn, view)
+    if not force and _stored_watermark(conn, view) == watermark:
+        conn.commit()
+        return RefreshResult(view.name, False, False, 0.0, watermark)
+
+    # CONCURRENTLY needs a populated view with a plain unique index; the first
+    # refresh of an empty one (created WITH NO DATA) has to take the exclusive lock.
+    concurrently = _is_populated(conn, view)
+    if concurrently and not _has_unique_index(conn, view):
+        logger.warning(
+            "%s has no unique index (migration 015); refreshing without CONCURRENTLY", view.name
+        )
+        concurrently = False
+    started = time.perf_counter()
+    conn.exec_driver_sql(
+        f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view.name}"
+    )
+    duration = time.perf_counter() - started
+    conn.execute(
+        text(
+            """
+            INSERT INTO reference_refresh_state (view_name, watermark, refreshed_at, duration_ms)
+            VALUES (:view_name, :watermark, now(), :duration_ms)
+            ON CONFLICT (view_name) DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                refreshed_at = EXCLUDED.refreshed_at,
+                duration_ms = EXCLUDED.duration_ms
+            """
+        ),
+        {"view_name": view.name, "watermark": watermark, "duration_ms": round(duration * 1000)},
+    )
+    conn.commit()
+    return RefreshResult(view.name, True, concurrently, duration, watermark)
+
+
+def notify_reference_change(conn: Connection, views: Iterable[str]) -> None:
+    """Announce refreshed views to listening classifier processes and commit."""
+
+    payload = json.dumps({"views": list(views), "version": reference_index.reference_version(conn)})
+    conn.execute(
+        text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload}
+    )
+    conn.commit()
+
+
+def refresh_reference_views(
+    conn: Connection,
+    *,
+    force: bool = False,
+    views: Iterable[str] | None = None,
+) -> list[RefreshResult]:
+    """Refresh the reference views (all, or those named in ``views``) in order.
+
+    Returns an empty list without doing anything when another run holds the job
+    lock.
+    """
+
+    selected = [view for view in REFERENCE_VIEWS if views is None or view.name in set(views)]
+    locked = conn.execute(
+        text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": _LOCK_KEY}
+    ).scalar_one()
+    conn.commit()
+    if not locked:
+        logger.warning("Another reference refresh is running; skipping")
+        return []
+
+    results = []
+    try:
+        for view in selected:
+            try:
+                result = refresh_view(conn, view, force=force)
+            except BaseException:
+                conn.rollback()
+                raise
+            results.append(result)
+            if result.refreshed:
+                logger.info(
+                    "Refreshed %s%s in %.3fs",
+                    view.name,
+                    " concurrently" if result.concurrently else "",
+                    result.duration,
+                )
+            else:
+                logger.info("Skipped %s: sources unchanged since the last refresh", view.name)
+        refreshed = [result.view for result in results if result.refreshed]
+        if refreshed:
+            notify_reference_change(conn, refreshed)
+    finally:
+        conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": _LOCK_KEY})
+        conn.commit()
+    return results
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="refresh even when the sources look unchanged"
+    )
+    parser.add_argument(
+        "--view",
+        action="append",
+        choices=[view.name for view in REFERENCE_VIEWS],
+        help="refresh only this view (repeatable)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    with repo.get_connection() as conn:
+        results = refresh_reference_views(conn, force=args.force, views=args.view)
+    refreshed = [result for result in results if result.refreshed]
+    logger.info(
+        "Done: %d of %d views refreshed in %.3fs",
+        len(refreshed),
+        len(results),
+        sum(result.duration for result in refreshed),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,21 +2,31 @@
 
 from __future__ import annotations
 
+import functools
+import io
+import itertools
+import logging
 import os
-from collections.abc import Iterator, Sequence
-from contextlib import contextmanager
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import closing, contextmanager, nullcontext
 from dataclasses import dataclass
 from datetime import date
-from functools import lru_cache
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Connection, Engine, Result
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
 
+from . import pool, queries, reference_index, text_index, tracing
+from .cache import CacheStats, IntervalCache
 from .rules import RulingCandidate
-from .types import ClassificationResult
+from .types import Classification, ClassificationResult
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class TaricRecord:
     taric_code: str
     hs_code8: str
@@ -25,7 +35,7 @@ class TaricRecord:
     description: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class MeasureRecord:
     taric_code: str
     country_code: str | None
@@ -33,7 +43,7 @@ class MeasureRecord:
     valid_to: date | None
 
 
-@dataclass
+@dataclass(slots=True)
 class RulingRow:
     id: str
     hs_code8: str
@@ -44,7 +54,7 @@ class RulingRow:
     source: str | None
 
 
-@dataclass
+@dataclass(slots=True)
 class EmissionDefault:
     hs_code8: str
     country_code: str | None
@@ -55,37 +65,257 @@ class EmissionDefault:
 
 
 _ENGINE: Engine | None = None
+_READ_ENGINE: Engine | None = None
+# Process that created the engines; pooled connections must not cross a fork.
+_ENGINE_PID: int | None = None
+_POOL_METRICS = pool.PoolMetrics()
+_READ_POOL_METRICS = pool.PoolMetrics()
 
 
-def _create_engine() -> Engine:
-    dsn = os.getenv("DATABASE_URL")
+def _create_engine(dsn: str | None = None, metrics: pool.PoolMetrics = _POOL_METRICS) -> Engine:
+    dsn = dsn or os.getenv("DATABASE_URL")
     if not dsn:
         raise RuntimeError("DATABASE_URL environment variable must be set")
-    return create_engine(dsn, pool_pre_ping=True, future=True)
+    settings = pool.PoolSettings.from_env()
+    engine = create_engine(dsn, future=True, **settings.engine_kwargs())
+    event.listen(engine, "connect", queries.forget_prepared)
+    event.listen(engine, "before_cursor_execute", tracing.record_query)
+    pool.instrument(engine, metrics, settings)
+    return engine
+
+
+def _check_fork() -> None:
+    global _ENGINE_PID
+    if _ENGINE_PID != os.getpid():
+        _forget_engine_after_fork()
+        _ENGINE_PID = os.getpid()
 
 
 def get_engine() -> Engine:
+    """Return this process's primary engine, creating a fresh one after a fork."""
+
     global _ENGINE
+    _check_fork()
     if _ENGINE is None:
         _ENGINE = _create_engine()
     return _ENGINE
 
 
+def get_read_engine() -> Engine | None:
+    """Return this process's replica engine, or ``None`` without ``DATABASE_READ_URL``."""
+
+    global _READ_ENGINE
+    dsn = os.getenv("DATABASE_READ_URL")
+    if not dsn:
+        return None
+    _check_fork()
+    if _READ_ENGINE is None:
+        _READ_ENGINE = _create_engine(dsn, _READ_POOL_METRICS)
+    return _READ_ENGINE
+
+
+def _forget_engine_after_fork() -> None:
+    # ``close=False`` leaves the parent's sockets alone; the child only drops
+    # its references and opens its own connections.
+    global _ENGINE, _READ_ENGINE, _ENGINE_PID, _replica_state
+    for engine in (_ENGINE, _READ_ENGINE):
+        if engine is not None:
+            engine.dispose(close=False)
+    _ENGINE = _READ_ENGINE = None
+    _ENGINE_PID = None
+    _replica_state = None
+    _POOL_METRICS.reset()
+    _READ_POOL_METRICS.reset()
+
+
+os.register_at_fork(after_in_child=_forget_engine_after_fork)
+
+
 @contextmanager
 def get_connection() -> Iterator[Connection]:
-    conn = get_engine().connect()
+    with _POOL_METRICS.timed_checkout():
+        conn = get_engine().connect()
     try:
         yield conn
     finally:
         conn.close()
 
 
+REPLICA_MAX_LAG = float(os.getenv("CLASSIFIER_REPLICA_MAX_LAG") or 10)
+_REPLICA_CHECK_INTERVAL = float(os.getenv("CLASSIFIER_REPLICA_CHECK_INTERVAL") or 5)
+# (expires_at, usable) of the last replica lag probe.
+_replica_state: tuple[float, bool] | None = None
+_READ_ROUTES: Counter[str] = Counter()
+
+# A standby that has replayed everything it received is current even when the
+# primary has been idle for a while and the last replayed commit is old.
+_REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+END AS lag_seconds
+"""
+
+
+def _cached_replica_usable() -> bool | None:
+    """Outcome of the last replica lag probe, or ``None`` once it is due again."""
+
+    if _replica_state is not None and _replica_state[0] > time.monotonic():
+        return _replica_state[1]
+    return None
+
+
+def _record_replica_lag(lag: float) -> bool:
+    """Store a probed lag for ``CLASSIFIER_REPLICA_CHECK_INTERVAL`` seconds."""
+
+    global _replica_state
+    usable = lag <= REPLICA_MAX_LAG
+    if not usable and (_replica_state is None or _replica_state[1]):
+        logger.warning(
+            "Replica lags %.1fs (limit %.1fs); reading from the primary", lag, REPLICA_MAX_LAG
+        )
+    _replica_state = (time.monotonic() + _REPLICA_CHECK_INTERVAL, usable)
+    return usable
+
+
+def _replica_connection() -> Connection | None:
+    engine = get_read_engine()
+    if engine is None or _cached_replica_usable() is False:
+        return None
+    try:
+        with _READ_POOL_METRICS.timed_checkout():
+            conn = engine.connect()
+    except Exception:
+        logger.warning("Replica unavailable; reading from the primary", exc_info=True)
+        _record_replica_lag(float("inf"))
+        return None
+    usable = _cached_replica_usable()
+    if usable is None:
+        try:
+            lag = float(_fetchall(conn, _REPLICA_LAG_SQL)[0]["lag_seconds"])
+            conn.rollback()
+        except Exception:
+            logger.warning("Replica lag probe failed", exc_info=True)
+            lag = float("inf")
+        usable = _record_replica_lag(lag)
+    if usable:
+        return conn
+    conn.close()
+    return None
+
+
+@contextmanager
+def get_read_connection(primary: Connection | None = None) -> Iterator[Connection]:
+    """Connection for reference-data reads, on a replica when one is usable.
+
+    Lookups of rulings, TARIC data and CBAM defaults go to ``DATABASE_READ_URL``
+    while its replay lag stays within ``CLASSIFIER_REPLICA_MAX_LAG`` seconds.
+    Otherwise, and when no replica is configured, they run on ``primary`` (or on
+    a new primary connection). Shipment snapshots and all writes must stay on the
+    primary so callers read their own writes.
+    """
+
+    replica = _replica_connection()
+    if replica is not None:
+        _READ_ROUTES["replica"] += 1
+        try:
+            yield replica
+        finally:
+            replica.close()
+        return
+    _READ_ROUTES["primary"] += 1
+    with nullcontext(primary) if primary is not None else get_connection() as conn:
+        yield conn
+
+
+def read_routing_stats() -> dict[str, int]:
+    """How many :func:`get_read_connection` checkouts went to the replica and primary."""
+
+    return {"replica": _READ_ROUTES["replica"], "primary": _READ_ROUTES["primary"]}
+
+
+# Ad-hoc statements are compiled once per distinct SQL string.
+_text = functools.lru_cache(maxsize=512)(text)
+
+
 def _fetchall(conn: Connection, statement: str, **params) -> Sequence[dict]:
-    with closing(conn.execute(text(statement), params)) as result:
+    with closing(conn.execute(_text(statement), params)) as result:
         rows = [dict(row._mapping) for row in result]
     return rows
 
 
+def _ruling_from_columns(
+    id: str,
+    hs_code8: str,
+    taric_code: str | None,
+    precedence: int,
+    valid_from: date | None,
+    valid_to: date | None,
+    source: str | None,
+) -> RulingCandidate:
+    return RulingCandidate(
+        id=id,
+        hs_code8=hs_code8,
+        taric_code=taric_code,
+        precedence=precedence,
+        valid_from=valid_from.isoformat() if valid_from else None,
+        valid_to=valid_to.isoformat() if valid_to else None,
+        source=source,
+    )
+
+
+def _ruling_candidate(row: dict) -> RulingCandidate:
+    return _ruling_from_columns(
+        row["id"],
+        row["hs_code8"],
+        row.get("taric_code"),
+        row["precedence"],
+        row["valid_from"],
+        row["valid_to"],
+        row.get("source"),
+    )
+
+
+_RULINGS_BY_TARIC_SQL = """
+    SELECT id::text, hs_code8, taric_code, precedence, valid_from, valid_to, source
+    FROM bti_rulings
+    WHERE status = 'ACTIVE'
+      AND taric_code = :taric_code
+      AND (:country IS NULL OR country_scope IS NULL OR country_scope = :country)
+      AND is_valid_on(valid_from, valid_to, :ref_date)
+    ORDER BY precedence ASC, valid_from DESC
+    LIMIT 10
+"""
+
+
+_RULINGS_BY_HS_SQL = """
+    SELECT id::text, hs_code8, taric_code, precedence, valid_from, valid_to, source
+    FROM bti_rulings
+    WHERE status = 'ACTIVE'
+      AND hs_code8 = :hs_code8
+      AND (:country IS NULL OR country_scope IS NULL OR country_scope = :country)
+      AND is_valid_on(valid_from, valid_to, :ref_date)
+    ORDER BY precedence ASC, valid_from DESC
+    LIMIT 10
+"""
+
+_RULINGS_BY_TARIC = queries.register(
+    "rulings_by_taric",
+    _RULINGS_BY_TARIC_SQL,
+    taric_code="varchar",
+    country="varchar",
+    ref_date="date",
+)
+_RULINGS_BY_HS = queries.register(
+    "rulings_by_hs",
+    _RULINGS_BY_HS_SQL,
+    hs_code8="varchar",
+    country="varchar",
+    ref_date="date",
+)
+
+
 def get_applicable_rulings(
     conn: Connection,
     hs_code8: str,
@@ -95,187 +325,852 @@ def get_applicable_rulings(
 ) -> list[RulingCandidate]:
     """Fetch applicable rulings sorted by precedence."""
 
+    index = reference_index.active_index()
+    if index is not None:
+        return index.get_applicable_rulings(hs_code8, taric_code, country, ref_date)
+
     params = {
         "hs_code8": hs_code8,
         "taric_code": taric_code,
         "country": country,
         "ref_date": ref_date,
     }
-    candidates: list[RulingCandidate] = []
     if taric_code:
-        rows = _fetchall(
-            conn,
-            """
-            SELECT id::text, hs_code8, taric_code, precedence, valid_from, valid_to, source
-            FROM bti_rulings
-            WHERE status = 'ACTIVE'
-              AND taric_code = :taric_code
-              AND (:country IS NULL OR country_scope IS NULL OR country_scope = :country)
-              AND is_valid_on(valid_from, valid_to, :ref_date)
-            ORDER BY precedence ASC, valid_from DESC
-            LIMIT 10
-            """,
-            **params,
-        )
-        candidates.extend(
-            RulingCandidate(
-                id=row["id"],
-                hs_code8=row["hs_code8"],
-                taric_code=row["taric_code"],
-                precedence=row["precedence"],
-                valid_from=(
-                    row["valid_from"].isoformat() if row["valid_from"] else None
-                ),
-                valid_to=(row["valid_to"].isoformat() if row["valid_to"] else None),
-                source=row.get("source"),
-            )
-            for row in rows
-        )
+        candidates = queries.fetch(conn, _RULINGS_BY_TARIC, _ruling_from_columns, **params)
         if candidates:
             return candidates
 
+    return queries.fetch(conn, _RULINGS_BY_HS, _ruling_from_columns, **params)
+
+
+def get_applicable_rulings_many(
+    conn: Connection,
+    keys: Iterable[tuple[str, str | None, str, date]],
+) -> dict[tuple[str, str | None, str, date], list[RulingCandidate]]:
+    """Bulk variant of :func:`get_applicable_rulings`.
+
+    ``keys`` are ``(hs_code8, taric_code, country, ref_date)`` tuples. Both the
+    TARIC-level and HS-level candidates are fetched in a single round-trip and the
+    TARIC-level ones win whenever present, mirroring the per-item fallback.
+    """
+
+    index = reference_index.active_index()
+    if index is not None:
+        return {key: index.get_applicable_rulings(*key) for key in keys}
+
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
     rows = _fetchall(
         conn,
         """
-        SELECT id::text, hs_code8, taric_code, precedence, valid_from, valid_to, source
-        FROM bti_rulings
-        WHERE status = 'ACTIVE'
-          AND hs_code8 = :hs_code8
-          AND (:country IS NULL OR country_scope IS NULL OR country_scope = :country)
-          AND is_valid_on(valid_from, valid_to, :ref_date)
-        ORDER BY precedence ASC, valid_from DESC
-        LIMIT 10
+        SELECT k.ord, 0 AS match_level, r.*
+        FROM unnest(
+            CAST(:hs_codes AS varchar[]),
+            CAST(:taric_codes AS varchar[]),
+            CAST(:countries AS varchar[]),
+            CAST(:ref_dates AS date[])
+        ) WITH ORDINALITY AS k(hs_code8, taric_code, country, ref_date, ord)
+        CROSS JOIN LATERAL (
+            SELECT id::text AS id, hs_code8, taric_code, precedence, valid_from, valid_to, source
+            FROM bti_rulings
+            WHERE status = 'ACTIVE'
+              AND taric_code = k.taric_code
+              AND (k.country IS NULL OR country_scope IS NULL OR country_scope = k.country)
+              AND is_valid_on(valid_from, valid_to, k.ref_date)
+            ORDER BY precedence ASC, valid_from DESC
+            LIMIT 10
+        ) r
+        UNION ALL
+        SELECT k.ord, 1 AS match_level, r.*
+        FROM unnest(
+            CAST(:hs_codes AS varchar[]),
+            CAST(:countries AS varchar[]),
+            CAST(:ref_dates AS date[])
+        ) WITH ORDINALITY AS k(hs_code8, country, ref_date, ord)
+        CROSS JOIN LATERAL (
+            SELECT id::text AS id, hs_code8, taric_code, precedence, valid_from, valid_to, source
+            FROM bti_rulings
+            WHERE status = 'ACTIVE'
+              AND hs_code8 = k.hs_code8
+              AND (k.country IS NULL OR country_scope IS NULL OR country_scope = k.country)
+              AND is_valid_on(valid_from, valid_to, k.ref_date)
+            ORDER BY precedence ASC, valid_from DESC
+            LIMIT 10
+        ) r
+        ORDER BY ord, match_level, precedence ASC, valid_from DESC
         """,
-        **params,
+        hs_codes=[key[0] for key in unique_keys],
+        taric_codes=[key[1] for key in unique_keys],
+        countries=[key[2] for key in unique_keys],
+        ref_dates=[key[3] for key in unique_keys],
     )
-    candidates.extend(
-        RulingCandidate(
-            id=row["id"],
-            hs_code8=row["hs_code8"],
-            taric_code=row.get("taric_code"),
-            precedence=row["precedence"],
-            valid_from=(row["valid_from"].isoformat() if row["valid_from"] else None),
-            valid_to=(row["valid_to"].isoformat() if row["valid_to"] else None),
-            source=row.get("source"),
-        )
-        for row in rows
-    )
-    return candidates
+    by_level: dict[tuple[int, int], list[RulingCandidate]] = {}
+    for row in rows:
+        by_level.setdefault((row["ord"], row["match_level"]), []).append(_ruling_candidate(row))
+    return {
+        key: by_level.get((ord_, 0)) or by_level.get((ord_, 1), [])
+        for ord_, key in enumerate(unique_keys, start=1)
+    }
+
+
+_TARIC_VALIDITY_SQL = """
+    SELECT valid_from, valid_to
+    FROM v_taric_nomenclature
+    WHERE taric_code = :taric_code
+    ORDER BY valid_from DESC
+    LIMIT 1
+"""
+_TARIC_VALIDITY = queries.register("taric_validity", _TARIC_VALIDITY_SQL, taric_code="varchar")
 
 
 def taric_validity(conn: Connection, taric_code: str) -> tuple[date | None, date | None]:
-    rows = _fetchall(
-        conn,
-        """
-        SELECT valid_from, valid_to
-        FROM v_taric_nomenclature
-        WHERE taric_code = :taric_code
-        ORDER BY valid_from DESC
-        LIMIT 1
-        """,
-        taric_code=taric_code,
-    )
+    index = reference_index.active_index()
+    if index is not None:
+        return index.taric_validity(taric_code)
+
+    rows = queries.fetch_rows(conn, _TARIC_VALIDITY, taric_code=taric_code)
     if not rows:
         return None, None
-    row = rows[0]
-    return row.get("valid_from"), row.get("valid_to")
+    valid_from, valid_to = rows[0]
+    return valid_from, valid_to
 
 
-def _taric_candidates(conn: Connection, hs_code8: str, ref_date: date) -> list[TaricRecord]:
+def taric_validity_many(
+    conn: Connection, taric_codes: Iterable[str]
+) -> dict[str, tuple[date | None, date | None]]:
+    """Bulk variant of :func:`taric_validity` keyed by TARIC code."""
+
+    index = reference_index.active_index()
+    if index is not None:
+        return {code: index.taric_validity(code) for code in taric_codes}
+
+    codes = list(dict.fromkeys(taric_codes))
+    if not codes:
+        return {}
     rows = _fetchall(
         conn,
         """
-        SELECT taric_code, hs_code8, valid_from, valid_to, description
+        SELECT DISTINCT ON (taric_code) taric_code, valid_from, valid_to
         FROM v_taric_nomenclature
-        WHERE hs_code8 = :hs_code8
-          AND is_valid_on(valid_from, valid_to, :ref_date)
-        ORDER BY length(taric_code) DESC
+        WHERE taric_code = ANY(CAST(:taric_codes AS varchar[]))
+        ORDER BY taric_code, valid_from DESC
         """,
-        hs_code8=hs_code8,
-        ref_date=ref_date,
+        taric_codes=codes,
     )
-    return [
-        TaricRecord(
-            taric_code=row["taric_code"],
-            hs_code8=row["hs_code8"],
-            valid_from=row.get("valid_from"),
-            valid_to=row.get("valid_to"),
-            description=row.get("description"),
-        )
-        for row in rows
-    ]
+    found = {row["taric_code"]: (row.get("valid_from"), row.get("valid_to")) for row in rows}
+    return {code: found.get(code, (None, None)) for code in codes}
+
+
+def _taric_record(row: dict) -> TaricRecord:
+    return TaricRecord(
+        taric_code=row["taric_code"],
+        hs_code8=row["hs_code8"],
+        valid_from=row.get("valid_from"),
+        valid_to=row.get("valid_to"),
+        description=row.get("description"),
+    )
+
+
+_MV_TODAY_ENABLED = os.getenv("CLASSIFIER_MV_TODAY", "1").lower() not in {"0", "false", "no"}
+_MV_TODAY_TTL = float(os.getenv("CLASSIFIER_MV_TODAY_TTL") or 60)
+_mv_today_state: tuple[float, date | None] | None = None
+_LOOKUP_PATHS: Counter[tuple[str, str]] = Counter()
+
+
+def _record_path(lookup: str, path: str, count: int = 1) -> None:
+    if count:
+        _LOOKUP_PATHS[(lookup, path)] += count
+        tracing.record_path(lookup, path, count)
+
+
+def lookup_path_stats() -> dict[str, dict[str, int]]:
+    """Per lookup, how many keys were served by the ``index``, ``mv_today`` or ``view`` path."""
+
+    stats: dict[str, dict[str, int]] = {}
+    for (lookup, path), count in sorted(_LOOKUP_PATHS.items()):
+        stats.setdefault(lookup, {})[path] = count
+    return stats
+
+
+_MV_TODAY_COLUMN_SQL = """
+    SELECT 1
+    FROM pg_attribute
+    WHERE attrelid = to_regclass('mv_hs_taric_today')
+      AND attname = 'as_of'
+      AND NOT attisdropped
+"""
+_MV_TODAY_AS_OF_SQL = "SELECT as_of FROM mv_hs_taric_today LIMIT 1"
+_STALE = object()
+
+
+def _cached_mv_today() -> object:
+    """The remembered ``mv_hs_taric_today`` date, or ``_STALE`` when it must be re-read."""
+
+    if not _MV_TODAY_ENABLED:
+        return None
+    if _mv_today_state is not None and _mv_today_state[0] > time.monotonic():
+        return _mv_today_state[1]
+    return _STALE
+
+
+def _remember_mv_today(as_of: date | None) -> date | None:
+    global _mv_today_state
+    _mv_today_state = (time.monotonic() + _MV_TODAY_TTL, as_of)
+    return as_of
+
+
+def _mv_today(conn: Connection) -> date | None:
+    """Return the date ``mv_hs_taric_today`` was refreshed for, cached briefly.
+
+    ``None`` disables the fast path: the feature is switched off, migration 010 has
+    not been applied yet, or the view is empty.
+    """
+
+    cached = _cached_mv_today()
+    if cached is not _STALE:
+        return cached
+    as_of = None
+    if _fetchall(conn, _MV_TODAY_COLUMN_SQL):
+        rows = _fetchall(conn, _MV_TODAY_AS_OF_SQL)
+        as_of = rows[0]["as_of"] if rows else None
+    return _remember_mv_today(as_of)
+
+
+def _split_by_mv_today(conn: Connection, keys: list[tuple], date_pos: int) -> tuple[list, list]:
+    """Partition keys into those served by ``mv_hs_taric_today`` and the rest."""
+
+    today = _mv_today(conn)
+    if today is None:
+        return [], keys
+    current = [key for key in keys if key[date_pos] == today]
+    historical = [key for key in keys if key[date_pos] != today]
+    return current, historical
+
+
+def _nomenclature_source(today: bool, ref_date: str) -> tuple[str, str]:
+    """``FROM`` target and validity filter for TARIC rows, aliased ``t``."""
+
+    if today:
+        return "mv_hs_taric_today t", ""
+    return "mv_taric_nomenclature_ranges t", f"AND t.validity @> {ref_date}"
+
+
+_TARIC_CANDIDATES_SQL = """
+    SELECT taric_code, hs_code8, valid_from, valid_to, description
+    FROM mv_taric_nomenclature_ranges
+    WHERE hs_code8 = :hs_code8
+      AND validity @> CAST(:ref_date AS date)
+    ORDER BY length(taric_code) DESC, taric_code
+"""
+
+
+_TARIC_CANDIDATES_TODAY_SQL = """
+    SELECT taric_code, hs_code8, valid_from, valid_to, description
+    FROM mv_hs_taric_today
+    WHERE hs_code8 = :hs_code8
+    ORDER BY length(taric_code) DESC, taric_code
+"""
+
+_TARIC_CANDIDATES = queries.register(
+    "taric_candidates", _TARIC_CANDIDATES_SQL, hs_code8="varchar", ref_date="date"
+)
+_TARIC_CANDIDATES_TODAY = queries.register(
+    "taric_candidates_today", _TARIC_CANDIDATES_TODAY_SQL, hs_code8="varchar"
+)
+
+
+def _taric_candidates(conn: Connection, hs_code8: str, ref_date: date) -> list[TaricRecord]:
+    if ref_date == _mv_today(conn):
+        _record_path("taric_candidates", "mv_today")
+        return queries.fetch(conn, _TARIC_CANDIDATES_TODAY, TaricRecord, hs_code8=hs_code8)
+    _record_path("taric_candidates", "view")
+    return queries.fetch(conn, _TARIC_CANDIDATES, TaricRecord, hs_code8=hs_code8, ref_date=ref_date)
 
 
 def taric_candidates(conn: Connection, hs_code8: str, ref_date: date) -> list[TaricRecord]:
     """Public wrapper around the TARIC candidate query."""
 
+    index = reference_index.active_index()
+    if index is not None:
+        _record_path("taric_candidates", "index")
+        return index.taric_candidates(hs_code8, ref_date)
+
     return _taric_candidates(conn, hs_code8, ref_date)
 
 
+def taric_candidates_many(
+    conn: Connection, keys: Iterable[tuple[str, date]]
+) -> dict[tuple[str, date], list[TaricRecord]]:
+    """Fetch TARIC candidates for many ``(hs_code8, ref_date)`` pairs at once.
+
+    Each list keeps the longest-code-first ordering of :func:`taric_candidates`.
+    """
+
+    index = reference_index.active_index()
+    if index is not None:
+        keys = list(keys)
+        _record_path("taric_candidates", "index", len(keys))
+        return {key: index.taric_candidates(*key) for key in keys}
+
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
+    current, historical = _split_by_mv_today(conn, unique_keys, 1)
+    _record_path("taric_candidates", "mv_today", len(current))
+    _record_path("taric_candidates", "view", len(historical))
+    grouped: dict[tuple[str, date], list[TaricRecord]] = {key: [] for key in unique_keys}
+    for today, subset in ((True, current), (False, historical)):
+        if not subset:
+            continue
+        source, valid = _nomenclature_source(today, "k.ref_date")
+        rows = _fetchall(
+            conn,
+            f"""
+            SELECT k.ord, t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description
+            FROM unnest(CAST(:hs_codes AS varchar[]), CAST(:ref_dates AS date[]))
+                WITH ORDINALITY AS k(hs_code8, ref_date, ord)
+            JOIN {source}
+              ON t.hs_code8 = k.hs_code8
+             {valid}
+            ORDER BY k.ord, length(t.taric_code) DESC, t.taric_code
+            """,
+            hs_codes=[key[0] for key in subset],
+            ref_dates=[key[1] for key in subset],
+        )
+        for row in rows:
+            grouped[subset[row["ord"] - 1]].append(_taric_record(row))
+    return grouped
+
+
+_MEASURE_MATCHES = queries.register(
+    "measure_matches",
+    """
+    SELECT 1
+    FROM mv_taric_measure_ranges
+    WHERE taric_code = :taric_code
+      AND (country_code IS NULL OR country_code = :country)
+      AND validity @> CAST(:ref_date AS date)
+    LIMIT 1
+    """,
+    taric_code="varchar",
+    country="varchar",
+    ref_date="date",
+)
+
+
 def _measure_matches(conn: Connection, taric_code: str, country: str, ref_date: date) -> bool:
+    rows = queries.fetch_rows(
+        conn, _MEASURE_MATCHES, taric_code=taric_code, country=country, ref_date=ref_date
+    )
+    return bool(rows)
+
+
+def measure_matches(conn: Connection, taric_code: str, country: str, ref_date: date) -> bool:
+    """Expose whether a TARIC code has a valid measure for the country/date."""
+
+    index = reference_index.active_index()
+    if index is not None:
+        return index.measure_matches(taric_code, country, ref_date)
+
+    return _measure_matches(conn, taric_code, country, ref_date)
+
+
+_PICK_TARIC_SQL = """
+    SELECT t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description
+    FROM mv_taric_nomenclature_ranges t
+    WHERE t.hs_code8 = :hs_code8
+      AND t.validity @> CAST(:ref_date AS date)
+    ORDER BY EXISTS (
+            SELECT 1
+            FROM mv_taric_measure_ranges m
+            WHERE m.taric_code = t.taric_code
+              AND (m.country_code IS NULL OR m.country_code = :country)
+              AND m.validity @> CAST(:ref_date AS date)
+        ) DESC,
+        length(t.taric_code) DESC,
+        t.taric_code
+    LIMIT 1
+"""
+
+_PICK_TARIC_TODAY_SQL = """
+    SELECT t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description
+    FROM mv_hs_taric_today t
+    WHERE t.hs_code8 = :hs_code8
+    ORDER BY EXISTS (
+            SELECT 1
+            FROM mv_taric_measure_ranges m
+            WHERE m.taric_code = t.taric_code
+              AND (m.country_code IS NULL OR m.country_code = :country)
+              AND m.validity @> CAST(:ref_date AS date)
+        ) DESC,
+        length(t.taric_code) DESC,
+        t.taric_code
+    LIMIT 1
+"""
+
+_PICK_TARIC = queries.register(
+    "pick_taric", _PICK_TARIC_SQL, hs_code8="varchar", country="varchar", ref_date="date"
+)
+_PICK_TARIC_TODAY = queries.register(
+    "pick_taric_today",
+    _PICK_TARIC_TODAY_SQL,
+    hs_code8="varchar",
+    country="varchar",
+    ref_date="date",
+)
+
+
+def pick_most_specific_taric(
+    conn: Connection, hs_code8: str, country: str, ref_date: date
+) -> TaricRecord | None:
+    """Return the longest TARIC code with a valid measure, else the longest code.
+
+    Both the candidate lookup and the measure probe run as one query, so headings
+    with many subdivisions cost a single round-trip.
+    """
+
+    index = reference_index.active_index()
+    if index is not None:
+        _record_path("pick_most_specific_taric", "index")
+        return index.pick_most_specific_taric(hs_code8, country, ref_date)
+
+    today = ref_date == _mv_today(conn)
+    _record_path("pick_most_specific_taric", "mv_today" if today else "view")
+    records = queries.fetch(
+        conn,
+        _PICK_TARIC_TODAY if today else _PICK_TARIC,
+        TaricRecord,
+        hs_code8=hs_code8,
+        country=country,
+        ref_date=ref_date,
+    )
+    return records[0] if records else None
+
+
+def measure_matches_many(
+    conn: Connection, keys: Iterable[tuple[str, str, date]]
+) -> set[tuple[str, str, date]]:
+    """Return the ``(taric_code, country, ref_date)`` keys that have a valid measure."""
+
+    index = reference_index.active_index()
+    if index is not None:
+        return {key for key in keys if index.measure_matches(*key)}
+
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return set()
     rows = _fetchall(
         conn,
         """
-        SELECT 1
-        FROM v_taric_measures
-        WHERE taric_code = :taric_code
-          AND (country_code IS NULL OR country_code = :country)
-          AND is_valid_on(valid_from, valid_to, :ref_date)
-        LIMIT 1
+        SELECT k.ord
+        FROM unnest(
+            CAST(:taric_codes AS varchar[]),
+            CAST(:countries AS varchar[]),
+            CAST(:ref_dates AS date[])
+        ) WITH ORDINALITY AS k(taric_code, country, ref_date, ord)
+        WHERE EXISTS (
+            SELECT 1
+            FROM mv_taric_measure_ranges m
+            WHERE m.taric_code = k.taric_code
+              AND (m.country_code IS NULL OR m.country_code = k.country)
+              AND m.validity @> k.ref_date
+        )
         """,
-        taric_code=taric_code,
+        taric_codes=[key[0] for key in unique_keys],
+        countries=[key[1] for key in unique_keys],
+        ref_dates=[key[2] for key in unique_keys],
+    )
+    return {unique_keys[row["ord"] - 1] for row in rows}
+
+
+def pick_most_specific_taric_many(
+    conn: Connection, keys: Iterable[tuple[str, str, date]]
+) -> dict[tuple[str, str, date], TaricRecord | None]:
+    """Bulk variant of :func:`pick_most_specific_taric`.
+
+    ``keys`` are ``(hs_code8, country, ref_date)`` tuples; the whole set is resolved
+    with one query regardless of how many keys or candidates are involved.
+    """
+
+    index = reference_index.active_index()
+    if index is not None:
+        keys = list(keys)
+        _record_path("pick_most_specific_taric", "index", len(keys))
+        return {key: index.pick_most_specific_taric(*key) for key in keys}
+
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
+    current, historical = _split_by_mv_today(conn, unique_keys, 2)
+    _record_path("pick_most_specific_taric", "mv_today", len(current))
+    _record_path("pick_most_specific_taric", "view", len(historical))
+    picked: dict[tuple[str, str, date], TaricRecord | None] = dict.fromkeys(unique_keys)
+    for today, subset in ((True, current), (False, historical)):
+        if not subset:
+            continue
+        source, valid = _nomenclature_source(today, "k.ref_date")
+        rows = _fetchall(
+            conn,
+            f"""
+            SELECT DISTINCT ON (k.ord)
+                k.ord, t.taric_code, t.hs_code8, t.valid_from, t.valid_to, t.description
+            FROM unnest(
+                CAST(:hs_codes AS varchar[]),
+                CAST(:countries AS varchar[]),
+                CAST(:ref_dates AS date[])
+            ) WITH ORDINALITY AS k(hs_code8, country, ref_date, ord)
+            JOIN {source}
+              ON t.hs_code8 = k.hs_code8
+             {valid}
+            ORDER BY k.ord,
+                EXISTS (
+                    SELECT 1
+                    FROM mv_taric_measure_ranges m
+                    WHERE m.taric_code = t.taric_code
+                      AND (m.country_code IS NULL OR m.country_code = k.country)
+                      AND m.validity @> k.ref_date
+                ) DESC,
+                length(t.taric_code) DESC,
+                t.taric_code
+            """,
+            hs_codes=[key[0] for key in subset],
+            countries=[key[1] for key in subset],
+            ref_dates=[key[2] for key in subset],
+        )
+        for row in rows:
+            picked[subset[row["ord"] - 1]] = _taric_record(row)
+    return picked
+
+
+_STABLE_INTERVAL = queries.register(
+    "stable_interval",
+    """
+    WITH tarics AS (
+        SELECT taric_code, validity
+        FROM mv_taric_nomenclature_ranges
+        WHERE hs_code8 = :hs_code8
+    ),
+    measures AS (
+        SELECT m.validity
+        FROM mv_taric_measure_ranges m
+        WHERE m.taric_code IN (SELECT taric_code FROM tarics)
+          AND (m.country_code IS NULL OR m.country_code = :country)
+    ),
+    boundaries AS (
+        SELECT lower(validity) AS boundary FROM tarics
+        UNION ALL SELECT upper(validity) FROM tarics
+        UNION ALL SELECT lower(validity) FROM measures
+        UNION ALL SELECT upper(validity) FROM measures
+    )
+    SELECT max(boundary) FILTER (WHERE boundary <= :ref_date) AS lower_bound,
+           min(boundary) FILTER (WHERE boundary > :ref_date) AS upper_bound
+    FROM boundaries
+    """,
+    hs_code8="varchar",
+    country="varchar",
+    ref_date="date",
+)
+
+
+def taric_stable_interval(
+    conn: Connection, hs_code8: str, country: str, ref_date: date
+) -> tuple[date | None, date | None]:
+    """Return ``[start, end)`` around ``ref_date`` over which the TARIC pick is stable.
+
+    The bounds are the nearest dates on which any nomenclature row of the heading,
+    or any measure on one of its codes for the country, starts or stops applying.
+    ``None`` means the interval is open on that side.
+    """
+
+    index = reference_index.active_index()
+    if index is not None:
+        return index.stable_interval(hs_code8, country, ref_date)
+
+    rows = queries.fetch_rows(
+        conn,
+        _STABLE_INTERVAL,
+        hs_code8=hs_code8,
         country=country,
         ref_date=ref_date,
     )
-    return bool(rows)
+    if not rows:
+        return None, None
+    lower_bound, upper_bound = rows[0]
+    return lower_bound, upper_bound
 
 
-def measure_matches(
-    conn: Connection, taric_code: str, country: str, ref_date: date
-) -> bool:
-    """Expose whether a TARIC code has a valid measure for the country/date."""
+# Stamp of the last reference view refresh (migration 013), read at most every
+# CLASSIFIER_REFRESH_STAMP_TTL seconds; it versions the TARIC cache when no
+# reference index is installed.
+_REFRESH_STAMP_TTL = float(os.getenv("CLASSIFIER_REFRESH_STAMP_TTL") or 30)
+_refresh_stamp_state: tuple[float, str | None] | None = None
+_REFRESH_STATE_EXISTS_SQL = "SELECT to_regclass('reference_refresh_state') IS NOT NULL AS present"
+_REFRESH_STAMP_SQL = """
+    SELECT md5(string_agg(view_name || ':' || watermark || ':' || refreshed_at::text, ';'
+                          ORDER BY view_name)) AS stamp
+    FROM reference_refresh_state
+"""
 
-    return _measure_matches(conn, taric_code, country, ref_date)
 
+def _cached_refresh_stamp() -> object:
+    if _refresh_stamp_state is not None and _refresh_stamp_state[0] > time.monotonic():
+        return _refresh_stamp_state[1]
+    return _STALE
 
-def pick_most_specific_taric(
+
+def _remember_refresh_stamp(stamp: str | None) -> str | None:
+    global _refresh_stamp_state
+    _refresh_stamp_state = (time.monotonic() + _REFRESH_STAMP_TTL, stamp)
+    return stamp
+
+
+def _refresh_stamp(conn: Connection) -> str | None:
+    """Fingerprint of ``reference_refresh_state``; changes whenever a view is refreshed."""
+
+    cached = _cached_refresh_stamp()
+    if cached is not _STALE:
+        return cached
+    stamp = None
+    if _fetchall(conn, _REFRESH_STATE_EXISTS_SQL)[0]["present"]:
+        stamp = _fetchall(conn, _REFRESH_STAMP_SQL)[0]["stamp"]
+    return _remember_refresh_stamp(stamp)
+
+
+_NOT_CACHED = object()
+_TARIC_CACHE_SIZE = int(os.getenv("CLASSIFIER_TARIC_CACHE_SIZE", "4096"))
+_TARIC_CACHE = (
+    IntervalCache(
+        maxsize=_TARIC_CACHE_SIZE,
+        ttl=float(os.getenv("CLASSIFIER_TARIC_CACHE_TTL", "900")),
+    )
+    if _TARIC_CACHE_SIZE > 0
+    else None
+)
+
+
+def _index_cache_version() -> str | None:
+    # Picks come from the installed index when there is one, else from the views
+    # and versioned by their refresh stamp.
+    index = reference_index.active_index()
+    return f"index:{index.version}" if index is not None else None
+
+
+def _cached_pick(key: tuple[str, str], ref_date: date, version: str | None) -> object:
+    """Cached TARIC pick for ``key`` on ``ref_date``, or ``_NOT_CACHED``."""
+
+    _TARIC_CACHE.sync_version(version)
+    cached = _TARIC_CACHE.get(key, ref_date, default=_NOT_CACHED)
+    tracing.record_cache("taric", cached is not _NOT_CACHED)
+    return cached
+
+
+def cached_pick_most_specific_taric(
     conn: Connection, hs_code8: str, country: str, ref_date: date
 ) -> TaricRecord | None:
-    candidates = _taric_candidates(conn, hs_code8, ref_date)
-    for candidate in candidates:
-        if _measure_matches(conn, candidate.taric_code, country, ref_date):
-            return candidate
-    return candidates[0] if candidates else None
+    """:func:`pick_most_specific_taric`, memoised over the pick's stable validity interval.
 
+    This is what per-shipment classification uses. Entries expire after
+    ``CLASSIFIER_TARIC_CACHE_TTL`` seconds and are dropped as soon as the installed
+    reference index or the last view refresh changes. ``CLASSIFIER_TARIC_CACHE_SIZE=0``
+    turns the cache off.
+    """
 
-@lru_cache(maxsize=1024)
-def cached_taric_lookup(hs_code8: str, country: str, ref_date: date) -> str | None:
-    with get_connection() as conn:
-        record = pick_most_specific_taric(conn, hs_code8, country, ref_date)
-        return record.taric_code if record else None
+    if _TARIC_CACHE is None:
+        return pick_most_specific_taric(conn, hs_code8, country, ref_date)
+    version = _index_cache_version() or _refresh_stamp(conn)
+    key = (hs_code8, country)
+    cached = _cached_pick(key, ref_date, version)
+    if cached is not _NOT_CACHED:
+        return cached
 
+    record = pick_most_specific_taric(conn, hs_code8, country, ref_date)
+    valid_from, valid_until = taric_stable_interval(conn, hs_code8, country, ref_date)
+    _TARIC_CACHE.put(key, valid_from, valid_until, record)
+    return record
 
-def derive_hs_from_text(
-    conn: Connection, text_hint: str | None, ref_date: date
+
+def cached_taric_lookup(
+    hs_code8: str, country: str, ref_date: date, conn: Connection | None = None
 ) -> str | None:
+    """Return the most specific TARIC code through :func:`cached_pick_most_specific_taric`.
+
+    Reuses ``conn`` when given and needs no connection at all while a reference
+    index is installed.
+    """
+
+    needs_connection = conn is None and reference_index.active_index() is None
+    with get_read_connection() if needs_connection else nullcontext(conn) as active:
+        record = cached_pick_most_specific_taric(active, hs_code8, country, ref_date)
+    return record.taric_code if record else None
+
+
+def taric_cache_stats() -> CacheStats:
+    """Hit/miss/eviction counters for :func:`cached_pick_most_specific_taric`."""
+
+    if _TARIC_CACHE is None:
+        return CacheStats(0, 0, 0, 0, 0, 0)
+    return _TARIC_CACHE.stats()
+
+
+def pool_stats(*, replica: bool = False) -> pool.PoolStats:
+    """Saturation and checkout counters of :func:`get_engine`'s (or the replica's) pool."""
+
+    return (_READ_POOL_METRICS if replica else _POOL_METRICS).stats()
+
+
+def invalidate_reference_caches() -> None:
+    """Forget the cached ``mv_hs_taric_today`` date, refresh stamp and memoised TARIC picks."""
+
+    global _mv_today_state, _refresh_stamp_state
+    _mv_today_state = None
+    _refresh_stamp_state = None
+    if _TARIC_CACHE is not None:
+        _TARIC_CACHE.clear()
+
+
+@dataclass(slots=True)
+class HsTextMatch:
+    hs_code8: str
+    description: str | None
+    score: float
+
+
+TEXT_MATCH_MODE = os.getenv("CLASSIFIER_TEXT_MATCH", "ilike").lower()
+TEXT_MATCH_TOP_K = int(os.getenv("CLASSIFIER_TEXT_MATCH_TOP_K") or 5)
+
+_DERIVE_HS_SQL = """
+    SELECT hs_code8
+    FROM v_hs_codes
+    WHERE description ILIKE :pattern
+      AND is_valid_on(valid_from, valid_to, :ref_date)
+    ORDER BY valid_from DESC
+    LIMIT 1
+"""
+
+# ``<%`` is pg_trgm's word-similarity operator; it is what lets the planner use
+# idx_hs_codes_description_trgm (migration 009) and honours
+# ``pg_trgm.word_similarity_threshold``.
+_RANK_HS_SQL = """
+    SELECT hs_code8, description, word_similarity(:text_hint, description) AS score
+    FROM v_hs_codes
+    WHERE :text_hint <% description
+      AND is_valid_on(valid_from, valid_to, :ref_date)
+    ORDER BY score DESC, valid_from DESC NULLS LAST, hs_code8
+    LIMIT :top_k
+"""
+
+_DERIVE_HS = queries.register("derive_hs", _DERIVE_HS_SQL, pattern="text", ref_date="date")
+_RANK_HS = queries.register(
+    "rank_hs", _RANK_HS_SQL, text_hint="text", ref_date="date", top_k="integer"
+)
+
+
+def _derive_hs_query(text_hint: str, ref_date: date) -> tuple[queries.Query, dict]:
+    """Query and parameters for the configured ``CLASSIFIER_TEXT_MATCH`` mode."""
+
+    if TEXT_MATCH_MODE == "trigram":
+        return _RANK_HS, {"text_hint": text_hint, "ref_date": ref_date, "top_k": 1}
+    return _DERIVE_HS, {"pattern": f"%{text_hint}%", "ref_date": ref_date}
+
+
+def rank_hs_from_text(
+    conn: Connection, text_hint: str | None, ref_date: date, top_k: int = TEXT_MATCH_TOP_K
+) -> list[HsTextMatch]:
+    """Return up to ``top_k`` HS codes whose description best matches ``text_hint``."""
+
+    if not text_hint:
+        return []
+    index = text_index.active_index()
+    if index is not None:
+        return index.search(text_hint, ref_date, top_k)
+    return queries.fetch(
+        conn, _RANK_HS, HsTextMatch, text_hint=text_hint, ref_date=ref_date, top_k=top_k
+    )
+
+
+def derive_hs_from_text(conn: Connection, text_hint: str | None, ref_date: date) -> str | None:
     if not text_hint:
         return None
+    index = text_index.active_index()
+    if index is not None:
+        return index.best_match(text_hint, ref_date)
+    query, params = _derive_hs_query(text_hint, ref_date)
+    rows = queries.fetch_rows(conn, query, **params)
+    if not rows:
+        return None
+    return rows[0][0]
+
+
+def derive_hs_from_text_many(
+    conn: Connection, hints: Iterable[tuple[str, date]]
+) -> dict[tuple[str, date], str | None]:
+    """Bulk variant of :func:`derive_hs_from_text` keyed by ``(text_hint, ref_date)``."""
+
+    unique_keys = [key for key in dict.fromkeys(hints) if key[0]]
+    if not unique_keys:
+        return {}
+    index = text_index.active_index()
+    if index is not None:
+        matches = index.search_many(unique_keys, top_k=1)
+        return {key: (found[0].hs_code8 if found else None) for key, found in matches.items()}
+    if TEXT_MATCH_MODE == "trigram":
+        match = """
+            WHERE k.text_hint <% description
+              AND is_valid_on(valid_from, valid_to, k.ref_date)
+            ORDER BY word_similarity(k.text_hint, description) DESC,
+                     valid_from DESC NULLS LAST,
+                     hs_code8
+        """
+    else:
+        match = """
+            WHERE description ILIKE '%' || k.text_hint || '%'
+              AND is_valid_on(valid_from, valid_to, k.ref_date)
+            ORDER BY valid_from DESC
+        """
     rows = _fetchall(
         conn,
-        """
-        SELECT hs_code8
-        FROM v_hs_codes
-        WHERE description ILIKE :pattern
-          AND is_valid_on(valid_from, valid_to, :ref_date)
-        ORDER BY valid_from DESC
-        LIMIT 1
+        f"""
+        SELECT k.ord, h.hs_code8
+        FROM unnest(CAST(:text_hints AS text[]), CAST(:ref_dates AS date[]))
+            WITH ORDINALITY AS k(text_hint, ref_date, ord)
+        CROSS JOIN LATERAL (
+            SELECT hs_code8
+            FROM v_hs_codes
+            {match}
+            LIMIT 1
+        ) h
         """,
-        pattern=f"%{text_hint}%",
-        ref_date=ref_date,
+        text_hints=[key[0] for key in unique_keys],
+        ref_dates=[key[1] for key in unique_keys],
     )
-    if not rows:
-        return None
-    return rows[0]["hs_code8"]
+    derived: dict[tuple[str, date], str | None] = dict.fromkeys(unique_keys)
+    for row in rows:
+        derived[unique_keys[row["ord"] - 1]] = row["hs_code8"]
+    return derived
+
+
+_INSERT_SNAPSHOT_SQL = """
+    INSERT INTO shipment_classifications (
+        id,
+        shipment_id,
+        hs_code8,
+        taric_code,
+        ruling_id,
+        classification_source,
+        ref_date
+    )
+    VALUES (
+        gen_random_uuid(),
+        :shipment_id,
+        :hs_code8,
+        :taric_code,
+        :ruling_id,
+        :source,
+        :ref_date
+    )
+    ON CONFLICT (id) DO NOTHING
+"""
 
 
 def persist_classification_snapshot(
@@ -286,31 +1181,16 @@ def persist_classification_snapshot(
     ruling_id: str | None,
     source: str,
     ref_date: date,
+    *,
+    commit: bool = True,
 ) -> None:
+    """Record a classification decision in ``shipment_classifications``.
+
+    ``commit=False`` leaves the insert in the caller's open transaction.
+    """
+
     conn.execute(
-        text(
-            """
-            INSERT INTO shipment_classifications (
-                id,
-                shipment_id,
-                hs_code8,
-                taric_code,
-                ruling_id,
-                classification_source,
-                ref_date
-            )
-            VALUES (
-                gen_random_uuid(),
-                :shipment_id,
-                :hs_code8,
-                :taric_code,
-                :ruling_id,
-                :source,
-                :ref_date
-            )
-            ON CONFLICT (id) DO NOTHING
-            """
-        ),
+        text(_INSERT_SNAPSHOT_SQL),
         {
             "shipment_id": shipment_id,
             "hs_code8": result_hs,
@@ -320,45 +1200,123 @@ def persist_classification_snapshot(
             "ref_date": ref_date,
         },
     )
-    conn.commit()
+    if commit:
+        conn.commit()
+
+
+_SNAPSHOT_COLUMNS = (
+    "id",
+    "shipment_id",
+    "hs_code8",
+    "taric_code",
+    "ruling_id",
+    "classification_source",
+    "ref_date",
+)
+SNAPSHOT_BATCH_SIZE = int(os.getenv("CLASSIFIER_SNAPSHOT_BATCH_SIZE") or 5000)
+
+
+def _copy_field(value: object) -> str:
+    """Render a value in Postgres ``COPY`` text format."""
+
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_rows(rows: Iterable[Sequence[object]]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_field(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def persist_classification_snapshots(
+    conn: Connection,
+    snapshots: Iterable[tuple[str, str, str | None, str | None, str, date]],
+    *,
+    batch_size: int = SNAPSHOT_BATCH_SIZE,
+    commit: bool = True,
+) -> int:
+    """Bulk variant of :func:`persist_classification_snapshot`.
+
+    ``snapshots`` are ``(shipment_id, hs_code8, taric_code, ruling_id, source,
+    ref_date)`` tuples and may be a lazy iterable. They are streamed into
+    ``shipment_classifications`` with ``COPY FROM STDIN`` in batches of
+    ``batch_size`` rows; ids are generated client-side and ``decided_at`` keeps its
+    column default. Returns the number of rows written.
+    """
+
+    if not conn.in_transaction():
+        # Start the transaction through SQLAlchemy so ``conn.commit()`` covers
+        # the COPY issued on the raw DBAPI cursor below.
+        conn.begin()
+    copy_sql = f"COPY shipment_classifications ({', '.join(_SNAPSHOT_COLUMNS)}) FROM STDIN"
+    written = 0
+    snapshots = iter(snapshots)
+    with closing(conn.connection.cursor()) as cursor:
+        while batch := list(itertools.islice(snapshots, batch_size)):
+            cursor.copy_expert(
+                copy_sql, _copy_rows((uuid.uuid4(), *snapshot) for snapshot in batch)
+            )
+            written += len(batch)
+    if commit:
+        conn.commit()
+    return written
+
+
+_LATEST_SNAPSHOT_SQL = """
+    SELECT hs_code8, taric_code, ruling_id, classification_source, ref_date
+    FROM shipment_classifications
+    WHERE shipment_id = :shipment_id
+    ORDER BY decided_at DESC
+    LIMIT 1
+"""
 
 
 def latest_snapshot(conn: Connection, shipment_id: str) -> dict | None:
     rows = _fetchall(
         conn,
-        """
-        SELECT hs_code8, taric_code, ruling_id, classification_source, ref_date
-        FROM shipment_classifications
-        WHERE shipment_id = :shipment_id
-        ORDER BY decided_at DESC
-        LIMIT 1
-        """,
+        _LATEST_SNAPSHOT_SQL,
         shipment_id=shipment_id,
     )
     return rows[0] if rows else None
 
 
-def get_cbam_default(
-    conn: Connection, hs_code8: str, country: str, ref_date: date
-) -> EmissionDefault | None:
+def latest_snapshots_many(conn: Connection, shipment_ids: Iterable[str]) -> dict[str, dict]:
+    """Bulk variant of :func:`latest_snapshot`; shipments without one are omitted."""
+
+    ids = list(dict.fromkeys(shipment_ids))
+    if not ids:
+        return {}
     rows = _fetchall(
         conn,
         """
-        SELECT hs_code8, country_code, emission_intensity, source, valid_from, valid_to
-        FROM cbam_default_emissions
-        WHERE hs_code8 = :hs_code8
-          AND (country_code IS NULL OR country_code = :country)
-          AND is_valid_on(valid_from, valid_to, :ref_date)
-        ORDER BY country_code NULLS LAST, valid_from DESC
-        LIMIT 1
+        SELECT DISTINCT ON (shipment_id)
+               shipment_id::text AS shipment_id,
+               hs_code8,
+               taric_code,
+               ruling_id::text AS ruling_id,
+               classification_source,
+               ref_date
+        FROM shipment_classifications
+        WHERE shipment_id = ANY(CAST(:shipment_ids AS uuid[]))
+        ORDER BY shipment_id, decided_at DESC
         """,
-        hs_code8=hs_code8,
-        country=country,
-        ref_date=ref_date,
+        shipment_ids=ids,
     )
-    if not rows:
-        return None
-    row = rows[0]
+    return {row.pop("shipment_id"): row for row in rows}
+
+
+def _emission_default(row: dict) -> EmissionDefault:
     return EmissionDefault(
         hs_code8=row["hs_code8"],
         country_code=row.get("country_code"),
@@ -369,51 +1327,233 @@ def get_cbam_default(
     )
 
 
+_CBAM_DEFAULT_SQL = """
+    SELECT hs_code8, country_code, emission_intensity, source, valid_from, valid_to
+    FROM mv_cbam_default_ranges
+    WHERE hs_code8 = :hs_code8
+      AND (country_code IS NULL OR country_code = :country)
+      AND validity @> CAST(:ref_date AS date)
+    ORDER BY country_code NULLS LAST, valid_from DESC
+    LIMIT 1
+"""
+_CBAM_DEFAULT = queries.register(
+    "cbam_default", _CBAM_DEFAULT_SQL, hs_code8="varchar", country="varchar", ref_date="date"
+)
+
+
+def get_cbam_default(
+    conn: Connection, hs_code8: str, country: str, ref_date: date
+) -> EmissionDefault | None:
+    defaults = queries.fetch(
+        conn,
+        _CBAM_DEFAULT,
+        EmissionDefault,
+        hs_code8=hs_code8,
+        country=country,
+        ref_date=ref_date,
+    )
+    return defaults[0] if defaults else None
+
+
+def get_cbam_defaults_many(
+    conn: Connection, keys: Iterable[tuple[str, str, date]]
+) -> dict[tuple[str, str, date], EmissionDefault | None]:
+    """Bulk variant of :func:`get_cbam_default` keyed by ``(hs_code8, country, ref_date)``."""
+
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
+    rows = _fetchall(
+        conn,
+        """
+        SELECT k.ord, d.*
+        FROM unnest(
+            CAST(:hs_codes AS varchar[]),
+            CAST(:countries AS varchar[]),
+            CAST(:ref_dates AS date[])
+        ) WITH ORDINALITY AS k(hs_code8, country, ref_date, ord)
+        CROSS JOIN LATERAL (
+            SELECT hs_code8, country_code, emission_intensity, source, valid_from, valid_to
+            FROM mv_cbam_default_ranges
+            WHERE hs_code8 = k.hs_code8
+              AND (country_code IS NULL OR country_code = k.country)
+              AND validity @> k.ref_date
+            ORDER BY country_code NULLS LAST, valid_from DESC
+            LIMIT 1
+        ) d
+        """,
+        hs_codes=[key[0] for key in unique_keys],
+        countries=[key[1] for key in unique_keys],
+        ref_dates=[key[2] for key in unique_keys],
+    )
+    found = {row["ord"]: _emission_default(row) for row in rows}
+    return {key: found.get(ord_) for ord_, key in enumerate(unique_keys, start=1)}
+
+
+_DRAFT_CHANGED = """
+    (
+        d.hs_code8,
+        d.taric_code,
+        d.ruling_id,
+        d.classification_source,
+        d.emission_intensity,
+        d.emission_source
+    ) IS DISTINCT FROM (
+        EXCLUDED.hs_code8,
+        EXCLUDED.taric_code,
+        EXCLUDED.ruling_id,
+        EXCLUDED.classification_source,
+        EXCLUDED.emission_intensity,
+        EXCLUDED.emission_source
+    )
+"""
+
+_UPSERT_DRAFT_SQL = f"""
+    INSERT INTO cbam_report_drafts AS d (
+        shipment_id,
+        hs_code8,
+        taric_code,
+        ruling_id,
+        classification_source,
+        emission_intensity,
+        emission_source
+    )
+    VALUES (
+        :shipment_id,
+        :hs_code8,
+        :taric_code,
+        :ruling_id,
+        :source,
+        :emission_intensity,
+        :emission_source
+    )
+    ON CONFLICT (shipment_id) DO UPDATE SET
+        hs_code8 = EXCLUDED.hs_code8,
+        taric_code = EXCLUDED.taric_code,
+        ruling_id = EXCLUDED.ruling_id,
+        classification_source = EXCLUDED.classification_source,
+        emission_intensity = EXCLUDED.emission_intensity,
+        emission_source = EXCLUDED.emission_source
+    WHERE {_DRAFT_CHANGED}
+"""
+
+
+def _draft_params(
+    shipment_id: str,
+    result: Classification | ClassificationResult,
+    emission_intensity: float | None,
+    emission_source: str | None,
+) -> dict:
+    return {
+        "shipment_id": shipment_id,
+        "hs_code8": result.hs_code8,
+        "taric_code": result.taric_code,
+        "ruling_id": result.ruling_id,
+        "source": result.source,
+        "emission_intensity": emission_intensity,
+        "emission_source": emission_source,
+    }
+
+
 def upsert_cbam_report_draft(
     conn: Connection,
     shipment_id: str,
-    result: ClassificationResult,
+    result: Classification | ClassificationResult,
     emission_intensity: float | None,
     emission_source: str | None,
+    *,
+    commit: bool = True,
 ) -> None:
+    """Insert or refresh the CBAM report draft; ``commit=False`` defers the commit."""
+
     conn.execute(
-        text(
-            """
-            INSERT INTO cbam_report_drafts (
-                shipment_id,
-                hs_code8,
-                taric_code,
-                ruling_id,
-                classification_source,
-                emission_intensity,
-                emission_source
-            )
-            VALUES (
-                :shipment_id,
-                :hs_code8,
-                :taric_code,
-                :ruling_id,
-                :source,
-                :emission_intensity,
-                :emission_source
-            )
-            ON CONFLICT (shipment_id) DO UPDATE SET
-                hs_code8 = EXCLUDED.hs_code8,
-                taric_code = EXCLUDED.taric_code,
-                ruling_id = EXCLUDED.ruling_id,
-                classification_source = EXCLUDED.classification_source,
-                emission_intensity = EXCLUDED.emission_intensity,
-                emission_source = EXCLUDED.emission_source
-            """
-        ),
-        {
-            "shipment_id": shipment_id,
-            "hs_code8": result.hs_code8,
-            "taric_code": result.taric_code,
-            "ruling_id": result.ruling_id,
-            "source": result.source,
-            "emission_intensity": emission_intensity,
-            "emission_source": emission_source,
-        },
+        text(_UPSERT_DRAFT_SQL),
+        _draft_params(shipment_id, result, emission_intensity, emission_source),
+    )
+    if commit:
+        conn.commit()
+
+
+@dataclass(frozen=True)
+class DraftUpsertCounts:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def __add__(self, other: DraftUpsertCounts) -> DraftUpsertCounts:
+        return DraftUpsertCounts(
+            self.inserted + other.inserted,
+            self.updated + other.updated,
+            self.unchanged + other.unchanged,
+        )
+
+
+def upsert_cbam_report_drafts(
+    conn: Connection,
+    drafts: Iterable[tuple[str, Classification | ClassificationResult, float | None, str | None]],
+    *,
+    commit: bool = True,
+) -> DraftUpsertCounts:
+    """Bulk variant of :func:`upsert_cbam_report_draft`.
+
+    ``drafts`` are ``(shipment_id, result, emission_intensity, emission_source)``
+    tuples written with one multi-row upsert. A shipment listed more than once
+    keeps its last draft. Existing drafts whose values are identical are left
+    untouched, so re-runs produce no dead tuples for them.
+    """
+
+    by_shipment = {
+        shipment_id: _draft_params(shipment_id, result, intensity, source)
+        for shipment_id, result, intensity, source in drafts
+    }
+    if not by_shipment:
+        return DraftUpsertCounts()
+    params = list(by_shipment.values())
+    rows = _fetchall(
+        conn,
+        f"""
+        INSERT INTO cbam_report_drafts AS d (
+            shipment_id,
+            hs_code8,
+            taric_code,
+            ruling_id,
+            classification_source,
+            emission_intensity,
+            emission_source
+        )
+        SELECT *
+        FROM unnest(
+            CAST(:shipment_ids AS uuid[]),
+            CAST(:hs_codes AS varchar[]),
+            CAST(:taric_codes AS varchar[]),
+            CAST(:ruling_ids AS uuid[]),
+            CAST(:sources AS varchar[]),
+            CAST(:emission_intensities AS double precision[]),
+            CAST(:emission_sources AS text[])
+        )
+        ON CONFLICT (shipment_id) DO UPDATE SET
+            hs_code8 = EXCLUDED.hs_code8,
+            taric_code = EXCLUDED.taric_code,
+            ruling_id = EXCLUDED.ruling_id,
+            classification_source = EXCLUDED.classification_source,
+            emission_intensity = EXCLUDED.emission_intensity,
+            emission_source = EXCLUDED.emission_source
+        WHERE {_DRAFT_CHANGED}
+        RETURNING (xmax = 0) AS inserted
+        """,
+        shipment_ids=[p["shipment_id"] for p in params],
+        hs_codes=[p["hs_code8"] for p in params],
+        taric_codes=[p["taric_code"] for p in params],
+        ruling_ids=[p["ruling_id"] for p in params],
+        sources=[p["source"] for p in params],
+        emission_intensities=[p["emission_intensity"] for p in params],
+        emission_sources=[p["emission_source"] for p in params],
+    )
+    if commit:
+        conn.commit()
+    inserted = sum(1 for row in rows if row["inserted"])
+    return DraftUpsertCounts(
+        inserted=inserted,
+        updated=len(rows) - inserted,
+        unchanged=len(params) - len(rows),
     )
-    conn.commit()
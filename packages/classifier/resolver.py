@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
-from . import repo
-from .rules import ambiguous_result, choose_ruling
-from .types import ClassificationContext, ClassificationResult
+from collections.abc import Sequence
+from contextlib import nullcontext
 
+from . import async_repo, repo, tracing
+from .rules import RulingCandidate, ambiguous_classification, choose_ruling
+from .types import Classification, ClassificationContext, ClassificationResult
 
-def _normalise_hs_code(value: str | None) -> str | None:
+
+def normalise_hs_code(value: str | None) -> str | None:
     if not value:
         return None
     digits = "".join(ch for ch in value if ch.isalnum())
@@ -17,7 +20,7 @@ def _normalise_hs_code(value: str | None) -> str | None:
 
 
 def _resolve_hs(conn, ctx: ClassificationContext) -> str:
-    hs_hint = _normalise_hs_code(ctx.hs_hint)
+    hs_hint = normalise_hs_code(ctx.hs_hint)
     if hs_hint:
         return hs_hint
 
@@ -28,15 +31,88 @@ def _resolve_hs(conn, ctx: ClassificationContext) -> str:
     raise ValueError("Unable to derive HS code from provided context")
 
 
-def classify(ctx: ClassificationContext) -> ClassificationResult:
-    """Classify a shipment and return the chosen HS/TARIC combination."""
+def _taric_code(taric_record: repo.TaricRecord | None) -> str | None:
+    return taric_record.taric_code if taric_record else None
+
+
+def _validity_code(
+    ruling: RulingCandidate, taric_record: repo.TaricRecord | None, hs_code8: str
+) -> str:
+    return ruling.taric_code or (taric_record.taric_code if taric_record else hs_code8)
+
+
+def _bti_result(
+    ruling: RulingCandidate,
+    taric_record: repo.TaricRecord | None,
+    validity: tuple,
+) -> Classification:
+    return Classification(
+        hs_code8=ruling.hs_code8,
+        taric_code=ruling.taric_code or (taric_record.taric_code if taric_record else None),
+        source="BTI",
+        ruling_id=ruling.id,
+        validity_from=validity[0],
+        validity_to=validity[1],
+        notes=ruling.source,
+    )
+
+
+def _taric_result(hs_code8: str, taric_record: repo.TaricRecord) -> Classification:
+    return Classification(
+        hs_code8=hs_code8,
+        taric_code=taric_record.taric_code,
+        source="DIRECT_TARIC",
+        ruling_id=None,
+        validity_from=taric_record.valid_from,
+        validity_to=taric_record.valid_to,
+        notes=taric_record.description,
+    )
+
+
+def _hs_derived_result(hs_code8: str) -> Classification:
+    return Classification(
+        hs_code8=hs_code8,
+        taric_code=None,
+        source="HS_DERIVED",
+        ruling_id=None,
+        validity_from=None,
+        validity_to=None,
+        notes="No TARIC mapping available on reference date",
+    )
+
+
+def classify(ctx: ClassificationContext, conn=None) -> ClassificationResult:
+    """Classify a shipment and return the chosen HS/TARIC combination.
+
+    ``conn`` lets callers run the lookups on a connection they already hold (and
+    inside their transaction); otherwise :func:`repo.get_read_connection` picks a
+    replica or the primary.
+    """
+
+    return classify_compact(ctx, conn).to_result()
 
-    with repo.get_connection() as conn:
+
+def classify_compact(ctx: ClassificationContext, conn=None) -> Classification:
+    """:func:`classify` returning the unvalidated :class:`Classification` tuple."""
+
+    with (
+        tracing.traced(),
+        nullcontext(conn) if conn is not None else repo.get_read_connection() as conn,
+    ):
+        result = _classify(conn, ctx)
+        tracing.set_branch(result.source)
+        return result
+
+
+def _classify(conn, ctx: ClassificationContext) -> Classification:
+    with tracing.stage("resolve_hs"):
         hs_code8 = _resolve_hs(conn, ctx)
-        taric_record = repo.pick_most_specific_taric(
+    with tracing.stage("pick_taric"):
+        taric_record = repo.cached_pick_most_specific_taric(
             conn, hs_code8, ctx.origin_country, ctx.ref_date
         )
 
+    with tracing.stage("rulings"):
         ruling_candidates = repo.get_applicable_rulings(
             conn,
             hs_code8,
@@ -45,44 +121,166 @@ def classify(ctx: ClassificationContext) -> ClassificationResult:
             ctx.ref_date,
         )
         selected_ruling = choose_ruling(ruling_candidates)
-        if selected_ruling:
+    if selected_ruling:
+        with tracing.stage("validity"):
             validity = repo.taric_validity(
-                conn,
-                selected_ruling.taric_code
-                or (taric_record.taric_code if taric_record else hs_code8),
+                conn, _validity_code(selected_ruling, taric_record, hs_code8)
             )
-            return ClassificationResult(
-                hs_code8=selected_ruling.hs_code8,
-                taric_code=selected_ruling.taric_code
-                or (taric_record.taric_code if taric_record else None),
-                source="BTI",
-                ruling_id=selected_ruling.id,
-                validity_from=validity[0],
-                validity_to=validity[1],
-                notes=selected_ruling.source,
+        return _bti_result(selected_ruling, taric_record, validity)
+
+    if taric_record:
+        return _taric_result(hs_code8, taric_record)
+
+    with tracing.stage("candidates"):
+        candidates = repo.taric_candidates(conn, hs_code8, ctx.ref_date)
+    if candidates:
+        return ambiguous_classification(hs_code8)
+
+    return _hs_derived_result(hs_code8)
+
+
+async def classify_async(ctx: ClassificationContext, conn=None) -> ClassificationResult:
+    """Asyncio mirror of :func:`classify` running on the async repository."""
+
+    return (await classify_compact_async(ctx, conn)).to_result()
+
+
+async def classify_compact_async(ctx: ClassificationContext, conn=None) -> Classification:
+    """Asyncio mirror of :func:`classify_compact`."""
+
+    with tracing.traced():
+        if conn is None:
+            async with async_repo.get_async_read_connection() as conn:
+                result = await _classify_async(conn, ctx)
+        else:
+            result = await _classify_async(conn, ctx)
+        tracing.set_branch(result.source)
+        return result
+
+
+async def _classify_async(conn, ctx: ClassificationContext) -> Classification:
+    with tracing.stage("resolve_hs"):
+        hs_code8 = normalise_hs_code(ctx.hs_hint) or await async_repo.derive_hs_from_text(
+            conn, ctx.text_hint, ctx.ref_date
+        )
+    if not hs_code8:
+        raise ValueError("Unable to derive HS code from provided context")
+
+    with tracing.stage("pick_taric"):
+        taric_record = await async_repo.cached_pick_most_specific_taric(
+            conn, hs_code8, ctx.origin_country, ctx.ref_date
+        )
+    with tracing.stage("rulings"):
+        ruling_candidates = await async_repo.get_applicable_rulings(
+            conn, hs_code8, _taric_code(taric_record), ctx.origin_country, ctx.ref_date
+        )
+        selected_ruling = choose_ruling(ruling_candidates)
+    if selected_ruling:
+        with tracing.stage("validity"):
+            validity = await async_repo.taric_validity(
+                conn, _validity_code(selected_ruling, taric_record, hs_code8)
             )
+        return _bti_result(selected_ruling, taric_record, validity)
+
+    if taric_record:
+        return _taric_result(hs_code8, taric_record)
+
+    with tracing.stage("candidates"):
+        candidates = await async_repo.taric_candidates(conn, hs_code8, ctx.ref_date)
+    if candidates:
+        return ambiguous_classification(hs_code8)
+
+    return _hs_derived_result(hs_code8)
+
 
-        if taric_record:
-            return ClassificationResult(
-                hs_code8=hs_code8,
-                taric_code=taric_record.taric_code,
-                source="DIRECT_TARIC",
-                ruling_id=None,
-                validity_from=taric_record.valid_from,
-                validity_to=taric_record.valid_to,
-                notes=taric_record.description,
+def _resolve_hs_many(
+    conn, contexts: Sequence[ClassificationContext], *, skip_unresolved: bool = False
+) -> list[str | None]:
+    hints = [normalise_hs_code(ctx.hs_hint) for ctx in contexts]
+    derived = repo.derive_hs_from_text_many(
+        conn,
+        (
+            (ctx.text_hint, ctx.ref_date)
+            for ctx, hint in zip(contexts, hints, strict=True)
+            if not hint and ctx.text_hint
+        ),
+    )
+    resolved: list[str | None] = []
+    for ctx, hint in zip(contexts, hints, strict=True):
+        hs_code8 = hint or derived.get((ctx.text_hint, ctx.ref_date))
+        if not hs_code8 and not skip_unresolved:
+            raise ValueError(
+                f"Unable to derive HS code from provided context (shipment {ctx.shipment_id})"
             )
+        resolved.append(hs_code8)
+    return resolved
 
-        candidates = repo.taric_candidates(conn, hs_code8, ctx.ref_date)
-        if candidates:
-            return ambiguous_result(hs_code8)
-
-        return ClassificationResult(
-            hs_code8=hs_code8,
-            taric_code=None,
-            source="HS_DERIVED",
-            ruling_id=None,
-            validity_from=None,
-            validity_to=None,
-            notes="No TARIC mapping available on reference date",
+
+def classify_many(
+    contexts: Sequence[ClassificationContext],
+    conn=None,
+    *,
+    skip_unresolved: bool = False,
+) -> list[Classification | None]:
+    """Classify many shipments with a fixed number of set-based queries.
+
+    Contexts are grouped by ``(hs_code8, country, ref_date)`` so every distinct
+    lookup is issued once per batch. Results are returned in input order as
+    compact :class:`Classification` tuples; ``to_result()`` on each gives what
+    :func:`classify` returns for that context individually. ``conn`` lets
+    callers reuse an open connection; otherwise a read connection is checked out
+    for the batch. With ``skip_unresolved`` a context without a derivable HS code
+    yields ``None`` instead of failing the whole batch.
+    """
+
+    if not contexts:
+        return []
+
+    with nullcontext(conn) if conn is not None else repo.get_read_connection() as conn:
+        hs_codes = _resolve_hs_many(conn, contexts, skip_unresolved=skip_unresolved)
+        taric_keys = [
+            (hs_code8, ctx.origin_country, ctx.ref_date)
+            for ctx, hs_code8 in zip(contexts, hs_codes, strict=True)
+            if hs_code8
+        ]
+        taric_records = repo.pick_most_specific_taric_many(conn, taric_keys)
+
+        ruling_keys = [
+            (key[0], _taric_code(taric_records[key]), key[1], key[2]) for key in taric_keys
+        ]
+        rulings = repo.get_applicable_rulings_many(conn, ruling_keys)
+        selected = [choose_ruling(rulings[key]) for key in ruling_keys]
+
+        validity = repo.taric_validity_many(
+            conn,
+            (
+                _validity_code(ruling, taric_records[key], key[0])
+                for ruling, key in zip(selected, taric_keys, strict=True)
+                if ruling
+            ),
+        )
+        unmapped = repo.taric_candidates_many(
+            conn,
+            (
+                (key[0], key[2])
+                for ruling, key in zip(selected, taric_keys, strict=True)
+                if not ruling and not taric_records[key]
+            ),
         )
+
+    resolved: list[Classification] = []
+    for ruling, taric_key in zip(selected, taric_keys, strict=True):
+        hs_code8, _, ref_date = taric_key
+        taric_record = taric_records[taric_key]
+        if ruling:
+            code = _validity_code(ruling, taric_record, hs_code8)
+            resolved.append(_bti_result(ruling, taric_record, validity[code]))
+        elif taric_record:
+            resolved.append(_taric_result(hs_code8, taric_record))
+        elif unmapped.get((hs_code8, ref_date)):
+            resolved.append(ambiguous_classification(hs_code8))
+        else:
+            resolved.append(_hs_derived_result(hs_code8))
+
+    results = iter(resolved)
+    return [next(results) if hs_code8 else None for hs_code8 in hs_codes]
@@ -5,10 +5,10 @@ from __future__ import annotations
 from collections.abc import Iterable
 from dataclasses import dataclass
 
-from .types import ClassificationResult
+from .types import Classification, ClassificationResult
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RulingCandidate:
     """Represents a candidate BTI ruling coming from the repository."""
 
@@ -27,15 +27,19 @@ def choose_ruling(candidates: Iterable[RulingCandidate]) -> RulingCandidate | No
     Candidates are expected to be pre-filtered on validity and country scope.
     """
 
-    return min(
-        candidates, key=lambda c: (c.precedence, c.valid_from or ""), default=None
-    )
+    return min(candidates, key=lambda c: (c.precedence, c.valid_from or ""), default=None)
 
 
 def ambiguous_result(hs_code8: str) -> ClassificationResult:
     """Helper to build a result when TARIC selection is ambiguous."""
 
-    return ClassificationResult(
+    return ambiguous_classification(hs_code8).to_result()
+
+
+def ambiguous_classification(hs_code8: str) -> Classification:
+    """Compact :class:`Classification` variant of :func:`ambiguous_result`."""
+
+    return Classification(
         hs_code8=hs_code8,
         taric_code=None,
         source="AMBIGUOUS",
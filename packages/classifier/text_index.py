@@ -0,0 +1,225 @@
+"""In-process BM25 search over the HS code descriptions in ``v_hs_codes``.
+
+The index answers text-to-HS derivation without a database round-trip. It is
+built from one snapshot of the catalogue and, like :mod:`.reference_index`, is
+immutable and swapped in atomically. Descriptions and queries go through the
+same analyzer: accent folding, lower-casing, Dutch/English stop words and a light
+suffix-stripping stemmer shared by both languages.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime
+from typing import Any
+
+from sqlalchemy.engine import Connection
+
+from . import reference_index, repo
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+_STOP_WORDS = frozenset(
+    """
+    a an and any are as at by for from in into is it its not of on or other than the
+    their this to with without
+    aan al als bij dan de den der die dit door een en het in is met na niet of om ook
+    op over te tot uit van voor zonder
+    """.split()
+)
+# Longest suffix first; applied once per token and only when a stem of at least
+# three characters remains. Covers plurals and common derivations of both
+# languages (e.g. "products"/"producten", "alloys", "gewalste").
+_SUFFIXES = (
+    ("heden", "heid"),
+    ("ingen", ""),
+    ("ies", "y"),
+    ("ing", ""),
+    ("es", ""),
+    ("en", ""),
+    ("ed", ""),
+    ("s", ""),
+    ("e", ""),
+)
+
+K1 = 1.2
+B = 0.75
+
+
+def _stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def analyze(value: str | None) -> list[str]:
+    """Split ``value`` into stemmed search terms."""
+
+    if not value:
+        return []
+    folded = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode().lower()
+    return [_stem(token) for token in _TOKEN_RE.findall(folded) if token not in _STOP_WORDS]
+
+
+@dataclass(frozen=True, slots=True)
+class _Doc:
+    hs_code8: str
+    description: str | None
+    valid_from: date | None
+    valid_to: date | None
+
+
+@dataclass(frozen=True)
+class HsTextIndex:
+    """Immutable BM25 index built from one ``v_hs_codes`` snapshot."""
+
+    version: str
+    loaded_at: datetime
+    docs: tuple[_Doc, ...] = field(repr=False)
+    postings: Mapping[str, tuple[tuple[int, float], ...]] = field(repr=False)
+
+    @classmethod
+    def from_rows(cls, version: str, rows: Iterable[Mapping[str, Any]]) -> HsTextIndex:
+        docs: list[_Doc] = []
+        term_counts: list[Counter[str]] = []
+        for row in rows:
+            docs.append(
+                _Doc(
+                    hs_code8=row["hs_code8"],
+                    description=row.get("description"),
+                    valid_from=row.get("valid_from"),
+                    valid_to=row.get("valid_to"),
+                )
+            )
+            term_counts.append(Counter(analyze(row.get("description"))))
+
+        lengths = [sum(counts.values()) for counts in term_counts]
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+        by_term: dict[str, list[tuple[int, int]]] = {}
+        for doc_id, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                by_term.setdefault(term, []).append((doc_id, tf))
+
+        # Fold idf and length normalisation into one weight per posting so a
+        # query only sums precomputed floats.
+        total = len(docs)
+        postings: dict[str, tuple[tuple[int, float], ...]] = {}
+        for term, entries in by_term.items():
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            postings[term] = tuple(
+                (
+                    doc_id,
+                    idf
+                    * tf
+                    * (K1 + 1)
+                    / (tf + K1 * (1 - B + B * lengths[doc_id] / (avg_length or 1.0))),
+                )
+                for doc_id, tf in entries
+            )
+
+        return cls(
+            version=version,
+            loaded_at=datetime.now(UTC),
+            docs=tuple(docs),
+            postings=postings,
+        )
+
+    def search(
+        self, text_hint: str | None, ref_date: date | None = None, top_k: int = 5
+    ) -> list[repo.HsTextMatch]:
+        """Return the ``top_k`` best matching HS codes valid on ``ref_date``."""
+
+        return self._search(analyze(text_hint), ref_date, top_k)
+
+    def search_many(
+        self, queries: Iterable[tuple[str, date | None]], top_k: int = 5
+    ) -> dict[tuple[str, date | None], list[repo.HsTextMatch]]:
+        """Batch variant of :meth:`search` keyed by ``(text_hint, ref_date)``."""
+
+        terms_by_text: dict[str, list[str]] = {}
+        results: dict[tuple[str, date | None], list[repo.HsTextMatch]] = {}
+        for key in queries:
+            if key in results:
+                continue
+            text_hint, ref_date = key
+            if text_hint not in terms_by_text:
+                terms_by_text[text_hint] = analyze(text_hint)
+            results[key] = self._search(terms_by_text[text_hint], ref_date, top_k)
+        return results
+
+    def best_match(self, text_hint: str | None, ref_date: date | None = None) -> str | None:
+        matches = self.search(text_hint, ref_date, top_k=1)
+        return matches[0].hs_code8 if matches else None
+
+    def _search(
+        self, terms: list[str], ref_date: date | None, top_k: int
+    ) -> list[repo.HsTextMatch]:
+        scores: dict[int, float] = {}
+        for term in terms:
+            for doc_id, weight in self.postings.get(term, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+
+        best: dict[str, tuple[float, _Doc]] = {}
+        for doc_id, score in scores.items():
+            doc = self.docs[doc_id]
+            if ref_date is not None and not reference_index._is_valid_on(
+                doc.valid_from, doc.valid_to, ref_date
+            ):
+                continue
+            current = best.get(doc.hs_code8)
+            if current is None or score > current[0]:
+                best[doc.hs_code8] = (score, doc)
+
+        ranked = sorted(best.values(), key=lambda item: (-item[0], item[1].hs_code8))
+        return [
+            repo.HsTextMatch(hs_code8=doc.hs_code8, description=doc.description, score=score)
+            for score, doc in ranked[:top_k]
+        ]
+
+
+def load_text_index(conn: Connection, version: str | None = None) -> HsTextIndex:
+    """Read ``v_hs_codes`` into a new :class:`HsTextIndex`."""
+
+    version = version or reference_index.reference_version(conn)
+    rows = repo._fetchall(
+        conn,
+        """
+        SELECT hs_code8, description, valid_from, valid_to
+        FROM v_hs_codes
+        WHERE description IS NOT NULL
+        """,
+    )
+    return HsTextIndex.from_rows(version, rows)
+
+
+_ACTIVE: HsTextIndex | None = None
+
+
+def active_index() -> HsTextIndex | None:
+    return _ACTIVE
+
+
+def install_index(index: HsTextIndex | None) -> None:
+    """Atomically swap the index used for text lookups (``None`` disables it)."""
+
+    global _ACTIVE
+    _ACTIVE = index
+
+
+def refresh_text_index(conn: Connection, *, force: bool = False) -> HsTextIndex:
+    """Reload and install the index when the reference version has changed."""
+
+    current = _ACTIVE
+    version = reference_index.reference_version(conn)
+    if current is not None and current.version == version and not force:
+        return current
+    index = load_text_index(conn, version)
+    install_index(index)
+    return index
@@ -0,0 +1,243 @@
+"""Opt-in decision traces and latency histograms for classifications.
+
+A trace records which branch the resolver took, how long each stage ran, how
+many statements each stage sent to the database and which lookup paths and
+caches served it. Tracing is off by default; it is switched on:
+
+* per call, with ``traced(force=True)`` (``?trace=1`` on ``/internal/classify``),
+  which hands the :class:`Trace` back to the caller;
+* for every classification, with ``CLASSIFIER_TRACING=1``, in which case traces
+  are only aggregated into the histograms of :func:`latency_histograms`.
+
+Every finished trace feeds the histograms and the observers registered with
+:func:`add_observer`; registering one also switches tracing on. Observers added
+with ``detailed=False`` (such as the Prometheus metrics) only need the branch and
+stage durations: while tracing is otherwise off, classifications are timed with
+a :class:`Timing` instead, which skips statement, lookup path and cache counting.
+While neither is active, the hooks below cost one context variable lookup.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, ClassVar
+
+ENABLED = os.getenv("CLASSIFIER_TRACING", "").lower() in {"1", "true", "yes"}
+
+# Upper bounds in milliseconds; the last bucket is unbounded.
+BUCKETS_MS = (1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+_CURRENT: ContextVar[Timing | None] = ContextVar("classifier_trace", default=None)
+_NO_STAGE = nullcontext()
+
+
+@dataclass(slots=True)
+class Stage:
+    name: str
+    ms: float
+    queries: int
+
+
+@dataclass(slots=True)
+class Timing:
+    """Decision branch and stage durations of one classification."""
+
+    started: float = field(default_factory=time.perf_counter)
+    total_ms: float = 0.0
+    branch: str | None = None
+    stages: list[Stage] = field(default_factory=list)
+    # Whether statements, lookup paths and cache lookups are counted too.
+    detailed: ClassVar[bool] = False
+
+
+@dataclass
+class Trace(Timing):
+    queries: int = 0
+    lookup_paths: Counter[str] = field(default_factory=Counter)
+    cache: Counter[str] = field(default_factory=Counter)
+    detailed: ClassVar[bool] = True
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "branch": self.branch,
+            "total_ms": round(self.total_ms, 3),
+            "queries": self.queries,
+            "stages": [
+                {"name": stage.name, "ms": round(stage.ms, 3), "queries": stage.queries}
+                for stage in self.stages
+            ],
+            "lookup_paths": dict(self.lookup_paths),
+            "cache": dict(self.cache),
+        }
+
+
+class _StageTimer:
+    __slots__ = ("trace", "name", "started", "queries")
+
+    def __init__(self, trace: Timing, name: str) -> None:
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.queries = self.trace.queries if self.trace.detailed else 0
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        elapsed = (time.perf_counter() - self.started) * 1000
+        queries = self.trace.queries - self.queries if self.trace.detailed else 0
+        self.trace.stages.append(Stage(self.name, elapsed, queries))
+
+
+class Histogram:
+    """Cumulative-friendly latency histogram over :data:`BUCKETS_MS`."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "buckets_ms": list(BUCKETS_MS),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum_ms": self.sum_ms,
+        }
+
+
+_HISTOGRAMS: dict[str, Histogram] = {}
+_BRANCHES: Counter[str] = Counter()
+_LOCK = Lock()
+_OBSERVERS: list[Callable[[Trace], None]] = []
+_TIMING_OBSERVERS: list[Callable[[Timing], None]] = []
+
+
+def _observe(name: str, ms: float) -> None:
+    histogram = _HISTOGRAMS.get(name)
+    if histogram is None:
+        histogram = _HISTOGRAMS.setdefault(name, Histogram())
+    histogram.observe(ms)
+
+
+def _aggregate(trace: Timing) -> None:
+    with _LOCK:
+        _observe("total", trace.total_ms)
+        if trace.branch:
+            _BRANCHES[trace.branch] += 1
+            _observe(f"branch:{trace.branch}", trace.total_ms)
+        for stage in trace.stages:
+            _observe(f"stage:{stage.name}", stage.ms)
+    for observer in _TIMING_OBSERVERS:
+        observer(trace)
+    if trace.detailed:
+        for observer in _OBSERVERS:
+            observer(trace)
+
+
+def add_observer(observer: Callable[[Trace], None], *, detailed: bool = True) -> None:
+    """Call ``observer`` with every finished trace, tracing all classifications.
+
+    With ``detailed=False`` the observer is also called with the :class:`Timing` of
+    every classification that is not traced, and full tracing stays off.
+    """
+
+    observers = _OBSERVERS if detailed else _TIMING_OBSERVERS
+    if observer not in observers:
+        observers.append(observer)
+
+
+def remove_observer(observer: Callable[[Trace], None]) -> None:
+    for observers in (_OBSERVERS, _TIMING_OBSERVERS):
+        if observer in observers:
+            observers.remove(observer)
+
+
+@contextmanager
+def traced(*, force: bool = False) -> Iterator[Timing | None]:
+    """Trace the enclosed classification and yield the :class:`Trace`.
+
+    Yields a :class:`Timing` while only timing observers are registered, and
+    ``None`` while tracing is off. Nested calls join the trace that is already
+    active, so only the outermost block finishes and aggregates it.
+    """
+
+    current = _CURRENT.get()
+    if current is not None:
+        yield current
+        return
+    if force or ENABLED or _OBSERVERS:
+        trace = Trace()
+    elif _TIMING_OBSERVERS:
+        trace = Timing()
+    else:
+        yield None
+        return
+    token = _CURRENT.set(trace)
+    try:
+        yield trace
+    finally:
+        _CURRENT.reset(token)
+        trace.total_ms = (time.perf_counter() - trace.started) * 1000
+        _aggregate(trace)
+
+
+def stage(name: str) -> _StageTimer | nullcontext:
+    """Time the enclosed block as stage ``name`` of the active trace."""
+
+    trace = _CURRENT.get()
+    return _NO_STAGE if trace is None else _StageTimer(trace, name)
+
+
+def set_branch(branch: str) -> None:
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.branch = branch
+
+
+def record_query(*_: Any) -> None:
+    """Count one statement; also usable as a ``before_cursor_execute`` listener."""
+
+    trace = _CURRENT.get()
+    if trace is not None and trace.detailed:
+        trace.queries += 1
+
+
+def record_path(lookup: str, path: str, count: int = 1) -> None:
+    trace = _CURRENT.get()
+    if trace is not None and trace.detailed:
+        trace.lookup_paths[f"{lookup}:{path}"] += count
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    trace = _CURRENT.get()
+    if trace is not None and trace.detailed:
+        trace.cache[f"{cache}:{'hit' if hit else 'miss'}"] += 1
+
+
+def latency_histograms() -> dict[str, Any]:
+    """Aggregated stage, branch and total latencies of all finished traces."""
+
+    with _LOCK:
+        return {
+            "branches": dict(_BRANCHES),
+            "histograms": {name: h.snapshot() for name, h in sorted(_HISTOGRAMS.items())},
+        }
+
+
+def reset_histograms() -> None:
+    with _LOCK:
+        _HISTOGRAMS.clear()
+        _BRANCHES.clear()
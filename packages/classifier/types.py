@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from datetime import date
+from typing import NamedTuple
 
 from pydantic import BaseModel, Field
 
@@ -36,3 +37,27 @@ class ClassificationResult(BaseModel):
     validity_from: date | None = Field(default=None)
     validity_to: date | None = Field(default=None)
     notes: str | None = Field(default=None)
+
+
+class Classification(NamedTuple):
+    """Compact, unvalidated classification used inside the resolver and batch jobs.
+
+    It carries the same fields as :class:`ClassificationResult` in a plain tuple;
+    :meth:`to_result` builds the validated model where results leave the service,
+    and :meth:`from_result` turns a validated model back into a tuple.
+    """
+
+    hs_code8: str
+    taric_code: str | None
+    source: str
+    ruling_id: str | None = None
+    validity_from: date | None = None
+    validity_to: date | None = None
+    notes: str | None = None
+
+    def to_result(self) -> ClassificationResult:
+        return ClassificationResult.model_validate(self._asdict())
+
+    @classmethod
+    def from_result(cls, result: ClassificationResult) -> Classification:
+        return cls(**result.model_dump())
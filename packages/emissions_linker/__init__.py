@@ -1,5 +1,17 @@
 """Interfaces for enriching shipments with CBAM emissions data."""
 
-from .linker import EmissionLinkResult, classify_and_link
+from .linker import (
+    EmissionLinkBatch,
+    EmissionLinkResult,
+    classify_and_link,
+    classify_and_link_async,
+    classify_and_link_many,
+)
 
-__all__ = ["EmissionLinkResult", "classify_and_link"]
+__all__ = [
+    "EmissionLinkBatch",
+    "EmissionLinkResult",
+    "classify_and_link",
+    "classify_and_link_async",
+    "classify_and_link_many",
+]
@@ -0,0 +1,182 @@
+"""Backfill ``shipment_classifications`` snapshots without touching report drafts.
+
+Run it with ``python -m packages.emissions_linker.backfill``. By default only
+shipments that have never been classified are visited; ``--all`` appends a fresh
+snapshot for every shipment. Chunks are classified with the bulk resolver and
+streamed into the table with ``COPY`` through
+:func:`packages.classifier.repo.persist_classification_snapshots`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from packages.classifier import ClassificationContext, classify_many, text_index
+from packages.classifier import repo as classifier_repo
+
+from .batch import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_PAGE_SIZE,
+    BatchStats,
+    Checkpoint,
+    iter_shipment_chunks,
+)
+from .linker import _build_context
+
+logger = logging.getLogger(__name__)
+
+
+def _contexts(records: Iterable[Any]) -> list[ClassificationContext]:
+    contexts = []
+    for record in records:
+        try:
+            contexts.append(_build_context(record))
+        except ValueError:
+            continue
+    return contexts
+
+
+def backfill_chunk(
+    conn: Any,
+    records: Iterable[Any],
+    *,
+    batch_size: int = classifier_repo.SNAPSHOT_BATCH_SIZE,
+) -> int:
+    """Classify ``records`` and write one snapshot each; returns the rows written."""
+
+    contexts = _contexts(records)
+    with classifier_repo.get_read_connection(conn) as reader:
+        results = classify_many(contexts, reader, skip_unresolved=True)
+    written = classifier_repo.persist_classification_snapshots(
+        conn,
+        (
+            (
+                ctx.shipment_id,
+                result.hs_code8,
+                result.taric_code,
+                result.ruling_id,
+                result.source,
+                ctx.ref_date,
+            )
+            for ctx, result in zip(contexts, results, strict=True)
+            if result is not None
+        ),
+        batch_size=batch_size,
+        commit=False,
+    )
+    conn.commit()
+    return written
+
+
+def run_backfill(
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    batch_size: int = classifier_repo.SNAPSHOT_BATCH_SIZE,
+    checkpoint: Checkpoint | None = None,
+    unclassified_only: bool = True,
+    limit: int | None = None,
+) -> BatchStats:
+    """Write snapshots chunk by chunk from the checkpoint onwards."""
+
+    checkpoint = checkpoint or Checkpoint(None)
+    stats = BatchStats()
+    started = time.perf_counter()
+
+    with classifier_repo.get_connection() as reader, classifier_repo.get_connection() as writer:
+        for chunk in iter_shipment_chunks(
+            reader,
+            checkpoint.load(),
+            chunk_size=chunk_size,
+            page_size=page_size,
+            limit=limit,
+            unclassified_only=unclassified_only,
+        ):
+            try:
+                written = backfill_chunk(writer, chunk, batch_size=batch_size)
+            except BaseException:
+                writer.rollback()
+                raise
+            stats.processed += len(chunk)
+            stats.linked += written
+            stats.skipped += len(chunk) - written
+            stats.elapsed = time.perf_counter() - started
+            checkpoint.save(chunk[-1]["id"], stats)
+            logger.info(
+                "Wrote %d snapshots for %d shipments (%.0f shipments/s, %d total)",
+                written,
+                len(chunk),
+                stats.rate,
+                stats.processed,
+            )
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=classifier_repo.SNAPSHOT_BATCH_SIZE,
+        help="rows per COPY statement",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=os.getenv("CLASSIFIER_BACKFILL_CHECKPOINT"),
+        help="file recording the last committed shipment id (resumes from it)",
+    )
+    parser.add_argument("--reset", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument(
+        "--all", action="store_true", help="snapshot every shipment, not only unclassified ones"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many shipments")
+    parser.add_argument(
+        "--text-index",
+        action="store_true",
+        default=os.getenv("CLASSIFIER_TEXT_INDEX", "").lower() in {"1", "true", "yes"},
+        help="derive HS codes from descriptions with the in-process text index",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    checkpoint = Checkpoint(Path(args.checkpoint) if args.checkpoint else None)
+    if args.reset:
+        checkpoint.clear()
+    if args.text_index:
+        with classifier_repo.get_connection() as conn:
+            text_index.refresh_text_index(conn)
+    stats = run_backfill(
+        chunk_size=args.chunk_size,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        checkpoint=checkpoint,
+        unclassified_only=not args.all,
+        limit=args.limit,
+    )
+    logger.info(
+        "Done: %d snapshots written for %d shipments in %.1fs (%.0f shipments/s)",
+        stats.linked,
+        stats.processed,
+        stats.elapsed,
+        stats.rate,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
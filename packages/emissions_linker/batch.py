@@ -0,0 +1,295 @@
+"""Batch job linking every shipment in the ``shipments`` table.
+
+Run it with ``python -m packages.emissions_linker.batch``. Shipments are read in
+id order through a server-side cursor, one keyset page at a time, and linked in
+chunks with :func:`classify_and_link_many`. The last committed shipment id is
+written to a checkpoint file after every chunk so an interrupted run resumes
+where it stopped. With ``--workers N`` chunks are linked on ``N`` processes
+(see :mod:`.parallel`). SIGTERM and SIGINT stop the job after the chunks in
+flight have been committed and checkpointed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import closing, nullcontext
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from packages.classifier import reference_index, text_index
+from packages.classifier import repo as classifier_repo
+from packages.classifier.repo import DraftUpsertCounts
+
+from .linker import classify_and_link_many
+from .parallel import link_chunks_in_parallel, stop_on_signals, worker_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_PAGE_SIZE = 20_000
+
+_SHIPMENT_COLUMNS = """
+    SELECT id::text AS id,
+           arrived_at,
+           country_code,
+           hs_code,
+           description,
+           net_weight_kg,
+           gross_weight_kg
+    FROM shipments
+"""
+_UNCLASSIFIED_FILTER = """
+    NOT EXISTS (
+        SELECT 1 FROM shipment_classifications c WHERE c.shipment_id = shipments.id
+    )
+"""
+
+
+@dataclass
+class BatchStats:
+    processed: int = 0
+    linked: int = 0
+    skipped: int = 0
+    drafts: DraftUpsertCounts = field(default_factory=DraftUpsertCounts)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+class Checkpoint:
+    """JSON file holding the id of the last shipment whose chunk was committed."""
+
+    def __init__(self, path: Path | None) -> None:
+        self.path = path
+
+    def load(self) -> str | None:
+        if self.path is None or not self.path.exists():
+            return None
+        return json.loads(self.path.read_text()).get("last_id")
+
+    def save(self, last_id: str, stats: BatchStats) -> None:
+        if self.path is None:
+            return
+        payload = {
+            "last_id": last_id,
+            "processed": stats.processed,
+            "linked": stats.linked,
+            "skipped": stats.skipped,
+            "drafts": asdict(stats.drafts),
+            "updated_at": datetime.now(UTC).isoformat(),
+        }
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+def iter_shipment_chunks(
+    conn: Connection,
+    after_id: str | None = None,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    limit: int | None = None,
+    unclassified_only: bool = False,
+) -> Iterator[list[dict[str, Any]]]:
+    """Yield shipments ordered by id in chunks of at most ``chunk_size`` rows.
+
+    Each keyset page (``id > last id``) is read through a server-side cursor in
+    its own short read transaction, which ends before the page's first chunk is
+    yielded. The job therefore buffers at most one page and holds no snapshot
+    while chunks are linked, or after the caller stops iterating.
+    ``unclassified_only`` restricts the scan to shipments without any
+    classification snapshot.
+    """
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page = page_size if remaining is None else min(page_size, remaining)
+        filters = []
+        if after_id:
+            filters.append("id > CAST(:after_id AS uuid)")
+        if unclassified_only:
+            filters.append(_UNCLASSIFIED_FILTER)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        statement = text(f"{_SHIPMENT_COLUMNS} {where} ORDER BY id LIMIT :page")
+        with conn.begin():
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                statement, {"after_id": after_id, "page": page}
+            )
+            chunks = [
+                [dict(row) for row in partition] for partition in result.mappings().partitions()
+            ]
+        seen = sum(len(chunk) for chunk in chunks)
+        if chunks:
+            after_id = chunks[-1][-1]["id"]
+        yield from chunks
+        if remaining is not None:
+            remaining -= seen
+        if seen < page:
+            return
+
+
+def run_batch(
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    checkpoint: Checkpoint | None = None,
+    force: bool = False,
+    limit: int | None = None,
+    workers: int = 1,
+) -> BatchStats:
+    """Link shipments from the checkpoint onwards and return throughput stats.
+
+    With ``workers > 1`` chunks are linked in parallel; they are still
+    checkpointed one after the other in id order.
+    """
+
+    checkpoint = checkpoint or Checkpoint(None)
+    stats = BatchStats()
+    started = time.perf_counter()
+    after_id = checkpoint.load()
+    if after_id:
+        logger.info("Resuming after shipment %s", after_id)
+
+    with (
+        stop_on_signals() as stop,
+        # Forked before the connections below exist, so no worker inherits them.
+        worker_pool(workers) if workers > 1 else nullcontext() as pool,
+        classifier_repo.get_connection() as reader,
+        classifier_repo.get_connection() as writer,
+        closing(
+            iter_shipment_chunks(
+                reader, after_id, chunk_size=chunk_size, page_size=page_size, limit=limit
+            )
+        ) as pages,
+    ):
+        chunks = itertools.takewhile(lambda _: not stop.is_set(), pages)
+        if pool is not None:
+            outcomes = link_chunks_in_parallel(chunks, pool, max_pending=2 * workers, force=force)
+        else:
+            outcomes = (
+                (
+                    chunk,
+                    classify_and_link_many(chunk, conn=writer, force=force, skip_unresolved=True),
+                )
+                for chunk in chunks
+            )
+        chunk_started = time.perf_counter()
+        for chunk, outcome in outcomes:
+            stats.processed += len(chunk)
+            stats.linked += len(outcome.results)
+            stats.skipped += len(chunk) - len(outcome.results)
+            stats.drafts += outcome.drafts
+            stats.elapsed = time.perf_counter() - started
+            checkpoint.save(chunk[-1]["id"], stats)
+            chunk_elapsed = time.perf_counter() - chunk_started
+            logger.info(
+                "Linked %d/%d shipments (%.0f/s chunk, %.0f/s overall, %d total); "
+                "drafts %d inserted, %d updated, %d unchanged",
+                len(outcome.results),
+                len(chunk),
+                len(chunk) / chunk_elapsed if chunk_elapsed else 0.0,
+                stats.rate,
+                stats.processed,
+                outcome.drafts.inserted,
+                outcome.drafts.updated,
+                outcome.drafts.unchanged,
+            )
+            chunk_started = time.perf_counter()
+        if stop.is_set():
+            logger.warning("Stopped on request after %d shipments", stats.processed)
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=os.getenv("EMISSIONS_LINKER_CHECKPOINT"),
+        help="file recording the last committed shipment id (resumes from it)",
+    )
+    parser.add_argument("--reset", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--force", action="store_true", help="reclassify fresh snapshots too")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many shipments")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("EMISSIONS_LINKER_WORKERS") or 1),
+        help="link chunks on this many worker processes",
+    )
+    parser.add_argument(
+        "--text-index",
+        action="store_true",
+        default=os.getenv("CLASSIFIER_TEXT_INDEX", "").lower() in {"1", "true", "yes"},
+        help="derive HS codes from descriptions with the in-process text index",
+    )
+    parser.add_argument(
+        "--reference-index",
+        action="store_true",
+        default=os.getenv("CLASSIFIER_REFERENCE_INDEX", "").lower() in {"1", "true", "yes"},
+        help="answer TARIC and ruling lookups from the in-process reference index",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    checkpoint = Checkpoint(Path(args.checkpoint) if args.checkpoint else None)
+    if args.reset:
+        checkpoint.clear()
+    # Loaded before workers are forked, so they share the indexes copy-on-write.
+    if args.text_index or args.reference_index:
+        with classifier_repo.get_connection() as conn:
+            if args.text_index:
+                text_index.refresh_text_index(conn)
+            if args.reference_index:
+                reference_index.refresh_index(conn)
+    stats = run_batch(
+        chunk_size=args.chunk_size,
+        page_size=args.page_size,
+        checkpoint=checkpoint,
+        force=args.force,
+        limit=args.limit,
+        workers=args.workers,
+    )
+    logger.info(
+        "Done: %d shipments processed, %d linked, %d skipped in %.1fs (%.0f shipments/s); "
+        "drafts %d inserted, %d updated, %d unchanged",
+        stats.processed,
+        stats.linked,
+        stats.skipped,
+        stats.elapsed,
+        stats.rate,
+        stats.drafts.inserted,
+        stats.drafts.updated,
+        stats.drafts.unchanged,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
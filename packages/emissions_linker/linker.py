@@ -2,23 +2,43 @@
 
 from __future__ import annotations
 
-from collections.abc import Mapping
+import asyncio
+from collections.abc import Iterable, Mapping
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import date
 from typing import Any
 
-from packages.classifier import ClassificationContext, ClassificationResult, classify
+from packages.classifier import (
+    Classification,
+    ClassificationContext,
+    classify_compact,
+    classify_compact_async,
+    classify_many,
+    tracing,
+)
+from packages.classifier import async_repo as classifier_async_repo
 from packages.classifier import repo as classifier_repo
+from packages.classifier.resolver import normalise_hs_code
+
+# Trace branch of shipments whose fresh snapshot was reused without classifying.
+SNAPSHOT_BRANCH = "SNAPSHOT"
 
 
 @dataclass
 class EmissionLinkResult:
     shipment_id: str
-    classification: ClassificationResult
+    classification: Classification
     emission_intensity: float | None
     emission_source: str | None
 
 
+@dataclass
+class EmissionLinkBatch:
+    results: list[EmissionLinkResult]
+    drafts: classifier_repo.DraftUpsertCounts
+
+
 def _get_attr(record: Any, name: str) -> Any:
     if isinstance(record, Mapping):
         return record.get(name)
@@ -43,8 +63,8 @@ def _build_context(record: Any) -> ClassificationContext:
     )
 
 
-def _classification_from_snapshot(snapshot: Mapping[str, Any]) -> ClassificationResult:
-    return ClassificationResult(
+def _classification_from_snapshot(snapshot: Mapping[str, Any]) -> Classification:
+    return Classification(
         hs_code8=snapshot["hs_code8"],
         taric_code=snapshot.get("taric_code"),
         source=snapshot.get("classification_source", "DIRECT_TARIC"),
@@ -68,37 +88,263 @@ def _should_reclassify(record: Any, snapshot: Mapping[str, Any] | None, force: b
 
 
 def classify_and_link(record: Any, *, force: bool = False) -> EmissionLinkResult:
-    """Classify a shipment and persist the resulting emission defaults."""
+    """Classify a shipment and persist the resulting emission defaults.
+
+    The snapshot lookup and both writes run on one primary connection and are
+    committed together in a single transaction. Reference lookups go through
+    :func:`classifier_repo.get_read_connection`, which reuses that connection
+    unless a usable replica is configured.
+    """
 
     ctx = _build_context(record)
-    with classifier_repo.get_connection() as conn:
-        snapshot = classifier_repo.latest_snapshot(conn, ctx.shipment_id)
-        if _should_reclassify(record, snapshot, force):
-            classification = classify(ctx)
-            classifier_repo.persist_classification_snapshot(
+    with (
+        tracing.traced(),
+        classifier_repo.get_connection() as conn,
+        classifier_repo.get_read_connection(conn) as reader,
+    ):
+        try:
+            with tracing.stage("snapshot"):
+                snapshot = classifier_repo.latest_snapshot(conn, ctx.shipment_id)
+            if _should_reclassify(record, snapshot, force):
+                classification = classify_compact(ctx, reader)
+                with tracing.stage("persist_snapshot"):
+                    classifier_repo.persist_classification_snapshot(
+                        conn,
+                        ctx.shipment_id,
+                        classification.hs_code8,
+                        classification.taric_code,
+                        classification.ruling_id,
+                        classification.source,
+                        ctx.ref_date,
+                        commit=False,
+                    )
+            else:
+                classification = _classification_from_snapshot(snapshot)
+                tracing.set_branch(SNAPSHOT_BRANCH)
+
+            with tracing.stage("cbam_default"):
+                default = classifier_repo.get_cbam_default(
+                    reader, classification.hs_code8, ctx.origin_country, ctx.ref_date
+                )
+            emission_intensity = default.emission_intensity if default else None
+            emission_source = default.source if default else None
+            with tracing.stage("persist_draft"):
+                classifier_repo.upsert_cbam_report_draft(
+                    conn,
+                    ctx.shipment_id,
+                    classification,
+                    emission_intensity,
+                    emission_source,
+                    commit=False,
+                )
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return EmissionLinkResult(
+        shipment_id=ctx.shipment_id,
+        classification=classification,
+        emission_intensity=emission_intensity,
+        emission_source=emission_source,
+    )
+
+
+def classify_and_link_many(
+    records: Iterable[Any],
+    *,
+    conn: Any = None,
+    force: bool = False,
+    skip_unresolved: bool = False,
+) -> EmissionLinkBatch:
+    """Bulk variant of :func:`classify_and_link` for a chunk of shipments.
+
+    Snapshots, classifications and CBAM defaults are fetched with set-based
+    queries and both tables are written with one multi-row statement each, in a
+    single transaction on ``conn`` (or a pooled connection). Classification and
+    CBAM default lookups go through :func:`classifier_repo.get_read_connection`,
+    which reuses that connection unless a usable replica is configured. With
+    ``skip_unresolved`` shipments whose context is invalid or whose HS code cannot
+    be derived are left out of the result instead of failing the chunk. The batch
+    also reports how many drafts were inserted, updated or already up to date.
+    """
+
+    records = list(records)
+    contexts: list[ClassificationContext] = []
+    linkable: list[Any] = []
+    for record in records:
+        try:
+            contexts.append(_build_context(record))
+        except ValueError:
+            if not skip_unresolved:
+                raise
+            continue
+        linkable.append(record)
+    if not contexts:
+        return EmissionLinkBatch(results=[], drafts=classifier_repo.DraftUpsertCounts())
+
+    with (
+        nullcontext(conn) if conn is not None else classifier_repo.get_connection() as conn,
+        classifier_repo.get_read_connection(conn) as reader,
+    ):
+        try:
+            snapshots = classifier_repo.latest_snapshots_many(
+                conn, (ctx.shipment_id for ctx in contexts)
+            )
+            stale = [
+                _should_reclassify(record, snapshots.get(ctx.shipment_id), force)
+                for record, ctx in zip(linkable, contexts, strict=True)
+            ]
+            fresh = iter(
+                classify_many(
+                    [ctx for ctx, flag in zip(contexts, stale, strict=True) if flag],
+                    reader,
+                    skip_unresolved=skip_unresolved,
+                )
+            )
+            classifications = [
+                next(fresh) if flag else _classification_from_snapshot(snapshots[ctx.shipment_id])
+                for ctx, flag in zip(contexts, stale, strict=True)
+            ]
+
+            linked = [
+                (ctx, classification, flag)
+                for ctx, classification, flag in zip(contexts, classifications, stale, strict=True)
+                if classification is not None
+            ]
+            classifier_repo.persist_classification_snapshots(
                 conn,
-                ctx.shipment_id,
-                classification.hs_code8,
-                classification.taric_code,
-                classification.ruling_id,
-                classification.source,
-                ctx.ref_date,
+                (
+                    (
+                        ctx.shipment_id,
+                        classification.hs_code8,
+                        classification.taric_code,
+                        classification.ruling_id,
+                        classification.source,
+                        ctx.ref_date,
+                    )
+                    for ctx, classification, flag in linked
+                    if flag
+                ),
+                commit=False,
             )
-        else:
-            classification = _classification_from_snapshot(snapshot)
-
-        default = classifier_repo.get_cbam_default(
-            conn, classification.hs_code8, ctx.origin_country, ctx.ref_date
-        )
-        emission_intensity = default.emission_intensity if default else None
-        emission_source = default.source if default else None
-        classifier_repo.upsert_cbam_report_draft(
-            conn,
-            ctx.shipment_id,
-            classification,
-            emission_intensity,
-            emission_source,
-        )
+            defaults = classifier_repo.get_cbam_defaults_many(
+                reader,
+                (
+                    (classification.hs_code8, ctx.origin_country, ctx.ref_date)
+                    for ctx, classification, _ in linked
+                ),
+            )
+            results = []
+            for ctx, classification, _ in linked:
+                default = defaults.get((classification.hs_code8, ctx.origin_country, ctx.ref_date))
+                results.append(
+                    EmissionLinkResult(
+                        shipment_id=ctx.shipment_id,
+                        classification=classification,
+                        emission_intensity=default.emission_intensity if default else None,
+                        emission_source=default.source if default else None,
+                    )
+                )
+            drafts = classifier_repo.upsert_cbam_report_drafts(
+                conn,
+                (
+                    (
+                        result.shipment_id,
+                        result.classification,
+                        result.emission_intensity,
+                        result.emission_source,
+                    )
+                    for result in results
+                ),
+                commit=False,
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return EmissionLinkBatch(results=results, drafts=drafts)
+
+
+async def classify_and_link_async(
+    record: Any, *, force: bool = False, conn: Any = None
+) -> EmissionLinkResult:
+    """Asyncio variant of :func:`classify_and_link`.
+
+    As in the synchronous path, the snapshot lookup and both writes run on one
+    primary connection and are committed together. Pass ``conn`` to reuse a
+    connection the caller already holds, such as the route's shipment fetch,
+    instead of checking out another. Classification and the CBAM default go
+    through :func:`classifier_async_repo.get_async_read_connection`, which reuses
+    that connection unless a usable replica is configured. When it hands out a
+    separate replica connection, the default for the shipment's HS hint is looked
+    up concurrently with the snapshot and reused if the classification keeps
+    that HS code.
+    """
+
+    ctx = _build_context(record)
+    with tracing.traced():
+        async with (
+            nullcontext(conn)
+            if conn is not None
+            else classifier_async_repo.get_async_connection() as conn,
+            classifier_async_repo.get_async_read_connection(conn) as reader,
+        ):
+            try:
+                # On a replica, the hinted HS code's default is fetched while the
+                # primary reads the snapshot; the classification usually keeps it.
+                hinted = normalise_hs_code(ctx.hs_hint) if reader is not conn else None
+                with tracing.stage("snapshot"):
+                    if hinted:
+                        snapshot, hinted_default = await asyncio.gather(
+                            classifier_async_repo.latest_snapshot(conn, ctx.shipment_id),
+                            classifier_async_repo.get_cbam_default(
+                                reader, hinted, ctx.origin_country, ctx.ref_date
+                            ),
+                        )
+                    else:
+                        snapshot = await classifier_async_repo.latest_snapshot(
+                            conn, ctx.shipment_id
+                        )
+                if _should_reclassify(record, snapshot, force):
+                    classification = await classify_compact_async(ctx, reader)
+                    with tracing.stage("persist_snapshot"):
+                        await classifier_async_repo.persist_classification_snapshot(
+                            conn,
+                            ctx.shipment_id,
+                            classification.hs_code8,
+                            classification.taric_code,
+                            classification.ruling_id,
+                            classification.source,
+                            ctx.ref_date,
+                            commit=False,
+                        )
+                else:
+                    classification = _classification_from_snapshot(snapshot)
+                    tracing.set_branch(SNAPSHOT_BRANCH)
+
+                if hinted and classification.hs_code8 == hinted:
+                    default = hinted_default
+                else:
+                    with tracing.stage("cbam_default"):
+                        default = await classifier_async_repo.get_cbam_default(
+                            reader, classification.hs_code8, ctx.origin_country, ctx.ref_date
+                        )
+                emission_intensity = default.emission_intensity if default else None
+                emission_source = default.source if default else None
+                with tracing.stage("persist_draft"):
+                    await classifier_async_repo.upsert_cbam_report_draft(
+                        conn,
+                        ctx.shipment_id,
+                        classification,
+                        emission_intensity,
+                        emission_source,
+                        commit=False,
+                    )
+                    await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
 
     return EmissionLinkResult(
         shipment_id=ctx.shipment_id,
@@ -0,0 +1,322 @@
+"""Classify and link exported shipments offline against a frozen reference dump.
+
+Run it with ``python -m packages.emissions_linker.offline DUMP SHIPMENTS OUTPUT``;
+no database is involved. ``DUMP`` is a reference dump directory (see
+:mod:`packages.classifier.dump`), ``SHIPMENTS`` a Parquet or CSV file with the
+columns of the ``shipments`` table and ``OUTPUT`` a ``.parquet`` or ``.csv`` file.
+
+The dump is installed as the in-process reference index, so :func:`classify_many`
+picks TARIC codes and rulings as against Postgres. HS codes of shipments without
+a hint are derived from their description with the strategy production uses
+(``--text-match``): ``ilike`` runs the substring match of
+``repo.derive_hs_from_text`` in DuckDB, and ``index`` uses the BM25 text index
+(``CLASSIFIER_TEXT_INDEX=1``). pg_trgm's word similarity has no DuckDB
+equivalent, so ``CLASSIFIER_TEXT_MATCH=trigram`` falls back to the index. The
+``text_match`` column records the strategy for every text-derived shipment.
+DuckDB scans the shipments in chunks of ``--chunk-size`` rows. Each chunk is
+classified in memory and its decisions are spooled to disk. CBAM defaults are then
+attached with a single vectorised join in DuckDB, with the precedence of
+``repo.get_cbam_default`` (country-specific before generic, latest first), and
+the result is written in input order. Shipments whose HS code cannot be
+derived, and rows that do not make a valid classification context (counted as
+``invalid``), keep empty classification columns.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from packages.classifier import ClassificationContext, dump, repo, text_index
+from packages.classifier.resolver import classify_many, normalise_hs_code
+
+from .batch import DEFAULT_CHUNK_SIZE
+from .linker import _build_context
+
+logger = logging.getLogger(__name__)
+
+_SHIPMENTS = """
+    SELECT CAST(id AS VARCHAR) AS id,
+           CAST(arrived_at AS DATE) AS arrived_at,
+           CAST(country_code AS VARCHAR) AS country_code,
+           CAST(hs_code AS VARCHAR) AS hs_code,
+           CAST(description AS VARCHAR) AS description,
+           CAST(net_weight_kg AS DOUBLE) AS net_weight_kg,
+           CAST(gross_weight_kg AS DOUBLE) AS gross_weight_kg
+    FROM {source}
+"""
+TEXT_MATCHES = ("ilike", "index")
+_CLASSIFICATION_COLUMNS = (
+    "hs_code8",
+    "taric_code",
+    "source",
+    "ruling_id",
+    "validity_from",
+    "validity_to",
+    "notes",
+)
+_DECISION_COLUMNS = (
+    "ordinal",
+    "shipment_id",
+    "country_code",
+    "ref_date",
+    *_CLASSIFICATION_COLUMNS,
+    "text_match",
+)
+# repo.derive_hs_from_text's ILIKE match; Postgres sorts NULLs first in DESC.
+_DERIVE_HS_ILIKE = """
+    SELECT k.ord, h.hs_code8
+    FROM (
+        SELECT unnest(CAST(? AS BIGINT[])) AS ord,
+               unnest(CAST(? AS VARCHAR[])) AS text_hint,
+               unnest(CAST(? AS DATE[])) AS ref_date
+    ) k
+    JOIN v_hs_codes h
+      ON h.description ILIKE '%' || k.text_hint || '%'
+     AND (h.valid_from IS NULL OR h.valid_from <= k.ref_date)
+     AND (h.valid_to IS NULL OR h.valid_to >= k.ref_date)
+    QUALIFY row_number() OVER (PARTITION BY k.ord ORDER BY h.valid_from DESC NULLS FIRST) = 1
+"""
+_LINK = """
+    WITH decisions AS (
+        SELECT CAST(ordinal AS BIGINT) AS ordinal,
+               shipment_id,
+               country_code,
+               CAST(ref_date AS DATE) AS ref_date,
+               hs_code8,
+               taric_code,
+               source,
+               ruling_id,
+               CAST(validity_from AS DATE) AS validity_from,
+               CAST(validity_to AS DATE) AS validity_to,
+               notes,
+               text_match
+        FROM {decisions}
+    )
+    SELECT r.shipment_id, r.hs_code8, r.taric_code, r.ruling_id, r.source,
+           r.validity_from, r.validity_to, r.notes, r.text_match,
+           d.emission_intensity, d.source AS emission_source
+    FROM decisions r
+    LEFT JOIN v_cbam_default_emissions d
+      ON d.hs_code8 = r.hs_code8
+     AND (d.country_code IS NULL OR d.country_code = r.country_code)
+     AND (d.valid_from IS NULL OR d.valid_from <= r.ref_date)
+     AND (d.valid_to IS NULL OR d.valid_to >= r.ref_date)
+    QUALIFY row_number() OVER (
+        PARTITION BY r.ordinal
+        ORDER BY d.country_code NULLS LAST, d.valid_from DESC NULLS FIRST
+    ) = 1
+    ORDER BY r.ordinal
+"""
+
+
+class _NoDatabase:
+    """Stands in for the connection: the installed indexes must answer every lookup."""
+
+    def __getattr__(self, name: str) -> Any:
+        raise RuntimeError(f"Offline classification reached for the database ({name})")
+
+
+@dataclass
+class OfflineStats:
+    processed: int = 0
+    classified: int = 0
+    invalid: int = 0
+    elapsed: float = 0.0
+    text_match: str | None = None
+
+    @property
+    def unresolved(self) -> int:
+        return self.processed - self.classified - self.invalid
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def default_text_match() -> str:
+    """The text strategy production is configured with, as far as DuckDB can follow it."""
+
+    if os.getenv("CLASSIFIER_TEXT_INDEX", "").lower() in {"1", "true", "yes"}:
+        return "index"
+    if repo.TEXT_MATCH_MODE == "trigram":
+        logger.warning("pg_trgm word similarity is not available offline; using the text index")
+        return "index"
+    return "ilike"
+
+
+def _derive_hs_ilike(
+    con: Any, contexts: list[ClassificationContext]
+) -> list[ClassificationContext]:
+    """Resolve text-only contexts with ILIKE in DuckDB, turning matches into HS hints.
+
+    Contexts without a match lose their text hint, so :func:`classify_many` leaves
+    them unresolved instead of looking the text up itself.
+    """
+
+    pending = [
+        ordinal
+        for ordinal, ctx in enumerate(contexts)
+        if not normalise_hs_code(ctx.hs_hint) and ctx.text_hint
+    ]
+    if not pending:
+        return contexts
+    derived = dict(
+        con.execute(
+            _DERIVE_HS_ILIKE,
+            [
+                pending,
+                [contexts[ordinal].text_hint for ordinal in pending],
+                [contexts[ordinal].ref_date for ordinal in pending],
+            ],
+        ).fetchall()
+    )
+    contexts = list(contexts)
+    for ordinal in pending:
+        contexts[ordinal] = contexts[ordinal].model_copy(
+            update={"hs_hint": derived.get(ordinal), "text_hint": None}
+        )
+    return contexts
+
+
+def _classify_to(
+    con: Any, shipments: Path, writer: Any, chunk_size: int, text_match: str
+) -> OfflineStats:
+    stats = OfflineStats(text_match=text_match)
+    started = time.perf_counter()
+    # A cursor of its own, so the ILIKE lookups do not end the scan.
+    cursor = con.cursor().execute(_SHIPMENTS.format(source=dump.file_source(shipments)))
+    columns = [column[0] for column in cursor.description]
+    while rows := cursor.fetchmany(chunk_size):
+        records = [dict(zip(columns, row, strict=True)) for row in rows]
+        contexts: list[ClassificationContext | None] = []
+        for record in records:
+            try:
+                contexts.append(_build_context(record))
+            except ValueError:
+                contexts.append(None)
+        valid = [ctx for ctx in contexts if ctx is not None]
+        from_text = [not normalise_hs_code(ctx.hs_hint) for ctx in valid]
+        if text_match == "ilike":
+            valid = _derive_hs_ilike(con, valid)
+        classified = zip(
+            valid, classify_many(valid, _NoDatabase(), skip_unresolved=True), from_text, strict=True
+        )
+        for record, ctx in zip(records, contexts, strict=True):
+            if ctx is None:
+                writer.writerow(
+                    (
+                        stats.processed,
+                        record["id"],
+                        record["country_code"],
+                        record["arrived_at"],
+                        *(None for _ in _CLASSIFICATION_COLUMNS),
+                        None,
+                    )
+                )
+                stats.processed += 1
+                stats.invalid += 1
+                continue
+            ctx, result, derived = next(classified)
+            decision = result._asdict() if result is not None else {}
+            writer.writerow(
+                (
+                    stats.processed,
+                    ctx.shipment_id,
+                    ctx.origin_country,
+                    ctx.ref_date,
+                    *(decision.get(column) for column in _CLASSIFICATION_COLUMNS),
+                    text_match if derived and result is not None else None,
+                )
+            )
+            stats.processed += 1
+            stats.classified += result is not None
+        stats.elapsed = time.perf_counter() - started
+        logger.info("Classified %d shipments (%.0f/s)", stats.processed, stats.rate)
+    return stats
+
+
+def link_file(
+    dump_dir: Path,
+    shipments: Path,
+    output: Path,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    text_match: str | None = None,
+) -> OfflineStats:
+    """Classify ``shipments`` against ``dump_dir`` and write linked results to ``output``.
+
+    ``text_match`` (one of :data:`TEXT_MATCHES`) defaults to :func:`default_text_match`.
+    """
+
+    started = time.perf_counter()
+    text_match = text_match or default_text_match()
+    if text_match not in TEXT_MATCHES:
+        raise ValueError(f"Unknown text match {text_match!r}; expected one of {TEXT_MATCHES}")
+    version = dump.install_dump(dump_dir)
+    if text_match != "index":
+        text_index.install_index(None)
+    logger.info(
+        "Installed reference dump %s (version %s, text match %s)", dump_dir, version, text_match
+    )
+    con = dump.connect(dump_dir)
+    try:
+        with tempfile.TemporaryDirectory() as spool:
+            decisions = Path(spool) / "decisions.csv"
+            with decisions.open("w", newline="") as handle:
+                writer = csv.writer(handle)
+                writer.writerow(_DECISION_COLUMNS)
+                stats = _classify_to(con, shipments, writer, chunk_size, text_match)
+            options = "FORMAT parquet" if output.suffix == ".parquet" else "FORMAT csv, HEADER"
+            query = _LINK.format(decisions=dump.file_source(decisions))
+            con.execute(f"COPY ({query}) TO {dump.sql_literal(str(output))} ({options})")
+    finally:
+        con.close()
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dump", type=Path, help="reference dump directory")
+    parser.add_argument("shipments", type=Path, help="shipments .parquet or .csv file")
+    parser.add_argument("output", type=Path, help="results .parquet or .csv file")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--text-match",
+        choices=TEXT_MATCHES,
+        help="how text-only shipments get their HS code (default: as configured for production)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    stats = link_file(
+        args.dump,
+        args.shipments,
+        args.output,
+        chunk_size=args.chunk_size,
+        text_match=args.text_match,
+    )
+    summary = {
+        "text_match": stats.text_match,
+        "processed": stats.processed,
+        "classified": stats.classified,
+        "unresolved": stats.unresolved,
+        "invalid": stats.invalid,
+        "elapsed_s": round(stats.elapsed, 3),
+        "rate_per_s": round(stats.rate, 1),
+    }
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""Link shipment chunks on a pool of worker processes.
+
+Every chunk is linked whole by one worker with :func:`classify_and_link_many`,
+so it is committed in a single transaction as in the serial job: a chunk lands
+completely or not at all, and the checkpoint, which advances chunk by chunk in
+order, never covers a partly linked chunk. Workers are forked from the caller and inherit any
+reference or text index it installed. Each opens its own engine (see
+:func:`packages.classifier.repo.get_engine`).
+
+Outcomes are yielded per chunk in submission order, with results in the chunk's
+own order, so the output does not depend on which worker finishes first.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import signal
+import threading
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any
+
+from .linker import EmissionLinkBatch, classify_and_link_many
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker() -> None:
+    # The parent decides when to stop: on SIGTERM/SIGINT it stops submitting
+    # and waits for the chunks already handed out, which must not be cut short.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def _link_chunk(chunk: list[dict[str, Any]], force: bool) -> EmissionLinkBatch:
+    return classify_and_link_many(chunk, force=force, skip_unresolved=True)
+
+
+@contextmanager
+def worker_pool(workers: int) -> Iterator[ProcessPoolExecutor]:
+    """Fork ``workers`` linking processes up front and shut them down on exit.
+
+    Enter it before opening connections or cursors: the workers are forked right
+    away, so none of them inherits a connection the caller is using.
+    """
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+    )
+    try:
+        # With the fork context the first submission starts every worker.
+        pool.submit(int).result()
+        yield pool
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def link_chunks_in_parallel(
+    chunks: Iterable[list[dict[str, Any]]],
+    pool: ProcessPoolExecutor,
+    *,
+    max_pending: int,
+    force: bool = False,
+) -> Iterator[tuple[list[dict[str, Any]], EmissionLinkBatch]]:
+    """Yield ``(chunk, outcome)`` for every chunk, in the order of ``chunks``.
+
+    Chunks are linked on ``pool`` (see :func:`worker_pool`), with at most
+    ``max_pending`` in flight. When ``chunks`` ends early, e.g. because a stop
+    was requested, the chunks already submitted are still waited for and yielded.
+    """
+
+    pending: deque[tuple[list[dict[str, Any]], Future]] = deque()
+    try:
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(_link_chunk, chunk, force)))
+            if len(pending) >= max_pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+@contextmanager
+def stop_on_signals() -> Iterator[threading.Event]:
+    """Turn SIGTERM and SIGINT into a stop request for the duration of the block."""
+
+    stop = threading.Event()
+    if threading.current_thread() is not threading.main_thread():
+        yield stop
+        return
+
+    def request_stop(signum, frame):
+        logger.warning("Received %s; finishing the chunks in flight", signal.Signals(signum).name)
+        stop.set()
+
+    previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        yield stop
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
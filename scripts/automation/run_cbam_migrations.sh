@@ -12,5 +12,5 @@ for file in ops/migrations/*.sql; do
   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f "$file"
 done
 
-echo "Refreshing mv_hs_taric_today"
-psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f ops/jobs/refresh_mv_hs_taric_today.sql
+echo "Refreshing reference materialized views"
+python -m packages.classifier.refresh